@@ -0,0 +1,383 @@
+import array
+import struct
+import sys
+from dataclasses import dataclass
+from itertools import chain
+from typing import Dict, List, Optional, Tuple, Union, cast
+
+from .deep import Json
+from .logging import get_logger
+
+logger = get_logger(__name__)
+
+# Same values as bgl.GL_*. Defined here so that this module works without bpy.
+BYTE = 5120
+UNSIGNED_BYTE = 5121
+SHORT = 5122
+UNSIGNED_SHORT = 5123
+UNSIGNED_INT = 5125
+FLOAT = 5126
+
+TYPE_TO_COMPONENT_COUNT = {
+    "SCALAR": 1,
+    "VEC2": 2,
+    "VEC3": 3,
+    "VEC4": 4,
+    "MAT2": 4,
+    "MAT3": 9,
+    "MAT4": 16,
+}
+
+# struct format characters. glTF binary data is always little endian.
+COMPONENT_TYPE_TO_STRUCT_FORMAT = {
+    BYTE: "b",
+    UNSIGNED_BYTE: "B",
+    SHORT: "h",
+    UNSIGNED_SHORT: "H",
+    UNSIGNED_INT: "I",
+    FLOAT: "f",
+}
+
+# The item size of array typecodes depends on the platform.
+COMPONENT_TYPE_TO_TYPECODE = {
+    BYTE: "b",
+    UNSIGNED_BYTE: "B",
+    SHORT: "h",
+    UNSIGNED_SHORT: "H",
+    UNSIGNED_INT: "I" if array.array("I").itemsize == 4 else "L",
+    FLOAT: "f",
+}
+
+# https://registry.khronos.org/glTF/specs/2.0/glTF-2.0.html#animations
+NORMALIZED_COMPONENT_TYPE_TO_DIVISOR = {
+    BYTE: 127.0,
+    UNSIGNED_BYTE: 255.0,
+    SHORT: 32767.0,
+    UNSIGNED_SHORT: 65535.0,
+}
+
+TypedArray = Union["array.array[int]", "array.array[float]"]
+
+
+@dataclass(frozen=True)
+class DecodedAccessor:
+    # Flat component values. Each element occupies component_count items.
+    values: TypedArray
+    component_count: int
+    component_type: int
+    normalized: bool
+
+    def __len__(self) -> int:
+        return len(self.values) // self.component_count
+
+    def element(self, index: int) -> Tuple[Union[int, float], ...]:
+        start = index * self.component_count
+        return tuple(self.values[slice(start, start + self.component_count)])
+
+    def to_list(self) -> List[Union[int, float, List[int], List[float]]]:
+        flat_values: List[Union[int, float]] = []
+        flat_values.extend(self.values.tolist())
+        if self.component_count == 1:
+            return list(flat_values)
+        n = self.component_count
+        return [flat_values[slice(i, i + n)] for i in range(0, len(flat_values), n)]
+
+
+def component_size(component_type: int) -> int:
+    return struct.calcsize("<" + COMPONENT_TYPE_TO_STRUCT_FORMAT[component_type])
+
+
+def read_typed_array(
+    buffer: Union[bytes, bytearray, memoryview],
+    byte_offset: int,
+    count: int,
+    component_count: int,
+    component_type: int,
+    byte_stride: Optional[int] = None,
+) -> TypedArray:
+    struct_format = COMPONENT_TYPE_TO_STRUCT_FORMAT.get(component_type)
+    if struct_format is None:
+        raise ValueError(f"Unsupported component type: {component_type}")
+    values = array.array(COMPONENT_TYPE_TO_TYPECODE[component_type])
+    if count <= 0:
+        return values
+
+    element_size = component_size(component_type) * component_count
+    if not byte_stride or byte_stride == element_size:
+        end = byte_offset + element_size * count
+        if byte_offset < 0 or end > len(buffer):
+            raise ValueError(
+                f"Accessor range {byte_offset}..{end} exceeds the buffer length {len(buffer)}"
+            )
+        values.frombytes(memoryview(buffer)[byte_offset:end])
+        if sys.byteorder != "little":
+            values.byteswap()
+        return values
+
+    if byte_stride < element_size:
+        raise ValueError(f"byteStride {byte_stride} is less than {element_size}")
+
+    # The last element doesn't need the trailing padding of the stride.
+    end = byte_offset + byte_stride * (count - 1) + element_size
+    if byte_offset < 0 or end > len(buffer):
+        raise ValueError(
+            f"Accessor range {byte_offset}..{end} exceeds the buffer length {len(buffer)}"
+        )
+    view = memoryview(buffer)
+    element_struct = struct.Struct(f"<{component_count}{struct_format}")
+    strided_struct = struct.Struct(
+        f"<{component_count}{struct_format}{byte_stride - element_size}x"
+    )
+    strided_end = byte_offset + byte_stride * (count - 1)
+    values.extend(
+        chain.from_iterable(strided_struct.iter_unpack(view[byte_offset:strided_end]))
+    )
+    values.extend(element_struct.unpack_from(view, strided_end))
+    return values
+
+
+def normalize_typed_array(values: TypedArray, component_type: int) -> TypedArray:
+    divisor = NORMALIZED_COMPONENT_TYPE_TO_DIVISOR.get(component_type)
+    if divisor is None:
+        raise ValueError(f"Component type {component_type} cannot be normalized")
+    if component_type in [BYTE, SHORT]:
+        return array.array("f", [max(v / divisor, -1.0) for v in values])
+    return array.array("f", [v / divisor for v in values])
+
+
+def int_or_none(json_dict: Dict[str, Json], key: str) -> Optional[int]:
+    value = json_dict.get(key)
+    return value if isinstance(value, int) else None
+
+
+def buffer_view_range(
+    json_dict: Dict[str, Json], buffer_view_index: int
+) -> Tuple[int, Optional[int]]:
+    buffer_view_dicts = json_dict.get("bufferViews")
+    if not isinstance(buffer_view_dicts, list) or not (
+        0 <= buffer_view_index < len(buffer_view_dicts)
+    ):
+        raise ValueError(f"No bufferViews[{buffer_view_index}]")
+    buffer_view_dict = buffer_view_dicts[buffer_view_index]
+    if not isinstance(buffer_view_dict, dict):
+        raise ValueError(f"bufferViews[{buffer_view_index}] is not an object")
+    byte_offset = int_or_none(buffer_view_dict, "byteOffset") or 0
+    byte_stride = int_or_none(buffer_view_dict, "byteStride")
+    return byte_offset, byte_stride
+
+
+def read_buffer_view(
+    json_dict: Dict[str, Json],
+    buffer: Union[bytes, bytearray, memoryview],
+    buffer_view_index: int,
+) -> memoryview:
+    buffer_view_dicts = json_dict.get("bufferViews")
+    if not isinstance(buffer_view_dicts, list) or not (
+        0 <= buffer_view_index < len(buffer_view_dicts)
+    ):
+        raise ValueError(f"No bufferViews[{buffer_view_index}]")
+    buffer_view_dict = buffer_view_dicts[buffer_view_index]
+    if not isinstance(buffer_view_dict, dict):
+        raise ValueError(f"bufferViews[{buffer_view_index}] is not an object")
+    byte_offset = int_or_none(buffer_view_dict, "byteOffset") or 0
+    byte_length = int_or_none(buffer_view_dict, "byteLength") or 0
+    if byte_offset < 0 or byte_length < 0 or byte_offset + byte_length > len(buffer):
+        raise ValueError(
+            f"bufferViews[{buffer_view_index}] exceeds the buffer length {len(buffer)}"
+        )
+    return memoryview(buffer)[slice(byte_offset, byte_offset + byte_length)]
+
+
+def apply_sparse(
+    json_dict: Dict[str, Json],
+    buffer: Union[bytes, bytearray, memoryview],
+    values: TypedArray,
+    component_count: int,
+    component_type: int,
+    sparse_dict: Dict[str, Json],
+) -> None:
+    sparse_count = int_or_none(sparse_dict, "count")
+    indices_dict = sparse_dict.get("indices")
+    values_dict = sparse_dict.get("values")
+    if (
+        not sparse_count
+        or not isinstance(indices_dict, dict)
+        or not isinstance(values_dict, dict)
+    ):
+        return
+
+    indices_buffer_view_index = int_or_none(indices_dict, "bufferView")
+    indices_component_type = int_or_none(indices_dict, "componentType")
+    values_buffer_view_index = int_or_none(values_dict, "bufferView")
+    if (
+        indices_buffer_view_index is None
+        or indices_component_type is None
+        or values_buffer_view_index is None
+    ):
+        raise ValueError("Invalid sparse accessor")
+
+    indices_byte_offset, _ = buffer_view_range(json_dict, indices_buffer_view_index)
+    sparse_indices = read_typed_array(
+        buffer,
+        indices_byte_offset + (int_or_none(indices_dict, "byteOffset") or 0),
+        sparse_count,
+        1,
+        indices_component_type,
+    )
+    values_byte_offset, _ = buffer_view_range(json_dict, values_buffer_view_index)
+    sparse_values = read_typed_array(
+        buffer,
+        values_byte_offset + (int_or_none(values_dict, "byteOffset") or 0),
+        sparse_count,
+        component_count,
+        component_type,
+    )
+
+    element_count = len(values) // component_count
+    n = component_count
+    # The replacement has the destination's typecode, so the cast is safe
+    destination_values = cast("array.array[float]", values)
+    replacement_values = cast(
+        "array.array[float]", array.array(values.typecode, sparse_values)
+    )
+    for i, index in enumerate(map(int, sparse_indices)):
+        if not 0 <= index < element_count:
+            raise ValueError(f"Sparse index {index} is out of range")
+        destination_values[slice(index * n, (index + 1) * n)] = replacement_values[
+            slice(i * n, (i + 1) * n)
+        ]
+
+
+def decode_accessor(
+    json_dict: Dict[str, Json],
+    buffer: Union[bytes, bytearray, memoryview],
+    accessor_index: int,
+) -> Optional[DecodedAccessor]:
+    accessor_dicts = json_dict.get("accessors")
+    if not isinstance(accessor_dicts, list) or not (
+        0 <= accessor_index < len(accessor_dicts)
+    ):
+        return None
+    accessor_dict = accessor_dicts[accessor_index]
+    if not isinstance(accessor_dict, dict):
+        return None
+
+    accessor_type = accessor_dict.get("type")
+    if not isinstance(accessor_type, str):
+        return None
+    component_count = TYPE_TO_COMPONENT_COUNT.get(accessor_type)
+    if component_count is None:
+        logger.warning(f"Unrecognized accessor type: {accessor_type}")
+        return None
+
+    component_type = int_or_none(accessor_dict, "componentType")
+    if component_type is None or component_type not in COMPONENT_TYPE_TO_STRUCT_FORMAT:
+        raise ValueError(f"Unsupported component type: {component_type}")
+
+    matrix_rows = {"MAT2": 2, "MAT3": 3}.get(accessor_type)
+    if matrix_rows and component_size(component_type) * matrix_rows % 4 != 0:
+        # Column padding is required in this case
+        logger.warning(
+            f"accessors[{accessor_index}] {accessor_type} with component type"
+            + f" {component_type} is not supported"
+        )
+        return None
+
+    count = int_or_none(accessor_dict, "count") or 0
+    accessor_byte_offset = int_or_none(accessor_dict, "byteOffset") or 0
+    normalized = accessor_dict.get("normalized") is True
+
+    try:
+        buffer_view_index = int_or_none(accessor_dict, "bufferView")
+        if buffer_view_index is None:
+            # Initialized with zeros. It's usually used with the sparse accessor.
+            values = read_typed_array(
+                bytes(component_size(component_type) * component_count * count),
+                0,
+                count,
+                component_count,
+                component_type,
+            )
+        else:
+            buffer_view_byte_offset, byte_stride = buffer_view_range(
+                json_dict, buffer_view_index
+            )
+            values = read_typed_array(
+                buffer,
+                buffer_view_byte_offset + accessor_byte_offset,
+                count,
+                component_count,
+                component_type,
+                byte_stride,
+            )
+
+        sparse_dict = accessor_dict.get("sparse")
+        if isinstance(sparse_dict, dict):
+            apply_sparse(
+                json_dict,
+                buffer,
+                values,
+                component_count,
+                component_type,
+                sparse_dict,
+            )
+    except (ValueError, struct.error) as e:
+        logger.warning(f"Failed to decode accessors[{accessor_index}]: {e}")
+        return None
+
+    if normalized and component_type in NORMALIZED_COMPONENT_TYPE_TO_DIVISOR:
+        values = normalize_typed_array(values, component_type)
+
+    return DecodedAccessor(
+        values=values,
+        component_count=component_count,
+        component_type=component_type,
+        normalized=normalized,
+    )
+
+
+def decode_accessors(
+    json_dict: Dict[str, Json],
+    buffer: Union[bytes, bytearray, memoryview],
+) -> List[Optional[DecodedAccessor]]:
+    accessor_dicts = json_dict.get("accessors")
+    if not isinstance(accessor_dicts, list):
+        return []
+    return [decode_accessor(json_dict, buffer, i) for i in range(len(accessor_dicts))]
+
+
+# Accessors are decoded on first access and cached for later lookups
+class LazyAccessorTable:
+    def __init__(
+        self,
+        json_dict: Optional[Dict[str, Json]] = None,
+        buffer: Union[bytes, bytearray, memoryview] = b"",
+    ) -> None:
+        self.json_dict: Dict[str, Json] = json_dict if json_dict is not None else {}
+        self.buffer = buffer
+        self.decoded_accessors: Dict[int, Optional[DecodedAccessor]] = {}
+
+    def __len__(self) -> int:
+        accessor_dicts = self.json_dict.get("accessors")
+        if not isinstance(accessor_dicts, list):
+            return 0
+        return len(accessor_dicts)
+
+    def __contains__(self, accessor_index: object) -> bool:
+        return isinstance(accessor_index, int) and 0 <= accessor_index < len(self)
+
+    def get(self, accessor_index: int) -> Optional[DecodedAccessor]:
+        if accessor_index in self.decoded_accessors:
+            return self.decoded_accessors[accessor_index]
+        decoded_accessor = decode_accessor(self.json_dict, self.buffer, accessor_index)
+        self.decoded_accessors[accessor_index] = decoded_accessor
+        return decoded_accessor
+
+    def decoded_count(self) -> int:
+        return len(self.decoded_accessors)
+
+    def release(self, accessor_index: int) -> None:
+        self.decoded_accessors.pop(accessor_index, None)
+
+    def clear(self) -> None:
+        self.decoded_accessors.clear()
@@ -0,0 +1,162 @@
+import hashlib
+import math
+import operator
+from itertools import compress, count, islice
+from typing import Dict, List, Optional, Tuple, Union
+
+from .accessor import DecodedAccessor, decode_accessor, int_or_none, read_buffer_view
+from .deep import Json
+
+DEFAULT_MAX_REPORTED_INDICES = 10
+
+AccessorSourceKey = Tuple[bytes, Optional[int], int, Json, Json, Json, bool]
+
+
+def accessor_dicts_of(json_dict: Dict[str, Json]) -> List[Json]:
+    accessor_dicts = json_dict.get("accessors")
+    if not isinstance(accessor_dicts, list):
+        return []
+    return accessor_dicts
+
+
+# Returns a key which is equal only if two accessors are decoded to the same values.
+# The bufferView contents are compared by their hashes, and each hash is
+# calculated only once even if the bufferView is shared by many accessors.
+def accessor_source_key(
+    json_dict: Dict[str, Json],
+    buffer: Union[bytes, bytearray, memoryview],
+    accessor_index: int,
+    buffer_view_digests: Dict[int, Optional[bytes]],
+) -> Optional[AccessorSourceKey]:
+    accessor_dicts = accessor_dicts_of(json_dict)
+    if not 0 <= accessor_index < len(accessor_dicts):
+        return None
+    accessor_dict = accessor_dicts[accessor_index]
+    if not isinstance(accessor_dict, dict) or "sparse" in accessor_dict:
+        return None
+    buffer_view_index = int_or_none(accessor_dict, "bufferView")
+    if buffer_view_index is None:
+        return None
+
+    if buffer_view_index not in buffer_view_digests:
+        try:
+            buffer_view = read_buffer_view(json_dict, buffer, buffer_view_index)
+        except ValueError:
+            buffer_view_digests[buffer_view_index] = None
+        else:
+            buffer_view_digests[buffer_view_index] = hashlib.sha256(
+                buffer_view
+            ).digest()
+    digest = buffer_view_digests[buffer_view_index]
+    if digest is None:
+        return None
+
+    buffer_view_dicts = json_dict.get("bufferViews")
+    byte_stride = None
+    if isinstance(buffer_view_dicts, list):
+        buffer_view_dict = buffer_view_dicts[buffer_view_index]
+        if isinstance(buffer_view_dict, dict):
+            byte_stride = int_or_none(buffer_view_dict, "byteStride")
+
+    return (
+        digest,
+        byte_stride,
+        int_or_none(accessor_dict, "byteOffset") or 0,
+        accessor_dict.get("componentType"),
+        accessor_dict.get("type"),
+        accessor_dict.get("count"),
+        accessor_dict.get("normalized") is True,
+    )
+
+
+def diff_decoded_accessor(
+    left: Optional[DecodedAccessor],
+    right: Optional[DecodedAccessor],
+    float_tolerance: float,
+    path: str,
+    max_reported_indices: int = DEFAULT_MAX_REPORTED_INDICES,
+) -> List[str]:
+    if left is None or right is None:
+        if left is None and right is None:
+            return []
+        return [
+            f"{path}: left is {'not ' if left else ''}decodable"
+            + f" but right is {'not ' if right else ''}decodable"
+        ]
+    if left.component_count != right.component_count:
+        return [
+            f"{path}: left component count is {left.component_count}"
+            + f" but right component count is {right.component_count}"
+        ]
+    if len(left) != len(right):
+        return [f"{path}: left length is {len(left)} but right length is {len(right)}"]
+    if left.values == right.values:
+        return []
+
+    # Integers are compared exactly like deep.diff()
+    tolerance = float(float_tolerance)
+    if left.values.typecode != "f" and right.values.typecode != "f":
+        tolerance = 0.0
+
+    # These loops run in C without creating a path string for each value
+    errors = list(map(abs, map(operator.sub, left.values, right.values)))
+    offending_count = sum(map(tolerance.__lt__, errors))
+    if not offending_count:
+        return []
+
+    n = left.component_count
+    reported = []
+    for i in islice(
+        compress(count(), map(tolerance.__lt__, errors)), max_reported_indices
+    ):
+        index = f"[{i // n}]" if n == 1 else f"[{i // n}][{i % n}]"
+        reported.append(f"{index} left={left.values[i]} right={right.values[i]}")
+    return [
+        f"{path}: {offending_count} of {len(errors)} values differ,"
+        + f" max error={max(errors):19.17f},"
+        + f" mean error={math.fsum(errors) / len(errors):19.17f},"
+        + f" first offending indices: {', '.join(reported)}"
+    ]
+
+
+def diff_accessors(
+    left_json_dict: Dict[str, Json],
+    left_buffer: Union[bytes, bytearray, memoryview],
+    right_json_dict: Dict[str, Json],
+    right_buffer: Union[bytes, bytearray, memoryview],
+    float_tolerance: float = 0,
+    path: str = "",
+    max_reported_indices: int = DEFAULT_MAX_REPORTED_INDICES,
+) -> List[str]:
+    left_count = len(accessor_dicts_of(left_json_dict))
+    right_count = len(accessor_dicts_of(right_json_dict))
+    if left_count != right_count:
+        return [
+            f"{path}: left length is {left_count} but right length is {right_count}"
+        ]
+
+    diffs: List[str] = []
+    left_digests: Dict[int, Optional[bytes]] = {}
+    right_digests: Dict[int, Optional[bytes]] = {}
+    for accessor_index in range(left_count):
+        left_key = accessor_source_key(
+            left_json_dict, left_buffer, accessor_index, left_digests
+        )
+        if left_key is not None and left_key == accessor_source_key(
+            right_json_dict, right_buffer, accessor_index, right_digests
+        ):
+            continue
+
+        accessor_path = f"{path}[{accessor_index}]"
+        try:
+            left = decode_accessor(left_json_dict, left_buffer, accessor_index)
+            right = decode_accessor(right_json_dict, right_buffer, accessor_index)
+        except ValueError as e:
+            diffs.append(f"{accessor_path}: {e}")
+            continue
+        diffs.extend(
+            diff_decoded_accessor(
+                left, right, float_tolerance, accessor_path, max_reported_indices
+            )
+        )
+    return diffs
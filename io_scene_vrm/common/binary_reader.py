@@ -8,12 +8,16 @@ https://opensource.org/licenses/mit-license.php
 import struct
 from typing import Union
 
-import bgl
+from .accessor import FLOAT, SHORT, UNSIGNED_BYTE, UNSIGNED_INT, UNSIGNED_SHORT
+
+# The same value as bgl.GL_INT, which isn't a component type of glTF
+INT = 5124
 
 
 class BinaryReader:
-    def __init__(self, data: bytes) -> None:
-        self.data = data
+    def __init__(self, data: Union[bytes, bytearray, memoryview]) -> None:
+        # Slicing a memoryview doesn't copy the underlying data
+        self.data = memoryview(data)
         self.pos = 0
 
     def set_pos(self, pos: int) -> None:
@@ -22,9 +26,9 @@ class BinaryReader:
     def read_str(self, size: int) -> str:
         result = self.data[slice(self.pos, self.pos + size)]
         self.pos += size
-        return result.decode("utf-8")
+        return bytes(result).decode("utf-8")
 
-    def read_binary(self, size: int) -> bytes:
+    def read_binary(self, size: int) -> memoryview:
         result = self.data[slice(self.pos, self.pos + size)]
         self.pos += size
         return result
@@ -73,17 +77,17 @@ class BinaryReader:
         return result
 
     def read_as_data_type(self, data_type: int) -> Union[int, float]:
-        if data_type == bgl.GL_UNSIGNED_INT:
+        if data_type == UNSIGNED_INT:
             return self.read_unsigned_int()
-        if data_type == bgl.GL_INT:
+        if data_type == INT:
             return self.read_int()
-        if data_type == bgl.GL_UNSIGNED_SHORT:
+        if data_type == UNSIGNED_SHORT:
             return self.read_unsigned_short()
-        if data_type == bgl.GL_SHORT:
+        if data_type == SHORT:
             return self.read_short()
-        if data_type == bgl.GL_FLOAT:
+        if data_type == FLOAT:
             return self.read_float()
-        if data_type == bgl.GL_UNSIGNED_BYTE:
+        if data_type == UNSIGNED_BYTE:
             return self.read_unsigned_byte()
         raise ValueError(f"Unsupported type : {data_type}")
 
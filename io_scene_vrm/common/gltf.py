@@ -1,9 +1,14 @@
+import contextlib
 import json
+import mmap
 import struct
-from typing import Dict, Optional, Tuple
+from typing import BinaryIO, Dict, Iterator, List, Optional, Sequence, Tuple, Union
 
 from .binary_reader import BinaryReader
 from .deep import Json
+from .logging import get_logger
+
+logger = get_logger(__name__)
 
 # https://www.khronos.org/opengl/wiki/Small_Float_Formats#Numeric_limits_and_precision
 FLOAT_POSITIVE_MAX = 3.4028237e38
@@ -18,8 +23,37 @@ TEXTURE_INPUT_NAMES = [
 VAL_INPUT_NAMES = ["metallic", "roughness", "unlit"]
 RGBA_INPUT_NAMES = ["base_Color", "emissive_color"]
 
-
-def parse_glb(data: bytes) -> Tuple[Dict[str, Json], bytes]:
+BinaryChunk = Union[bytes, bytearray, memoryview]
+
+
+@contextlib.contextmanager
+def read_glb_file(filepath: str) -> Iterator[Union[bytes, memoryview]]:
+    # Map the file instead of reading it so that the BIN chunk and
+    # bufferViews can be referenced without copying. The mapping is closed on
+    # exit, because Windows doesn't allow to overwrite or delete a mapped file.
+    mapped: Optional[mmap.mmap] = None
+    with open(filepath, "rb") as f:
+        try:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            # Empty files and some file systems can't be mapped
+            data = f.read()
+    if mapped is None:
+        yield data
+        return
+    try:
+        with memoryview(mapped) as mapped_view:
+            yield mapped_view
+    finally:
+        try:
+            mapped.close()
+        except BufferError:
+            # Slices of the data are still referenced. The mapping is closed
+            # when they are released.
+            logger.warning(f"Failed to close the mapped file: {filepath}")
+
+
+def parse_glb(data: BinaryChunk) -> Tuple[Dict[str, Json], memoryview]:
     reader = BinaryReader(data)
     magic = reader.read_str(4)
     if magic != "glTF":
@@ -35,7 +69,7 @@ def parse_glb(data: bytes) -> Tuple[Dict[str, Json], bytes]:
     size -= 12
 
     json_str: Optional[str] = None
-    body: Optional[bytes] = None
+    body: Optional[memoryview] = None
     while size > 0:
         if json_str is not None and body is not None:
             raise ValueError(
@@ -55,7 +89,7 @@ def parse_glb(data: bytes) -> Tuple[Dict[str, Json], bytes]:
             body = chunk_data
             continue
         if chunk_type == "JSON":
-            json_str = chunk_data.decode("utf-8")  # blenderのpythonが古く自前decode要す
+            json_str = bytes(chunk_data).decode("utf-8")  # blenderのpythonが古く自前decode要す
             continue
 
         raise ValueError(f"unknown chunk_type: {chunk_type}")
@@ -66,28 +100,40 @@ def parse_glb(data: bytes) -> Tuple[Dict[str, Json], bytes]:
     json_obj = json.loads(json_str)
     if not isinstance(json_obj, dict):
         raise ValueError("VRM has invalid json: " + str(json_obj))
-    return json_obj, body if body else bytes()
-
-
-def pack_glb(json_dict: Dict[str, Json], binary_chunk: bytes) -> bytes:
-    magic = b"glTF" + struct.pack("<I", 2)
-    json_str = json.dumps(json_dict).encode("utf-8")
-    if len(json_str) % 4 != 0:
-        json_str += b"\x20" * (4 - len(json_str) % 4)
-    json_size = struct.pack("<I", len(json_str))
-    if len(binary_chunk) % 4 != 0:
-        binary_chunk += b"\x00" * (4 - len(binary_chunk) % 4)
-    bin_size = struct.pack("<I", len(binary_chunk))
-    total_size = struct.pack(
-        "<I", len(json_str) + len(binary_chunk) + 28
-    )  # include header size
-    return (
-        magic
-        + total_size
-        + json_size
-        + b"JSON"
-        + json_str
-        + bin_size
-        + b"BIN\x00"
-        + binary_chunk
+    return json_obj, body if body is not None else memoryview(b"")
+
+
+def glb_chunks(
+    json_dict: Dict[str, Json], binary_chunks: Sequence[BinaryChunk]
+) -> List[BinaryChunk]:
+    # Lengths are computed up front so that the binary chunks are never joined
+    json_bytes = json.dumps(json_dict).encode("utf-8")
+    json_padding = b"\x20" * (-len(json_bytes) % 4)
+    json_length = len(json_bytes) + len(json_padding)
+    binary_length = sum(
+        memoryview(binary_chunk).nbytes for binary_chunk in binary_chunks
     )
+    binary_padding = b"\x00" * (-binary_length % 4)
+    binary_length += len(binary_padding)
+
+    total_length = 12 + 8 + json_length + 8 + binary_length  # include header size
+
+    return [
+        struct.pack("<4sII", b"glTF", 2, total_length),
+        struct.pack("<I4s", json_length, b"JSON"),
+        json_bytes,
+        json_padding,
+        struct.pack("<I4s", binary_length, b"BIN\x00"),
+        *binary_chunks,
+        binary_padding,
+    ]
+
+
+def write_glb(
+    file: BinaryIO, json_dict: Dict[str, Json], binary_chunks: Sequence[BinaryChunk]
+) -> None:
+    file.writelines(glb_chunks(json_dict, binary_chunks))
+
+
+def pack_glb(json_dict: Dict[str, Json], binary_chunk: BinaryChunk) -> bytes:
+    return b"".join(glb_chunks(json_dict, [binary_chunk]))
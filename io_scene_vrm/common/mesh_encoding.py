@@ -0,0 +1,265 @@
+import array
+import multiprocessing
+import operator
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from itertools import compress, repeat
+from typing import Dict, List, Mapping, Optional, Sequence, Tuple
+
+from . import gltf, vertex_buffer
+from .logging import get_logger
+
+logger = get_logger(__name__)
+
+MAX_MESH_ENCODING_WORKERS = 4
+# Smaller meshes are encoded in the calling thread, because starting the worker
+# processes and transferring the arrays cost more than encoding them
+MIN_POOLED_MESH_LOOP_COUNT = 50000
+
+
+@dataclass
+class MeshBins:
+    vertex_count: int
+    primitive_index_bins: Mapping[Optional[int], gltf.BinaryChunk]
+    primitive_index_counts: Mapping[Optional[int], int]
+    position_bin: gltf.BinaryChunk
+    position_min_max: Optional[List[List[float]]]
+    normal_bin: gltf.BinaryChunk
+    texcoord_bins: Sequence[gltf.BinaryChunk]
+    joints_bin: gltf.BinaryChunk
+    weights_bin: gltf.BinaryChunk
+    morph_position_bins: Mapping[str, gltf.BinaryChunk]
+    morph_normal_bins: Mapping[str, gltf.BinaryChunk]
+    morph_min_maxes: Mapping[str, Optional[List[List[float]]]]
+
+
+# Mesh data read from Blender. It contains no Blender objects.
+@dataclass
+class MeshArrays:
+    loop_count: int
+    triangle_loop_indices: "array.array[int]"
+    triangle_material_indices: "array.array[int]"
+    loop_vertex_indices: "array.array[int]"
+    loop_normals: "array.array[float]"
+    vertex_positions: "array.array[float]"
+    loop_uvs_list: Sequence["array.array[float]"]
+    material_index_to_primitive_index: Mapping[int, int]
+    # Shape key names and their position and normal differences per vertex
+    morph_differences: Sequence[Tuple[str, "array.array[float]", "array.array[float]"]]
+    # Skinned vertices and their (weight, joint index) pairs
+    skin_vertex_indices: Sequence[int]
+    skin_influences: Sequence[Sequence[Tuple[float, int]]]
+    fallback_joint: int
+
+
+# Returns flat VEC4 joints and normalized weights. Vertices without influences
+# are attached to the fallback joint.
+def vertex_joints_and_weights(
+    influences: Sequence[Sequence[Tuple[float, int]]], fallback_joint: int
+) -> Tuple["array.array[int]", "array.array[float]"]:
+    joints, weights = vertex_buffer.select_joint_weights(influences)
+    for row in compress(range(len(influences)), map(operator.not_, influences)):
+        row_slice = slice(row * 4, row * 4 + 4)
+        joints[row_slice] = array.array("H", [fallback_joint, 0, 0, 0])
+        weights[row_slice] = array.array("d", [1.0, 0, 0, 0])
+    return joints, vertex_buffer.normalize_weights(weights)
+
+
+def encode_mesh_arrays(mesh_arrays: MeshArrays) -> MeshBins:
+    loop_vertex_indices = mesh_arrays.loop_vertex_indices
+    triangle_count = len(mesh_arrays.triangle_material_indices)
+    material_index_to_primitive_index = mesh_arrays.material_index_to_primitive_index
+
+    # uvとノーマルと頂点番号が同じloopは同じ頂点として省く
+    welded_vertices = vertex_buffer.weld_vertices(
+        mesh_arrays.loop_count,
+        [loop_vertex_indices, mesh_arrays.loop_normals, *mesh_arrays.loop_uvs_list],
+        mesh_arrays.triangle_loop_indices,
+    )
+    unique_vertex_loop_indices = welded_vertices.source_row_indices
+    triangle_vertex_indices = welded_vertices.indices
+    unique_vertex_vertex_indices = vertex_buffer.gather_rows(
+        loop_vertex_indices, 1, unique_vertex_loop_indices
+    )
+
+    triangle_primitive_indices = list(
+        map(
+            material_index_to_primitive_index.get,
+            mesh_arrays.triangle_material_indices,
+        )
+    )
+    primitive_index_bins: Dict[Optional[int], gltf.BinaryChunk] = {
+        primitive_index: b""
+        for primitive_index in material_index_to_primitive_index.values()
+    }
+    primitive_index_counts: Dict[Optional[int], int] = {
+        primitive_index: 0
+        for primitive_index in material_index_to_primitive_index.values()
+    }
+    for primitive_index in dict.fromkeys(triangle_primitive_indices):
+        primitive_vertex_indices = vertex_buffer.gather_rows(
+            triangle_vertex_indices,
+            3,
+            list(
+                compress(
+                    range(triangle_count),
+                    map(
+                        operator.eq,
+                        triangle_primitive_indices,
+                        repeat(primitive_index),
+                    ),
+                )
+            ),
+        )
+        index_bin = vertex_buffer.to_little_endian_bytes(primitive_vertex_indices)
+        primitive_index_bins[primitive_index] = index_bin
+        primitive_index_counts[primitive_index] = len(primitive_vertex_indices)
+
+    glb_positions = vertex_buffer.blender_to_glb_vec3(
+        vertex_buffer.gather_rows(
+            mesh_arrays.vertex_positions, 3, unique_vertex_vertex_indices
+        )
+    )
+    glb_normals = vertex_buffer.blender_to_glb_vec3(
+        vertex_buffer.gather_rows(
+            mesh_arrays.loop_normals, 3, unique_vertex_loop_indices
+        )
+    )
+    texcoord_bins: List[gltf.BinaryChunk] = [
+        vertex_buffer.to_little_endian_bytes(
+            vertex_buffer.blender_to_glb_uv(
+                vertex_buffer.gather_rows(loop_uvs, 2, unique_vertex_loop_indices)
+            )
+        )
+        for loop_uvs in mesh_arrays.loop_uvs_list
+    ]
+
+    morph_position_bins: Dict[str, gltf.BinaryChunk] = {}
+    morph_normal_bins: Dict[str, gltf.BinaryChunk] = {}
+    morph_min_maxes: Dict[str, Optional[List[List[float]]]] = {}
+    for (
+        shape_name,
+        position_differences,
+        normal_differences,
+    ) in mesh_arrays.morph_differences:
+        morph_positions = vertex_buffer.blender_to_glb_vec3(
+            vertex_buffer.gather_rows(
+                position_differences, 3, unique_vertex_vertex_indices
+            )
+        )
+        morph_normals = vertex_buffer.blender_to_glb_vec3(
+            vertex_buffer.gather_rows(
+                normal_differences, 3, unique_vertex_vertex_indices
+            )
+        )
+        morph_position_bins[shape_name] = vertex_buffer.to_little_endian_bytes(
+            morph_positions
+        )
+        morph_normal_bins[shape_name] = vertex_buffer.to_little_endian_bytes(
+            morph_normals
+        )
+        morph_min_maxes[shape_name] = vertex_buffer.vec3_min_max(morph_positions)
+
+    joints = array.array("H")
+    weights = array.array("f")
+    if mesh_arrays.skin_vertex_indices:
+        vertex_joints, vertex_weights = vertex_joints_and_weights(
+            mesh_arrays.skin_influences, mesh_arrays.fallback_joint
+        )
+        vertex_rows = {
+            vertex_index: row
+            for row, vertex_index in enumerate(mesh_arrays.skin_vertex_indices)
+        }
+        unique_vertex_rows = list(
+            map(vertex_rows.__getitem__, unique_vertex_vertex_indices)
+        )
+        joints = vertex_buffer.gather_rows(vertex_joints, 4, unique_vertex_rows)
+        weights = vertex_buffer.gather_rows(vertex_weights, 4, unique_vertex_rows)
+
+    return MeshBins(
+        vertex_count=len(unique_vertex_loop_indices),
+        primitive_index_bins=primitive_index_bins,
+        primitive_index_counts=primitive_index_counts,
+        position_bin=vertex_buffer.to_little_endian_bytes(glb_positions),
+        position_min_max=vertex_buffer.vec3_min_max(glb_positions),
+        normal_bin=vertex_buffer.to_little_endian_bytes(glb_normals),
+        texcoord_bins=texcoord_bins,
+        joints_bin=vertex_buffer.to_little_endian_bytes(joints),
+        weights_bin=vertex_buffer.to_little_endian_bytes(weights),
+        morph_position_bins=morph_position_bins,
+        morph_normal_bins=morph_normal_bins,
+        morph_min_maxes=morph_min_maxes,
+    )
+
+
+class PendingMeshBins:
+    def __init__(
+        self, mesh_arrays: MeshArrays, future: "Optional[Future[MeshBins]]"
+    ) -> None:
+        self.mesh_arrays = mesh_arrays
+        self.future = future
+
+    def result(self) -> MeshBins:
+        if self.future is not None:
+            try:
+                return self.future.result()
+            except (BrokenProcessPool, OSError):
+                logger.warning("Mesh encoding worker failed. Encoding it again")
+        return encode_mesh_arrays(self.mesh_arrays)
+
+
+# Encodes the meshes in worker processes. The encoding is pure Python, so
+# threads can't run it in parallel. Each result is received through the
+# PendingMeshBins returned by submit(), so the caller merges them in its own
+# order and the output doesn't depend on scheduling. If the worker processes
+# can't be used, the meshes are encoded in the calling thread. close() waits
+# for the worker processes, so use it with contextlib.closing().
+class MeshEncoder:
+    def __init__(
+        self,
+        max_workers: int = MAX_MESH_ENCODING_WORKERS,
+        python_executable: Optional[str] = None,
+        min_pooled_loop_count: int = MIN_POOLED_MESH_LOOP_COUNT,
+    ) -> None:
+        self.max_workers = max_workers
+        self.python_executable = python_executable
+        self.min_pooled_loop_count = min_pooled_loop_count
+        self.executor: Optional[ProcessPoolExecutor] = None
+        self.pool_unavailable = max_workers < 1
+
+    def close(self) -> None:
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
+
+    def get_executor(self) -> Optional[ProcessPoolExecutor]:
+        if self.executor is not None or self.pool_unavailable:
+            return self.executor
+        try:
+            # forkは他のスレッドが持つロックを複製してしまうため、spawnを使う
+            context = multiprocessing.get_context("spawn")
+            if self.python_executable is not None:
+                context.set_executable(self.python_executable)
+            self.executor = ProcessPoolExecutor(
+                max_workers=self.max_workers, mp_context=context
+            )
+        except (OSError, ValueError):
+            logger.warning("Failed to start mesh encoding workers")
+            self.pool_unavailable = True
+        return self.executor
+
+    def submit(self, mesh_arrays: MeshArrays) -> PendingMeshBins:
+        executor = None
+        if mesh_arrays.loop_count >= self.min_pooled_loop_count:
+            executor = self.get_executor()
+        if executor is None:
+            return PendingMeshBins(mesh_arrays, None)
+        try:
+            future = executor.submit(encode_mesh_arrays, mesh_arrays)
+        except (BrokenProcessPool, OSError, RuntimeError):
+            logger.warning("Failed to submit a mesh to the encoding workers")
+            self.pool_unavailable = True
+            self.close()
+            return PendingMeshBins(mesh_arrays, None)
+        return PendingMeshBins(mesh_arrays, future)
@@ -0,0 +1,174 @@
+import array
+import math
+import operator
+from dataclasses import dataclass, field
+from itertools import repeat
+from typing import Dict, List, Sequence
+
+from .accessor import (
+    COMPONENT_TYPE_TO_TYPECODE,
+    NORMALIZED_COMPONENT_TYPE_TO_DIVISOR,
+    UNSIGNED_BYTE,
+    UNSIGNED_INT,
+    UNSIGNED_SHORT,
+    TypedArray,
+    component_size,
+    normalize_typed_array,
+)
+
+# Export modes. Each mode includes the quantization of the previous ones.
+MESH_QUANTIZATION_NONE = "NONE"
+MESH_QUANTIZATION_INDICES = "INDICES"
+MESH_QUANTIZATION_ATTRIBUTES = "ATTRIBUTES"
+MESH_QUANTIZATION_KHR_MESH_QUANTIZATION = "KHR_MESH_QUANTIZATION"
+
+mesh_quantization_items = [
+    (
+        MESH_QUANTIZATION_NONE,
+        "None",
+        "Write indices as unsigned ints and attributes as floats",
+        0,
+    ),
+    (
+        MESH_QUANTIZATION_INDICES,
+        "Indices",
+        "Write indices with the smallest component types",
+        1,
+    ),
+    (
+        MESH_QUANTIZATION_ATTRIBUTES,
+        "Indices, UVs and Weights",
+        "Also write UVs and weights as normalized integers of glTF 2.0",
+        2,
+    ),
+    (
+        MESH_QUANTIZATION_KHR_MESH_QUANTIZATION,
+        "All with KHR_mesh_quantization",
+        "Also write morph target normals as normalized integers."
+        + " Some VRM apps don't support it",
+        3,
+    ),
+]
+MESH_QUANTIZATION_VALUES = [item[0] for item in mesh_quantization_items]
+
+
+# The maximum value of the component type can't be used as an index
+# because it is the primitive restart value.
+# https://registry.khronos.org/glTF/specs/2.0/glTF-2.0.html#meshes-overview
+def index_component_type(vertex_count: int) -> int:
+    if vertex_count <= 0xFF:
+        return UNSIGNED_BYTE
+    if vertex_count <= 0xFFFF:
+        return UNSIGNED_SHORT
+    return UNSIGNED_INT
+
+
+def convert_indices(indices: TypedArray, component_type: int) -> "array.array[int]":
+    return array.array(COMPONENT_TYPE_TO_TYPECODE[component_type], map(int, indices))
+
+
+# Values are clamped to [0, 1] and rounded to the nearest integers
+def quantize_unsigned_normalized(
+    values: Sequence[float], component_type: int
+) -> "array.array[int]":
+    divisor = NORMALIZED_COMPONENT_TYPE_TO_DIVISOR[component_type]
+    clamped = map(min, map(max, values, repeat(0.0)), repeat(1.0))
+    scaled = map(operator.mul, clamped, repeat(divisor))
+    return array.array(
+        COMPONENT_TYPE_TO_TYPECODE[component_type],
+        map(int, map(operator.add, scaled, repeat(0.5))),
+    )
+
+
+# Values are clamped to [-1, 1] and rounded to the nearest integers.
+# The minimum integer is never used, as recommended by KHR_mesh_quantization.
+def quantize_signed_normalized(
+    values: Sequence[float], component_type: int
+) -> "array.array[int]":
+    divisor = NORMALIZED_COMPONENT_TYPE_TO_DIVISOR[component_type]
+    clamped = map(min, map(max, values, repeat(-1.0)), repeat(1.0))
+    scaled = map(operator.mul, clamped, repeat(divisor))
+    return array.array(
+        COMPONENT_TYPE_TO_TYPECODE[component_type],
+        map(math.floor, map(operator.add, scaled, repeat(0.5))),
+    )
+
+
+# Quantizes flat VEC4 weights. The rounding error of each vertex is added to
+# its largest weight so that the integer weights sum to the normalized 1.
+# Vertices whose weights are all rounded to zero are kept.
+def quantize_weights(
+    weights: Sequence[float], component_type: int
+) -> "array.array[int]":
+    result = quantize_unsigned_normalized(weights, component_type)
+    one = int(NORMALIZED_COMPONENT_TYPE_TO_DIVISOR[component_type])
+    rows = list(zip(*[result[i::4] for i in range(4)]))
+    for row_index, row in enumerate(rows):
+        row_sum = sum(row)
+        if not row_sum or row_sum == one:
+            continue
+        largest_index = row_index * 4 + row.index(max(row))
+        result[largest_index] = max(0, min(one, result[largest_index] + one - row_sum))
+    return result
+
+
+def max_quantization_error(
+    values: Sequence[float], quantized: "array.array[int]", component_type: int
+) -> float:
+    dequantized = normalize_typed_array(quantized, component_type)
+    return max(map(abs, map(operator.sub, values, dequantized)), default=0.0)
+
+
+def is_in_range(values: Sequence[float], minimum: float, maximum: float) -> bool:
+    return not values or (minimum <= min(values) and max(values) <= maximum)
+
+
+@dataclass
+class QuantizationReportEntry:
+    quantized_count: int = 0
+    skipped_count: int = 0
+    original_byte_length: int = 0
+    byte_length: int = 0
+    max_error: float = 0.0
+
+
+@dataclass
+class QuantizationReport:
+    entries: Dict[str, QuantizationReportEntry] = field(default_factory=dict)
+
+    def entry(self, name: str) -> QuantizationReportEntry:
+        entry = self.entries.get(name)
+        if entry is None:
+            entry = QuantizationReportEntry()
+            self.entries[name] = entry
+        return entry
+
+    def add(
+        self,
+        name: str,
+        original_byte_length: int,
+        quantized: "array.array[int]",
+        component_type: int,
+        max_error: float = 0.0,
+    ) -> None:
+        entry = self.entry(name)
+        entry.quantized_count += 1
+        entry.original_byte_length += original_byte_length
+        entry.byte_length += len(quantized) * component_size(component_type)
+        entry.max_error = max(entry.max_error, max_error)
+
+    def skip(self, name: str) -> None:
+        self.entry(name).skipped_count += 1
+
+    def lines(self) -> List[str]:
+        lines = []
+        for name, entry in self.entries.items():
+            line = (
+                f"{name}: {entry.quantized_count} accessors,"
+                + f" {entry.original_byte_length} -> {entry.byte_length} bytes,"
+                + f" max error={entry.max_error:.7f}"
+            )
+            if entry.skipped_count:
+                line += f", {entry.skipped_count} accessors kept as floats"
+            lines.append(line)
+        return lines
@@ -3,6 +3,9 @@ from bpy.app.translations import pgettext
 
 from . import version
 from .logging import get_logger
+from .mesh_quantization import mesh_quantization_items
+from .profiler import Profiler, enabled_by_environment
+from .sparse_accessor import DEFAULT_SPARSE_MORPH_TARGET_THRESHOLD
 
 logger = get_logger(__name__)
 
@@ -48,6 +51,32 @@ class VrmAddonPreferences(bpy.types.AddonPreferences):  # type: ignore[misc]
     export_fb_ngon_encoding: bpy.props.BoolProperty(  # type: ignore[valid-type]
         name="Try the FB_ngon_encoding under development (Exported meshes can be corrupted)",  # noqa: F722
     )
+    export_sparse_morph_targets: bpy.props.BoolProperty(  # type: ignore[valid-type]
+        name="Export Sparse Morph Targets",  # noqa: F722
+        description="Write morph targets which move few vertices as sparse accessors",  # noqa: F722
+    )
+    sparse_morph_target_threshold: bpy.props.FloatProperty(  # type: ignore[valid-type]
+        name="Sparse Morph Target Threshold",  # noqa: F722
+        description="The maximum ratio of moved vertices to write a morph target as a sparse accessor",  # noqa: F722
+        default=DEFAULT_SPARSE_MORPH_TARGET_THRESHOLD,
+        min=0.0,
+        max=1.0,
+        subtype="FACTOR",  # noqa: F821
+    )
+    export_mesh_quantization: bpy.props.EnumProperty(  # type: ignore[valid-type]
+        items=mesh_quantization_items,
+        name="Mesh Quantization",  # noqa: F722
+        description="Write VRM 0.x meshes with smaller component types",  # noqa: F722
+    )
+    export_optimize_vertex_cache: bpy.props.BoolProperty(  # type: ignore[valid-type]
+        name="Optimize Vertex Cache",  # noqa: F722
+        description="Reorder the triangles and vertices of VRM 0.x meshes for the GPU vertex cache",  # noqa: F722
+    )
+
+    enable_profiling: bpy.props.BoolProperty(  # type: ignore[valid-type]
+        name="Record Import/Export Profiles",  # noqa: F722
+        description="Write the time and memory usage of import/export phases to a JSON file",  # noqa: F722
+    )
 
     def draw(self, _context: bpy.types.Context) -> None:
         layout = self.layout
@@ -81,6 +110,15 @@ class VrmAddonPreferences(bpy.types.AddonPreferences):  # type: ignore[misc]
         if self.enable_advanced_preferences:
             advanced_options_box = export_box.box()
             advanced_options_box.prop(self, "export_fb_ngon_encoding")
+            advanced_options_box.prop(self, "export_sparse_morph_targets")
+            if self.export_sparse_morph_targets:
+                advanced_options_box.prop(self, "sparse_morph_target_threshold")
+            advanced_options_box.prop(self, "export_mesh_quantization")
+            advanced_options_box.prop(self, "export_optimize_vertex_cache")
+
+        profiling_box = layout.box()
+        profiling_box.label(text="Profiling", icon="TIME")
+        profiling_box.prop(self, "enable_profiling")
 
 
 def use_legacy_importer_exporter() -> bool:
@@ -100,3 +138,10 @@ def get_preferences(context: bpy.types.Context) -> VrmAddonPreferences:
         )
 
     return preferences
+
+
+def create_profiler(context: bpy.types.Context) -> Profiler:
+    return Profiler(
+        enabled=enabled_by_environment()
+        or bool(get_preferences(context).enable_profiling)
+    )
@@ -0,0 +1,174 @@
+import json
+import os
+import re
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional
+
+from .deep import Json
+from .logging import get_logger
+
+logger = get_logger(__name__)
+
+ENABLE_PROFILING_ENVIRONMENT_VARIABLE_NAME = "BLENDER_VRM_PROFILE"
+PROFILE_DIRECTORY_ENVIRONMENT_VARIABLE_NAME = "BLENDER_VRM_PROFILE_DIR"
+
+
+def enabled_by_environment() -> bool:
+    return os.environ.get(ENABLE_PROFILING_ENVIRONMENT_VARIABLE_NAME) == "true"
+
+
+@dataclass
+class ProfilePhase:
+    name: str
+    wall_seconds: float = 0.0
+    cpu_seconds: float = 0.0
+    # None if tracemalloc can't measure the peak of nested phases
+    peak_memory_bytes: Optional[int] = None
+    children: List["ProfilePhase"] = field(default_factory=list)
+
+    def to_json(self) -> Dict[str, Json]:
+        json_dict: Dict[str, Json] = {
+            "name": self.name,
+            "wall_seconds": self.wall_seconds,
+            "cpu_seconds": self.cpu_seconds,
+            "peak_memory_bytes": self.peak_memory_bytes,
+        }
+        if self.children:
+            json_dict["phases"] = [child.to_json() for child in self.children]
+        return json_dict
+
+    def summary_lines(self, depth: int = 0) -> List[str]:
+        peak_memory = "-"
+        if self.peak_memory_bytes is not None:
+            peak_memory = f"{self.peak_memory_bytes / 1024 / 1024:.1f}MiB"
+        lines = [
+            "  " * depth
+            + f"{self.name}: wall={self.wall_seconds:.3f}s"
+            + f" cpu={self.cpu_seconds:.3f}s peak_memory={peak_memory}"
+        ]
+        for child in self.children:
+            lines.extend(child.summary_lines(depth + 1))
+        return lines
+
+
+@dataclass
+class ProfileFrame:
+    phase: ProfilePhase
+    start_wall_seconds: float
+    start_cpu_seconds: float
+    start_memory_bytes: int
+    peak_memory_bytes: int
+
+
+class Profiler:
+    def __init__(self, enabled: bool = False) -> None:
+        self.enabled = enabled
+        self.phases: List[ProfilePhase] = []
+        self.frames: List[ProfileFrame] = []
+        self.started_tracemalloc = False
+        self.created_at = datetime.now()
+
+    def begin(self, name: str) -> None:
+        if not self.enabled:
+            return
+        if not self.frames and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.started_tracemalloc = True
+
+        current_memory_bytes, peak_memory_bytes = tracemalloc.get_traced_memory()
+        if self.frames:
+            parent = self.frames[-1]
+            parent.peak_memory_bytes = max(parent.peak_memory_bytes, peak_memory_bytes)
+        # tracemalloc.reset_peak() is available in Python 3.9 or later
+        reset_peak = getattr(tracemalloc, "reset_peak", None)
+        if reset_peak is not None:
+            reset_peak()
+
+        phase = ProfilePhase(name)
+        if self.frames:
+            self.frames[-1].phase.children.append(phase)
+        else:
+            self.phases.append(phase)
+        self.frames.append(
+            ProfileFrame(
+                phase=phase,
+                start_wall_seconds=time.perf_counter(),
+                start_cpu_seconds=time.process_time(),
+                start_memory_bytes=current_memory_bytes,
+                peak_memory_bytes=current_memory_bytes,
+            )
+        )
+
+    def end(self) -> None:
+        if not self.enabled or not self.frames:
+            return
+        frame = self.frames.pop()
+        phase = frame.phase
+        phase.wall_seconds = time.perf_counter() - frame.start_wall_seconds
+        phase.cpu_seconds = time.process_time() - frame.start_cpu_seconds
+        _, peak_memory_bytes = tracemalloc.get_traced_memory()
+        frame.peak_memory_bytes = max(frame.peak_memory_bytes, peak_memory_bytes)
+        if hasattr(tracemalloc, "reset_peak") or not self.frames:
+            phase.peak_memory_bytes = frame.peak_memory_bytes - frame.start_memory_bytes
+
+        if self.frames:
+            parent = self.frames[-1]
+            parent.peak_memory_bytes = max(
+                parent.peak_memory_bytes, frame.peak_memory_bytes
+            )
+        elif self.started_tracemalloc:
+            tracemalloc.stop()
+            self.started_tracemalloc = False
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        depth = len(self.frames)
+        self.begin(name)
+        try:
+            yield
+        finally:
+            # Also closes phases left open by an exception
+            while len(self.frames) > depth:
+                self.end()
+
+    def to_json(self) -> Dict[str, Json]:
+        return {
+            "created_at": self.created_at.isoformat(),
+            "phases": [phase.to_json() for phase in self.phases],
+        }
+
+    def report(self, kind: str, filepath: str) -> Optional[str]:
+        if not self.enabled or not self.phases:
+            return None
+
+        lines = [f"Profile of {kind} {filepath}"]
+        for phase in self.phases:
+            lines.extend(phase.summary_lines(1))
+        logger.info("\n".join(lines))
+
+        directory = os.environ.get(PROFILE_DIRECTORY_ENVIRONMENT_VARIABLE_NAME)
+        if not directory:
+            directory = tempfile.gettempdir()
+        basename = re.sub(
+            r"[^0-9A-Za-z_.-]", "_", os.path.splitext(os.path.basename(filepath))[0]
+        )
+        report_path = os.path.join(
+            directory,
+            f"vrm_{kind}_profile_{self.created_at:%Y%m%d_%H%M%S}_{basename}.json",
+        )
+        report: Dict[str, Json] = {"kind": kind, "filepath": filepath}
+        report.update(self.to_json())
+        try:
+            os.makedirs(directory, exist_ok=True)
+            with open(report_path, "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2)
+        except OSError:
+            logger.exception(f"Failed to write a profile report to {report_path}")
+            return None
+        logger.info(f"Wrote a profile report to {report_path}")
+        return report_path
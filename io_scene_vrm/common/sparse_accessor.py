@@ -0,0 +1,276 @@
+import array
+from dataclasses import dataclass
+from itertools import compress
+from typing import Dict, List, Optional, Set
+
+from . import vertex_buffer
+from .accessor import (
+    COMPONENT_TYPE_TO_TYPECODE,
+    FLOAT,
+    TYPE_TO_COMPONENT_COUNT,
+    UNSIGNED_BYTE,
+    UNSIGNED_INT,
+    UNSIGNED_SHORT,
+    TypedArray,
+    component_size,
+    decode_accessor,
+    int_or_none,
+)
+from .deep import Json
+
+# Morph targets which move at most this ratio of vertices are written as
+# sparse accessors by default
+DEFAULT_SPARSE_MORPH_TARGET_THRESHOLD = 0.5
+
+
+@dataclass(frozen=True)
+class SparseValues:
+    # Strictly increasing element indices
+    indices: "array.array[int]"
+    indices_component_type: int
+    # Flat component values of the indexed elements
+    values: TypedArray
+    component_type: int
+
+    def __len__(self) -> int:
+        return len(self.indices)
+
+    def byte_length(self) -> int:
+        indices_byte_length = len(self.indices) * component_size(
+            self.indices_component_type
+        )
+        values_byte_length = len(self.values) * component_size(self.component_type)
+        return indices_byte_length + values_byte_length
+
+
+def sparse_indices_component_type(element_count: int) -> int:
+    if element_count <= 0xFF:
+        return UNSIGNED_BYTE
+    if element_count <= 0xFFFF:
+        return UNSIGNED_SHORT
+    return UNSIGNED_INT
+
+
+# Returns the non-zero elements of the values if their ratio is not greater
+# than the threshold and the sparse form is smaller than the dense one.
+# The result is lossless because omitted elements are initialized with zeros.
+def create_sparse_values(
+    values: TypedArray,
+    component_count: int,
+    threshold: float,
+    component_type: int = FLOAT,
+) -> Optional[SparseValues]:
+    element_count = len(values) // component_count
+    if not element_count:
+        return None
+    non_zero_flags = list(
+        map(any, zip(*[values[i::component_count] for i in range(component_count)]))
+    )
+    non_zero_count = sum(non_zero_flags)
+    if non_zero_count > element_count * threshold:
+        return None
+    # The sparse count must be greater than zero even if all elements are zero
+    indices: List[int] = list(compress(range(element_count), non_zero_flags)) or [0]
+
+    indices_component_type = sparse_indices_component_type(element_count)
+    sparse_values = SparseValues(
+        indices=array.array(
+            COMPONENT_TYPE_TO_TYPECODE[indices_component_type], indices
+        ),
+        indices_component_type=indices_component_type,
+        values=vertex_buffer.gather_rows(
+            array.array(COMPONENT_TYPE_TO_TYPECODE[component_type], values),
+            component_count,
+            indices,
+        ),
+        component_type=component_type,
+    )
+    if sparse_values.byte_length() >= len(values) * component_size(component_type):
+        return None
+    return sparse_values
+
+
+def sparse_accessor_dict(
+    sparse_values: SparseValues,
+    indices_buffer_view_index: int,
+    values_buffer_view_index: int,
+) -> Dict[str, Json]:
+    return {
+        "count": len(sparse_values),
+        "indices": {
+            "bufferView": indices_buffer_view_index,
+            "componentType": sparse_values.indices_component_type,
+        },
+        "values": {
+            "bufferView": values_buffer_view_index,
+        },
+    }
+
+
+def morph_target_accessor_indices(json_dict: Dict[str, Json]) -> List[int]:
+    accessor_indices: Dict[int, None] = {}
+    mesh_dicts = json_dict.get("meshes")
+    if not isinstance(mesh_dicts, list):
+        return []
+    for mesh_dict in mesh_dicts:
+        if not isinstance(mesh_dict, dict):
+            continue
+        primitive_dicts = mesh_dict.get("primitives")
+        if not isinstance(primitive_dicts, list):
+            continue
+        for primitive_dict in primitive_dicts:
+            if not isinstance(primitive_dict, dict):
+                continue
+            target_dicts = primitive_dict.get("targets")
+            if not isinstance(target_dicts, list):
+                continue
+            for target_dict in target_dicts:
+                if not isinstance(target_dict, dict):
+                    continue
+                for accessor_index in target_dict.values():
+                    if isinstance(accessor_index, int):
+                        accessor_indices[accessor_index] = None
+    return list(accessor_indices)
+
+
+def append_buffer_view(
+    json_dict: Dict[str, Json], buffer: bytearray, binary: bytes
+) -> int:
+    buffer_view_dicts = json_dict.get("bufferViews")
+    if not isinstance(buffer_view_dicts, list):
+        buffer_view_dicts = []
+        json_dict["bufferViews"] = buffer_view_dicts
+    # Accessor data must be aligned to the component size
+    buffer.extend(bytes(-len(buffer) % 4))
+    buffer_view_dicts.append(
+        {
+            "buffer": 0,
+            "byteOffset": len(buffer),
+            "byteLength": len(binary),
+        }
+    )
+    buffer.extend(binary)
+    return len(buffer_view_dicts) - 1
+
+
+def collect_buffer_view_references(json: Json, buffer_view_indices: Set[int]) -> None:
+    if isinstance(json, dict):
+        for key, value in json.items():
+            if key == "bufferView" and isinstance(value, int):
+                buffer_view_indices.add(value)
+            else:
+                collect_buffer_view_references(value, buffer_view_indices)
+    elif isinstance(json, list):
+        for value in json:
+            collect_buffer_view_references(value, buffer_view_indices)
+
+
+def remap_buffer_view_references(json: Json, index_map: Dict[int, int]) -> None:
+    if isinstance(json, dict):
+        for key, value in json.items():
+            if key == "bufferView" and isinstance(value, int):
+                json[key] = index_map.get(value, value)
+            else:
+                remap_buffer_view_references(value, index_map)
+    elif isinstance(json, list):
+        for value in json:
+            remap_buffer_view_references(value, index_map)
+
+
+# Removes the bufferViews of the first buffer which are no longer referenced,
+# and packs the remaining ones.
+def remove_unused_buffer_views(json_dict: Dict[str, Json], buffer: bytearray) -> None:
+    buffer_view_dicts = json_dict.get("bufferViews")
+    if not isinstance(buffer_view_dicts, list):
+        return
+    used_buffer_view_indices: Set[int] = set()
+    for key, value in json_dict.items():
+        if key != "bufferViews":
+            collect_buffer_view_references(value, used_buffer_view_indices)
+
+    packed_buffer = bytearray()
+    packed_buffer_view_dicts: List[Json] = []
+    index_map: Dict[int, int] = {}
+    for buffer_view_index, buffer_view_dict in enumerate(buffer_view_dicts):
+        if (
+            not isinstance(buffer_view_dict, dict)
+            or buffer_view_dict.get("buffer", 0) != 0
+        ):
+            index_map[buffer_view_index] = len(packed_buffer_view_dicts)
+            packed_buffer_view_dicts.append(buffer_view_dict)
+            continue
+        if buffer_view_index not in used_buffer_view_indices:
+            continue
+        byte_offset = int_or_none(buffer_view_dict, "byteOffset") or 0
+        byte_length = int_or_none(buffer_view_dict, "byteLength") or 0
+        packed_buffer.extend(bytes(-len(packed_buffer) % 4))
+        buffer_view_dict["byteOffset"] = len(packed_buffer)
+        packed_buffer.extend(
+            memoryview(buffer)[slice(byte_offset, byte_offset + byte_length)]
+        )
+        index_map[buffer_view_index] = len(packed_buffer_view_dicts)
+        packed_buffer_view_dicts.append(buffer_view_dict)
+
+    json_dict["bufferViews"] = packed_buffer_view_dicts
+    for key, value in json_dict.items():
+        if key != "bufferViews":
+            remap_buffer_view_references(value, index_map)
+    buffer[:] = packed_buffer
+
+
+# Rewrites the dense float accessors of the morph targets as sparse accessors
+# in place and returns the number of bytes saved from the buffer.
+def convert_morph_target_accessors_to_sparse(
+    json_dict: Dict[str, Json], buffer: bytearray, threshold: float
+) -> int:
+    accessor_dicts = json_dict.get("accessors")
+    if not isinstance(accessor_dicts, list):
+        return 0
+
+    original_byte_length = len(buffer)
+    converted = False
+    for accessor_index in morph_target_accessor_indices(json_dict):
+        if not 0 <= accessor_index < len(accessor_dicts):
+            continue
+        accessor_dict = accessor_dicts[accessor_index]
+        if (
+            not isinstance(accessor_dict, dict)
+            or "sparse" in accessor_dict
+            or int_or_none(accessor_dict, "bufferView") is None
+            or accessor_dict.get("componentType") != FLOAT
+        ):
+            continue
+        accessor_type = accessor_dict.get("type")
+        if not isinstance(accessor_type, str):
+            continue
+        component_count = TYPE_TO_COMPONENT_COUNT.get(accessor_type)
+        if component_count is None:
+            continue
+        decoded = decode_accessor(json_dict, buffer, accessor_index)
+        if decoded is None:
+            continue
+        sparse_values = create_sparse_values(decoded.values, component_count, threshold)
+        if sparse_values is None:
+            continue
+
+        indices_buffer_view_index = append_buffer_view(
+            json_dict,
+            buffer,
+            vertex_buffer.to_little_endian_bytes(sparse_values.indices),
+        )
+        values_buffer_view_index = append_buffer_view(
+            json_dict,
+            buffer,
+            vertex_buffer.to_little_endian_bytes(sparse_values.values),
+        )
+        accessor_dict.pop("bufferView", None)
+        accessor_dict.pop("byteOffset", None)
+        accessor_dict["sparse"] = sparse_accessor_dict(
+            sparse_values, indices_buffer_view_index, values_buffer_view_index
+        )
+        converted = True
+
+    if not converted:
+        return 0
+    remove_unused_buffer_views(json_dict, buffer)
+    return original_byte_length - len(buffer)
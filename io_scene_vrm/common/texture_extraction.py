@@ -0,0 +1,135 @@
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Sequence, Set, Tuple, Union
+
+from .accessor import read_buffer_view
+from .deep import Json
+
+# The number of suffixed names tried when a file name already exists
+UNIQUE_NAME_RETRY_LIMIT = 100000
+
+
+# Lists the file names once so that name collisions can be resolved without
+# checking the existence of each candidate. The names are compared with
+# os.path.normcase() to follow case insensitive file systems on Windows.
+def list_file_names(dir_path: str) -> Set[str]:
+    try:
+        return set(map(os.path.normcase, os.listdir(dir_path)))
+    except OSError:
+        return set()
+
+
+def contains_file_name(file_names: Set[str], file_name: str) -> bool:
+    return os.path.normcase(file_name) in file_names
+
+
+# Returns the first name of root + ext, root + "_1" + ext, root + "_2" + ext, ...
+# which is not in the file names, and adds it to them.
+# Returns None if all of them are used.
+def reserve_unique_file_name(
+    root: str,
+    ext: str,
+    file_names: Set[str],
+    retry_limit: int = UNIQUE_NAME_RETRY_LIMIT,
+) -> Optional[str]:
+    for retry_count in range(retry_limit + 1):
+        file_name = root + ext if retry_count == 0 else f"{root}_{retry_count}{ext}"
+        if contains_file_name(file_names, file_name):
+            continue
+        file_names.add(os.path.normcase(file_name))
+        return file_name
+    return None
+
+
+# Creates the first directory of path, path.1, path.2, ... which doesn't exist.
+# Returns the path as it is if all of them exist.
+def make_new_directory(path: str, retry_limit: int = UNIQUE_NAME_RETRY_LIMIT) -> str:
+    parent_path, name = os.path.split(path)
+    file_names = list_file_names(parent_path or os.curdir)
+    for retry_count in range(retry_limit + 1):
+        directory_name = name if retry_count == 0 else f"{name}.{retry_count}"
+        if contains_file_name(file_names, directory_name):
+            continue
+        directory_path = os.path.join(parent_path, directory_name)
+        os.mkdir(directory_path)
+        return directory_path
+    return path
+
+
+def write_file(path: str, data: Union[bytes, memoryview]) -> None:
+    with open(path, "wb") as file:
+        file.write(data)
+
+
+# Writes the files concurrently. The GIL is released while writing, so the
+# payloads such as slices of the GLB BIN chunk are written in parallel.
+# The first error is raised after all writes have finished.
+def write_files(
+    path_and_data_list: Sequence[Tuple[str, Union[bytes, memoryview]]],
+    max_workers: Optional[int] = None,
+) -> None:
+    if len(path_and_data_list) <= 1:
+        for path, data in path_and_data_list:
+            write_file(path, data)
+        return
+    paths = [path for path, _ in path_and_data_list]
+    payloads = [data for _, data in path_and_data_list]
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        list(executor.map(write_file, paths, payloads))
+
+
+# Maps the index of each image whose bufferView payload and mimeType are the
+# same as an earlier image to the index of the earliest one. Only the payloads
+# which have the same byte length as another one are hashed.
+def create_image_index_remap(
+    json_dict: Dict[str, Json], binary: Union[bytes, bytearray, memoryview]
+) -> Dict[int, int]:
+    image_dicts = json_dict.get("images")
+    if not isinstance(image_dicts, list):
+        return {}
+
+    payloads: Dict[int, memoryview] = {}
+    image_index_groups: Dict[Tuple[str, int], List[int]] = {}
+    for image_index, image_dict in enumerate(image_dicts):
+        if not isinstance(image_dict, dict):
+            continue
+        buffer_view_index = image_dict.get("bufferView")
+        if not isinstance(buffer_view_index, int):
+            continue
+        mime_type = image_dict.get("mimeType")
+        if not isinstance(mime_type, str):
+            mime_type = ""
+        try:
+            payload = read_buffer_view(json_dict, binary, buffer_view_index)
+        except ValueError:
+            continue
+        payloads[image_index] = payload
+        image_index_groups.setdefault((mime_type, len(payload)), []).append(image_index)
+
+    image_index_remap: Dict[int, int] = {}
+    for image_indices in image_index_groups.values():
+        if len(image_indices) < 2:
+            continue
+        digest_to_image_index: Dict[bytes, int] = {}
+        for image_index in image_indices:
+            digest = hashlib.sha256(payloads[image_index]).digest()
+            first_image_index = digest_to_image_index.setdefault(digest, image_index)
+            if first_image_index != image_index:
+                image_index_remap[image_index] = first_image_index
+    return image_index_remap
+
+
+# Returns True if the image has already been used with another color space by
+# another image index. Such image is shared by identical images, so it must be
+# copied before changing the color space.
+def is_image_shared_with_another_colorspace(
+    image_name_to_first_colorspace: Dict[str, Tuple[int, str]],
+    image_name: str,
+    image_index: int,
+    colorspace: str,
+) -> bool:
+    first_image_index, first_colorspace = image_name_to_first_colorspace.get(
+        image_name, (image_index, colorspace)
+    )
+    return first_image_index != image_index and first_colorspace != colorspace
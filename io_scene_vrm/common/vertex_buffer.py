@@ -0,0 +1,399 @@
+import array
+import operator
+import sys
+from collections import Counter
+from dataclasses import dataclass
+from heapq import nlargest
+from itertools import accumulate, chain, compress, count, repeat
+from math import fsum, sqrt
+from typing import Dict, List, Optional, Sequence, Tuple, TypeVar, Union
+
+from .accessor import COMPONENT_TYPE_TO_TYPECODE, UNSIGNED_INT, TypedArray
+from .vertex_cache import fan_ranges
+
+# Typed array helpers for building glTF vertex attributes from flat arrays
+# such as the ones filled by bpy_prop_collection.foreach_get().
+# All operations run per component column to avoid Python loops per vertex.
+
+T = TypeVar("T", int, float)
+
+
+def create_array(typecode: str, length: int) -> "array.array[T]":
+    return array.array(typecode, bytes(array.array(typecode).itemsize * length))
+
+
+def gather_rows(
+    values: "array.array[T]", component_count: int, row_indices: Sequence[int]
+) -> "array.array[T]":
+    if component_count == 1:
+        return array.array(values.typecode, map(values.__getitem__, row_indices))
+    result: "array.array[T]" = create_array(
+        values.typecode, len(row_indices) * component_count
+    )
+    for i in range(component_count):
+        column = values[i::component_count]
+        result[i::component_count] = array.array(
+            values.typecode, map(column.__getitem__, row_indices)
+        )
+    return result
+
+
+# Gathers fixed size rows of packed binary data such as vertex attribute bins
+def gather_byte_rows(
+    binary: Union[bytes, bytearray, memoryview],
+    row_count: int,
+    row_indices: Sequence[int],
+) -> bytes:
+    data = bytes(binary)
+    if not row_count:
+        return data
+    row_size = len(data) // row_count
+    return b"".join(
+        map(
+            data.__getitem__,
+            map(
+                slice,
+                map(row_size.__mul__, row_indices),
+                map(row_size.__mul__, map((1).__add__, row_indices)),
+            ),
+        )
+    )
+
+
+def subtract(
+    left: "array.array[float]", right: "array.array[float]"
+) -> "array.array[float]":
+    return array.array(left.typecode, map(operator.sub, left, right))
+
+
+# Same conversion as axis_blender_to_glb() of the legacy exporter for flat VEC3 arrays
+def blender_to_glb_vec3(values: "array.array[float]") -> "array.array[float]":
+    result = array.array(values.typecode, values)
+    result[0::3] = array.array(values.typecode, map(operator.neg, values[0::3]))
+    result[1::3] = values[2::3]
+    result[2::3] = values[1::3]
+    return result
+
+
+# Blender and glTF have the opposite V axes
+def blender_to_glb_uv(values: "array.array[float]") -> "array.array[float]":
+    result = array.array(values.typecode, values)
+    result[1::2] = array.array(
+        values.typecode, map(operator.sub, [1.0] * (len(values) // 2), values[1::2])
+    )
+    return result
+
+
+# The axis and V axis conversions are their own inverses
+def glb_to_blender_vec3(values: "array.array[float]") -> "array.array[float]":
+    return blender_to_glb_vec3(values)
+
+
+def glb_to_blender_uv(values: "array.array[float]") -> "array.array[float]":
+    return blender_to_glb_uv(values)
+
+
+# Pads flat RGB colors with alpha 1. RGBA colors are copied as they are.
+def to_rgba(values: Sequence[float], component_count: int) -> "array.array[float]":
+    if component_count == 4:
+        return array.array("f", values)
+    result = array.array("f", [1.0]) * (len(values) // component_count * 4)
+    for i in range(min(component_count, 4)):
+        result[i::4] = array.array("f", values[i::component_count])
+    return result
+
+
+def vec3_min_max(values: "array.array[float]") -> Optional[List[List[float]]]:
+    if not values:
+        return None
+    columns = [values[i::3] for i in range(3)]
+    return [
+        [min(column) for column in columns],
+        [max(column) for column in columns],
+    ]
+
+
+def to_little_endian_bytes(values: TypedArray) -> bytes:
+    if sys.byteorder != "little":
+        values = array.array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+@dataclass(frozen=True)
+class WeldedVertices:
+    # The first source row of each unique vertex
+    source_row_indices: "array.array[int]"
+    # The unique vertex index of each corner. It can be used as an index buffer.
+    indices: "array.array[int]"
+
+    def __len__(self) -> int:
+        return len(self.source_row_indices)
+
+
+# Welds rows whose attributes are identical. Each row is hashed as one bytes
+# object packed from all attributes, so 0.0 and -0.0 are distinguished and
+# identical NaNs are welded. Unique vertices are numbered in corner order.
+def weld_vertices(
+    row_count: int,
+    attributes: Sequence[TypedArray],
+    corner_row_indices: Sequence[int],
+) -> WeldedVertices:
+    for attribute in attributes:
+        if row_count and len(attribute) % row_count:
+            raise ValueError(
+                f"Attribute length {len(attribute)} is not a multiple of"
+                + f" the row count {row_count}"
+            )
+    attribute_bytes_list = [attribute.tobytes() for attribute in attributes]
+    row_size = sum(map(len, attribute_bytes_list)) // max(row_count, 1)
+
+    packed = bytearray(row_count * row_size)
+    offset = 0
+    for attribute_bytes in attribute_bytes_list:
+        attribute_row_size = len(attribute_bytes) // max(row_count, 1)
+        for i in range(attribute_row_size):
+            packed[slice(offset + i, None, row_size)] = attribute_bytes[
+                slice(i, None, attribute_row_size)
+            ]
+        offset += attribute_row_size
+    packed_bytes = bytes(packed)
+    row_keys = [b""] * row_count
+    if row_size:
+        row_keys = list(
+            map(
+                packed_bytes.__getitem__,
+                map(
+                    slice,
+                    range(0, len(packed_bytes), row_size),
+                    range(row_size, len(packed_bytes) + 1, row_size),
+                ),
+            )
+        )
+
+    corner_keys = list(map(row_keys.__getitem__, corner_row_indices))
+    unique_keys = dict.fromkeys(corner_keys)
+    # Iterate in reverse so that the first corner of each key remains
+    first_row_indices = dict(zip(reversed(corner_keys), reversed(corner_row_indices)))
+    unique_key_indices = dict(zip(unique_keys, count()))
+    return WeldedVertices(
+        source_row_indices=array.array(
+            "i", map(first_row_indices.__getitem__, unique_keys)
+        ),
+        indices=array.array(
+            COMPONENT_TYPE_TO_TYPECODE[UNSIGNED_INT],
+            map(unique_key_indices.__getitem__, corner_keys),
+        ),
+    )
+
+
+# Selects the 4 largest (weight, joint index) pairs of each vertex in the same
+# order as sorting them in reverse. Missing pairs are filled with (0.0, 0).
+def select_joint_weights(
+    influences: Sequence[Sequence[Tuple[float, int]]],
+) -> Tuple["array.array[int]", "array.array[float]"]:
+    padding = [(0.0, 0)] * 4
+    selected = list(
+        chain.from_iterable(
+            nlargest(4, chain(vertex_influences, padding))
+            for vertex_influences in influences
+        )
+    )
+    return (
+        array.array("H", map(operator.itemgetter(1), selected)),
+        array.array("d", map(operator.itemgetter(0), selected)),
+    )
+
+
+# Groups the vertex indices by the joint index and the weight, so that each
+# group can be assigned to a vertex group at once. The weights of the same
+# joint of a vertex such as JOINTS_0=[18, 18, 0, 0] are summed up. Joints are
+# ordered by their first appearance and kept even if all their weights are zero.
+def group_joint_weights(
+    joints: Sequence[Sequence[int]], weights: Sequence[Sequence[float]]
+) -> Dict[int, Dict[float, List[int]]]:
+    joint_vertex_weights: Dict[int, Dict[int, float]] = {}
+    for vertex_index, (vertex_joints, vertex_weights) in enumerate(
+        zip(joints, weights)
+    ):
+        for joint, weight in zip(vertex_joints, vertex_weights):
+            vertex_weight_dict = joint_vertex_weights.get(joint)
+            if vertex_weight_dict is None:
+                vertex_weight_dict = {}
+                joint_vertex_weights[joint] = vertex_weight_dict
+            vertex_weight_dict[vertex_index] = (
+                vertex_weight_dict.get(vertex_index, 0.0) + weight
+            )
+
+    result: Dict[int, Dict[float, List[int]]] = {}
+    for joint, vertex_weight_dict in joint_vertex_weights.items():
+        weight_to_vertex_indices: Dict[float, List[int]] = {}
+        for vertex_index, weight in vertex_weight_dict.items():
+            if weight == 0.0:
+                continue
+            vertex_indices = weight_to_vertex_indices.get(weight)
+            if vertex_indices is None:
+                vertex_indices = []
+                weight_to_vertex_indices[weight] = vertex_indices
+            vertex_indices.append(vertex_index)
+        result[joint] = weight_to_vertex_indices
+    return result
+
+
+# Batched version of normalize_weights_compatible_with_gl_float() of the legacy
+# exporter for flat VEC4 weights. Weights are normalized repeatedly while
+# simulating float32 rounding, until their sums stop getting closer to 1.
+# Weights whose sum is zero can't be normalized and are kept.
+def normalize_weights(weights: Sequence[float]) -> "array.array[float]":
+    epsilon = sys.float_info.epsilon
+    result = array.array("f", weights)
+    sums = list(map(sum, zip(*[weights[i::4] for i in range(4)])))
+    active = [
+        vertex_index
+        for vertex_index, weight_sum in enumerate(sums)
+        if not abs(weight_sum - 1.0) < epsilon and weight_sum != 0
+    ]
+    for _ in range(10):
+        if not active:
+            break
+        columns = [
+            array.array("f", map(result[i::4].__getitem__, active)) for i in range(4)
+        ]
+        column_sums = list(map(sum, zip(*columns)))
+        next_columns = [
+            array.array("f", map(operator.truediv, column, column_sums))
+            for column in columns
+        ]
+        errors = map(abs, map(operator.sub, repeat(1.0), map(fsum, zip(*columns))))
+        next_errors = map(
+            abs, map(operator.sub, repeat(1.0), map(fsum, zip(*next_columns)))
+        )
+        improved_rows = [
+            row
+            for row, (error, next_error) in enumerate(zip(errors, next_errors))
+            if error >= epsilon and error > next_error
+        ]
+        for i, next_column in enumerate(next_columns):
+            column = result[i::4]
+            for row in improved_rows:
+                column[active[row]] = next_column[row]
+            result[i::4] = column
+        active = [active[row] for row in improved_rows]
+    return result
+
+
+@dataclass(frozen=True)
+class Polygons:
+    # The vertex index of each loop
+    loop_vertex_indices: "array.array[int]"
+    # The loop count of each polygon
+    loop_totals: "array.array[int]"
+
+    def __len__(self) -> int:
+        return len(self.loop_totals)
+
+    def loop_starts(self) -> "array.array[int]":
+        if not self.loop_totals:
+            return array.array("i")
+        return array.array(
+            "i", accumulate(chain([0], self.loop_totals[slice(len(self) - 1)]))
+        )
+
+
+# Builds the polygons of flat triangle indices. If merge_fans is true,
+# consecutive triangles sharing the first vertex are merged into one polygon
+# as FB_ngon_encoding specifies. The remaining vertex of each merged triangle
+# is appended to the polygon.
+def create_polygons(indices: Sequence[int], merge_fans: bool) -> Polygons:
+    triangle_count = len(indices) // 3
+    if not merge_fans:
+        return Polygons(
+            loop_vertex_indices=array.array("i", indices[slice(triangle_count * 3)]),
+            loop_totals=array.array("i", [3]) * triangle_count,
+        )
+    ranges = fan_ranges(indices)
+    fan_start_flags = bytearray(triangle_count)
+    for fan_range in ranges:
+        fan_start_flags[fan_range.start] = 1
+    corner_flags = chain.from_iterable(zip(fan_start_flags, fan_start_flags, repeat(1)))
+    return Polygons(
+        loop_vertex_indices=array.array(
+            "i", compress(indices[slice(triangle_count * 3)], corner_flags)
+        ),
+        loop_totals=array.array("i", [len(fan_range) + 2 for fan_range in ranges]),
+    )
+
+
+def join_polygons(polygons_list: Sequence[Polygons]) -> Polygons:
+    return Polygons(
+        loop_vertex_indices=array.array(
+            "i",
+            chain.from_iterable(
+                polygons.loop_vertex_indices for polygons in polygons_list
+            ),
+        ),
+        loop_totals=array.array(
+            "i", chain.from_iterable(polygons.loop_totals for polygons in polygons_list)
+        ),
+    )
+
+
+@dataclass(frozen=True)
+class RowGroups:
+    # Row indices sorted by their groups
+    row_indices: "array.array[int]"
+    # The end of the range of row_indices of each group
+    group_ends: "array.array[int]"
+
+    def __len__(self) -> int:
+        return len(self.group_ends)
+
+
+# Sorts the rows by their groups, such as the loops by their vertices, so that
+# the rows of many arrays sharing the same grouping can be summed in bulk.
+def group_rows(group_indices: Sequence[int], group_count: int) -> RowGroups:
+    group_row_counts = Counter(group_indices)
+    return RowGroups(
+        row_indices=array.array(
+            "i", sorted(range(len(group_indices)), key=group_indices.__getitem__)
+        ),
+        group_ends=array.array(
+            "i", accumulate(map(group_row_counts.__getitem__, range(group_count)))
+        ),
+    )
+
+
+def sum_grouped_rows(
+    values: Sequence[float], component_count: int, row_groups: RowGroups
+) -> "array.array[float]":
+    result: "array.array[float]" = create_array("d", len(row_groups) * component_count)
+    group_ends = row_groups.group_ends
+    for i in range(component_count):
+        column = values[i::component_count]
+        sorted_column = list(map(column.__getitem__, row_groups.row_indices))
+        group_slices = map(slice, chain([0], group_ends), group_ends)
+        result[i::component_count] = array.array(
+            "d", map(fsum, map(sorted_column.__getitem__, group_slices))
+        )
+    return result
+
+
+# Rows whose length is not greater than epsilon become zero vectors
+def normalize_vec3(values: Sequence[float]) -> "array.array[float]":
+    epsilon = sys.float_info.epsilon
+    columns = [values[i::3] for i in range(3)]
+    lengths = list(
+        map(
+            sqrt,
+            map(fsum, zip(*[map(operator.mul, column, column) for column in columns])),
+        )
+    )
+    divisors = list(map(max, lengths, repeat(epsilon)))
+    non_zero_flags = list(map(epsilon.__lt__, lengths))
+    result: "array.array[float]" = create_array("d", len(values))
+    for i, column in enumerate(columns):
+        result[i::3] = array.array(
+            "d",
+            map(operator.mul, map(operator.truediv, column, divisors), non_zero_flags),
+        )
+    return result
@@ -0,0 +1,210 @@
+import array
+from itertools import chain, count, repeat
+from typing import Dict, List, Optional, Sequence
+
+# Tom Forsyth, "Linear-Speed Vertex Cache Optimisation"
+# https://tomforsyth1000.github.io/papers/fast_vert_cache_opt.html
+DEFAULT_CACHE_SIZE = 32
+CACHE_DECAY_POWER = 1.5
+LAST_TRIANGLE_SCORE = 0.75
+VALENCE_BOOST_SCALE = 2.0
+VALENCE_BOOST_POWER = 0.5
+
+
+def cache_position_scores(cache_size: int) -> List[float]:
+    # The vertices of the last triangle get a fixed score so that the next
+    # triangle doesn't depend on the order of its vertices
+    return [LAST_TRIANGLE_SCORE] * min(3, cache_size) + [
+        (1.0 - (position - 3) / (cache_size - 3)) ** CACHE_DECAY_POWER
+        for position in range(3, cache_size)
+    ]
+
+
+# Returns the triangle indices in the order of drawing. Triangles which use
+# the recently used vertices in the simulated cache and the vertices with few remaining
+# triangles are drawn first.
+def optimize_triangle_order(
+    indices: Sequence[int], cache_size: int = DEFAULT_CACHE_SIZE
+) -> List[int]:
+    triangle_count = len(indices) // 3
+    if triangle_count <= 1:
+        return list(range(triangle_count))
+
+    vertex_count = max(indices) + 1
+    vertex_triangles: List[List[int]] = [[] for _ in range(vertex_count)]
+    for corner_index, vertex_index in enumerate(indices[slice(triangle_count * 3)]):
+        vertex_triangles[vertex_index].append(corner_index // 3)
+    valences = list(map(len, vertex_triangles))
+
+    position_scores = cache_position_scores(cache_size)
+    valence_scores = [0.0] + [
+        VALENCE_BOOST_SCALE * valence**-VALENCE_BOOST_POWER
+        for valence in range(1, max(valences) + 1)
+    ]
+    cache_positions = [-1] * vertex_count
+    vertex_scores = list(map(valence_scores.__getitem__, valences))
+    triangle_scores = list(
+        map(
+            sum,
+            zip(
+                *[
+                    map(vertex_scores.__getitem__, indices[slice(i, None, 3)])
+                    for i in range(3)
+                ]
+            ),
+        )
+    )
+
+    added = bytearray(triangle_count)
+    next_pending_triangle = 0
+    cache: List[int] = []
+    order: List[int] = []
+    best_triangle = max(range(triangle_count), key=triangle_scores.__getitem__)
+    while True:
+        order.append(best_triangle)
+        added[best_triangle] = 1
+        if len(order) == triangle_count:
+            break
+
+        triangle_vertices = indices[slice(best_triangle * 3, best_triangle * 3 + 3)]
+        for vertex_index in triangle_vertices:
+            valences[vertex_index] -= 1
+            vertex_triangles[vertex_index].remove(best_triangle)
+
+        touched_vertices = list(dict.fromkeys(chain(triangle_vertices, cache)))
+        for vertex_index in touched_vertices[slice(cache_size, None)]:
+            cache_positions[vertex_index] = -1
+        cache = touched_vertices[slice(cache_size)]
+        for position, vertex_index in enumerate(cache):
+            cache_positions[vertex_index] = position
+
+        for vertex_index in touched_vertices:
+            position = cache_positions[vertex_index]
+            score = valence_scores[valences[vertex_index]]
+            if position >= 0:
+                score += position_scores[position]
+            score_difference = score - vertex_scores[vertex_index]
+            vertex_scores[vertex_index] = score
+            for triangle_index in vertex_triangles[vertex_index]:
+                triangle_scores[triangle_index] += score_difference
+
+        candidates = list(chain.from_iterable(map(vertex_triangles.__getitem__, cache)))
+        if candidates:
+            best_triangle = max(candidates, key=triangle_scores.__getitem__)
+            continue
+
+        # The cache has no triangles to draw. Restart from the first one.
+        while added[next_pending_triangle]:
+            next_pending_triangle += 1
+        best_triangle = next_pending_triangle
+    return order
+
+
+# FB_ngon_encoding treats consecutive triangles sharing the first vertex as
+# one polygon. Returns the range of the triangles of each polygon.
+def fan_ranges(indices: Sequence[int]) -> List[range]:
+    first_indices = indices[slice(0, len(indices) - len(indices) % 3, 3)]
+    starts = [
+        triangle_index
+        for triangle_index, (previous, current) in enumerate(
+            zip(chain([None], first_indices), first_indices)
+        )
+        if previous != current
+    ]
+    return list(map(range, starts, chain(starts[slice(1, None)], [len(first_indices)])))
+
+
+# Same as optimize_triangle_order(), but the triangles of each FB_ngon_encoding
+# fan are kept together in the original order, and adjacent fans never share
+# the first vertex. Returns None if the fans can't be ordered so.
+def optimize_fan_order(
+    indices: Sequence[int], cache_size: int = DEFAULT_CACHE_SIZE
+) -> Optional[List[int]]:
+    ranges = fan_ranges(indices)
+    first_indices = [indices[fan_range.start * 3] for fan_range in ranges]
+    triangle_fans = list(
+        chain.from_iterable(
+            repeat(fan_index, len(fan_range))
+            for fan_index, fan_range in enumerate(ranges)
+        )
+    )
+    # The fans in the order of their first drawn triangles
+    fan_order = dict.fromkeys(
+        map(triangle_fans.__getitem__, optimize_triangle_order(indices, cache_size))
+    )
+
+    order: List[int] = []
+    last_first_index: Optional[int] = None
+    deferred_fans: List[int] = []
+    for fan_index in fan_order:
+        deferred_fans.append(fan_index)
+        while deferred_fans:
+            deferred_index = next(
+                (
+                    i
+                    for i, deferred_fan in enumerate(deferred_fans)
+                    if first_indices[deferred_fan] != last_first_index
+                ),
+                None,
+            )
+            if deferred_index is None:
+                break
+            deferred_fan = deferred_fans.pop(deferred_index)
+            order.extend(ranges[deferred_fan])
+            last_first_index = first_indices[deferred_fan]
+    if deferred_fans:
+        return None
+    return order
+
+
+def reorder_triangles(
+    indices: Sequence[int], triangle_order: Sequence[int], typecode: str
+) -> "array.array[int]":
+    return array.array(
+        typecode,
+        chain.from_iterable(
+            map(
+                indices.__getitem__,
+                (
+                    slice(triangle_index * 3, triangle_index * 3 + 3)
+                    for triangle_index in triangle_order
+                ),
+            )
+        ),
+    )
+
+
+# Returns the vertex indices in the order of their first use, so that vertex
+# data is fetched sequentially. Unused vertices are moved to the end.
+def vertex_fetch_order(
+    index_buffers: Sequence[Sequence[int]], vertex_count: int
+) -> List[int]:
+    return list(
+        dict.fromkeys(chain(chain.from_iterable(index_buffers), range(vertex_count)))
+    )
+
+
+def remap_indices(
+    indices: Sequence[int], vertex_order: Sequence[int], typecode: str
+) -> "array.array[int]":
+    old_to_new: Dict[int, int] = dict(zip(vertex_order, count()))
+    return array.array(typecode, map(old_to_new.__getitem__, indices))
+
+
+# The average number of vertex shader invocations per triangle with a FIFO
+# cache. It is 3 in the worst case and about 0.5 for an ideal grid.
+def average_cache_miss_ratio(
+    indices: Sequence[int], cache_size: int = DEFAULT_CACHE_SIZE
+) -> float:
+    triangle_count = len(indices) // 3
+    if not triangle_count:
+        return 0.0
+    miss_count = 0
+    # The miss count when each vertex entered the cache
+    entered_miss_counts: Dict[int, int] = {}
+    for vertex_index in indices:
+        entered_miss_count = entered_miss_counts.get(vertex_index)
+        if entered_miss_count is None or miss_count - entered_miss_count >= cache_size:
+            entered_miss_counts[vertex_index] = miss_count
+            miss_count += 1
+    return miss_count / triangle_count
@@ -1,20 +1,24 @@
 import secrets
 import string
 from abc import ABC, abstractmethod
-from typing import Dict, Optional, Tuple, Union
+from typing import Dict, List, Optional, Tuple, Union
 
 import bpy
 
 from ..common.char import INTERNAL_NAME_PREFIX
 from ..common.deep import Json, make_json
+from ..common.gltf import BinaryChunk
+from ..common.profiler import Profiler
 
 
 class AbstractBaseVrmExporter(ABC):
     def __init__(
         self,
         context: bpy.types.Context,
+        profiler: Optional[Profiler] = None,
     ) -> None:
         self.context = context
+        self.profiler = profiler or Profiler()
         self.original_pose_library: Optional[bpy.types.Action] = None
         self.saved_current_pose_library: Optional[bpy.types.Action] = None
         self.saved_pose_position: Optional[str] = None
@@ -22,8 +26,10 @@ class AbstractBaseVrmExporter(ABC):
             "".join(secrets.choice(string.digits) for _ in range(10))
         )
 
+    # Returns the JSON chunk and the segments of the BIN chunk.
+    # Use gltf.write_glb() to write them without joining the segments.
     @abstractmethod
-    def export_vrm(self) -> Optional[bytes]:
+    def export_vrm(self) -> Optional[Tuple[Dict[str, Json], List[BinaryChunk]]]:
         pass
 
     def setup_pose(
@@ -4,8 +4,17 @@ import bpy
 from bpy.app.translations import pgettext
 from bpy_extras.io_utils import ExportHelper
 
-from ..common import version
-from ..common.preferences import get_preferences, use_legacy_importer_exporter
+from ..common import gltf, version
+from ..common.mesh_quantization import (
+    MESH_QUANTIZATION_NONE,
+    mesh_quantization_items,
+)
+from ..common.preferences import (
+    create_profiler,
+    get_preferences,
+    use_legacy_importer_exporter,
+)
+from ..common.sparse_accessor import DEFAULT_SPARSE_MORPH_TARGET_THRESHOLD
 from ..editor import search, validation
 from ..editor.vrm0.panel import (
     draw_vrm0_humanoid_operators_layout,
@@ -52,6 +61,34 @@ def export_vrm_update_addon_preferences(
         preferences.export_fb_ngon_encoding = export_op.export_fb_ngon_encoding
         changed = True
 
+    if bool(preferences.export_sparse_morph_targets) != bool(
+        export_op.export_sparse_morph_targets
+    ):
+        preferences.export_sparse_morph_targets = export_op.export_sparse_morph_targets
+        changed = True
+
+    if float(preferences.sparse_morph_target_threshold) != float(
+        export_op.sparse_morph_target_threshold
+    ):
+        preferences.sparse_morph_target_threshold = (
+            export_op.sparse_morph_target_threshold
+        )
+        changed = True
+
+    if str(preferences.export_mesh_quantization) != str(
+        export_op.export_mesh_quantization
+    ):
+        preferences.export_mesh_quantization = export_op.export_mesh_quantization
+        changed = True
+
+    if bool(preferences.export_optimize_vertex_cache) != bool(
+        export_op.export_optimize_vertex_cache
+    ):
+        preferences.export_optimize_vertex_cache = (
+            export_op.export_optimize_vertex_cache
+        )
+        changed = True
+
     if changed:
         validation.WM_OT_vrm_validator.detect_errors(context, export_op.errors)
 
@@ -83,6 +120,31 @@ class EXPORT_SCENE_OT_vrm(bpy.types.Operator, ExportHelper):  # type: ignore[mis
         name="Try the FB_ngon_encoding under development (Exported meshes can be corrupted)",  # noqa: F722
         update=export_vrm_update_addon_preferences,
     )
+    export_sparse_morph_targets: bpy.props.BoolProperty(  # type: ignore[valid-type]
+        name="Export Sparse Morph Targets",  # noqa: F722
+        description="Write morph targets which move few vertices as sparse accessors",  # noqa: F722
+        update=export_vrm_update_addon_preferences,
+    )
+    sparse_morph_target_threshold: bpy.props.FloatProperty(  # type: ignore[valid-type]
+        name="Sparse Morph Target Threshold",  # noqa: F722
+        description="The maximum ratio of moved vertices to write a morph target as a sparse accessor",  # noqa: F722
+        default=DEFAULT_SPARSE_MORPH_TARGET_THRESHOLD,
+        min=0.0,
+        max=1.0,
+        subtype="FACTOR",  # noqa: F821
+        update=export_vrm_update_addon_preferences,
+    )
+    export_mesh_quantization: bpy.props.EnumProperty(  # type: ignore[valid-type]
+        items=mesh_quantization_items,
+        name="Mesh Quantization",  # noqa: F722
+        description="Write VRM 0.x meshes with smaller component types",  # noqa: F722
+        update=export_vrm_update_addon_preferences,
+    )
+    export_optimize_vertex_cache: bpy.props.BoolProperty(  # type: ignore[valid-type]
+        name="Optimize Vertex Cache",  # noqa: F722
+        description="Reorder the triangles and vertices of VRM 0.x meshes for the GPU vertex cache",  # noqa: F722
+        update=export_vrm_update_addon_preferences,
+    )
 
     errors: bpy.props.CollectionProperty(type=validation.VrmValidationError)  # type: ignore[valid-type]
 
@@ -99,8 +161,17 @@ class EXPORT_SCENE_OT_vrm(bpy.types.Operator, ExportHelper):  # type: ignore[mis
         preferences = get_preferences(context)
         export_invisibles = bool(preferences.export_invisibles)
         export_only_selections = bool(preferences.export_only_selections)
+        sparse_morph_target_threshold = None
+        mesh_quantization_mode = MESH_QUANTIZATION_NONE
+        optimize_vertex_cache = False
         if preferences.enable_advanced_preferences:
             export_fb_ngon_encoding = bool(preferences.export_fb_ngon_encoding)
+            if preferences.export_sparse_morph_targets:
+                sparse_morph_target_threshold = float(
+                    preferences.sparse_morph_target_threshold
+                )
+            mesh_quantization_mode = str(preferences.export_mesh_quantization)
+            optimize_vertex_cache = bool(preferences.export_optimize_vertex_cache)
         else:
             export_fb_ngon_encoding = False
 
@@ -112,22 +183,35 @@ class EXPORT_SCENE_OT_vrm(bpy.types.Operator, ExportHelper):  # type: ignore[mis
             for obj in export_objects
         )
 
+        profiler = create_profiler(context)
         if is_vrm1:
             vrm_exporter: AbstractBaseVrmExporter = Gltf2AddonVrmExporter(
-                context, export_objects
+                context,
+                export_objects,
+                sparse_morph_target_threshold=sparse_morph_target_threshold,
+                profiler=profiler,
             )
         else:
             vrm_exporter = LegacyVrmExporter(
                 context,
                 export_objects,
                 export_fb_ngon_encoding,
+                sparse_morph_target_threshold=sparse_morph_target_threshold,
+                mesh_quantization_mode=mesh_quantization_mode,
+                optimize_vertex_cache=optimize_vertex_cache,
+                profiler=profiler,
             )
 
-        vrm_bin = vrm_exporter.export_vrm()
-        if vrm_bin is None:
-            return {"CANCELLED"}
-        with open(filepath, "wb") as f:
-            f.write(vrm_bin)
+        try:
+            with profiler.phase("export_vrm"):
+                vrm = vrm_exporter.export_vrm()
+            if vrm is None:
+                return {"CANCELLED"}
+            json_dict, binary_chunks = vrm
+            with profiler.phase("write_glb"), open(filepath, "wb") as f:
+                gltf.write_glb(f, json_dict, binary_chunks)
+        finally:
+            profiler.report("export", filepath)
         return {"FINISHED"}
 
     def invoke(self, context: bpy.types.Context, event: bpy.types.Event) -> Set[str]:
@@ -137,11 +221,19 @@ class EXPORT_SCENE_OT_vrm(bpy.types.Operator, ExportHelper):  # type: ignore[mis
             self.export_only_selections,
             self.enable_advanced_preferences,
             self.export_fb_ngon_encoding,
+            self.export_sparse_morph_targets,
+            self.sparse_morph_target_threshold,
+            self.export_mesh_quantization,
+            self.export_optimize_vertex_cache,
         ) = (
             bool(preferences.export_invisibles),
             bool(preferences.export_only_selections),
             bool(preferences.enable_advanced_preferences),
             bool(preferences.export_fb_ngon_encoding),
+            bool(preferences.export_sparse_morph_targets),
+            float(preferences.sparse_morph_target_threshold),
+            str(preferences.export_mesh_quantization),
+            bool(preferences.export_optimize_vertex_cache),
         )
         if not use_legacy_importer_exporter() and "gltf" not in dir(
             bpy.ops.export_scene
@@ -243,6 +335,11 @@ class VRM_PT_export_error_messages(bpy.types.Panel):  # type: ignore[misc] # noq
         if operator.enable_advanced_preferences:
             advanced_options_box = layout.box()
             advanced_options_box.prop(operator, "export_fb_ngon_encoding")
+            advanced_options_box.prop(operator, "export_sparse_morph_targets")
+            if operator.export_sparse_morph_targets:
+                advanced_options_box.prop(operator, "sparse_morph_target_threshold")
+            advanced_options_box.prop(operator, "export_mesh_quantization")
+            advanced_options_box.prop(operator, "export_optimize_vertex_cache")
 
         if operator.errors:
             validation.WM_OT_vrm_validator.draw_errors(
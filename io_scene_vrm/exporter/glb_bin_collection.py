@@ -4,54 +4,83 @@ Released under the MIT license
 https://opensource.org/licenses/mit-license.php
 
 """
+
 from dataclasses import dataclass, field
-from typing import Dict, List, Optional, Tuple, Union
+from typing import Dict, List, Optional, Tuple
 
 from ..common.deep import Json, make_json
+from ..common.gltf import BinaryChunk
+from ..common.sparse_accessor import SparseValues, sparse_accessor_dict
+from ..common.vertex_buffer import to_little_endian_bytes
 
 
 class GlbBinCollection:
     def __init__(self) -> None:
         self.vertex_attribute_bins: List[GlbBin] = []  # Glb_bin list
         self.image_bins: List[ImageBin] = []
-        self.bin = bytearray()
 
-    def pack_all(self) -> Tuple[Dict[str, Json], bytes]:
+    # Returns the buffer segments instead of a joined copy of them.
+    # The segments keep references to the original buffers.
+    def pack_all(self) -> Tuple[Dict[str, Json], List[BinaryChunk]]:
         bin_dict: Dict[str, Json] = {}
         byte_offset = 0
         buffer_view_dicts: List[Json] = []
         bin_dict["bufferViews"] = buffer_view_dicts
         accessor_dicts: List[Json] = []
         bin_dict["accessors"] = accessor_dicts
+        segments: List[BinaryChunk] = []
 
         for vab in self.vertex_attribute_bins:
-            self.bin.extend(vab.bin)
-            vab_dict: Dict[str, Json] = {
-                "bufferView": self.get_new_buffer_view_id(),
-                "byteOffset": 0,
-                "type": vab.array_type,
-                "componentType": vab.component_type,
-                "count": vab.array_count,
-                "normalized": False,
-            }
+            binaries: List[BinaryChunk] = [vab.bin]
+            if vab.sparse is not None:
+                binaries.insert(0, to_little_endian_bytes(vab.sparse.indices))
+            buffer_view_indices = []
+            for binary in binaries:
+                # Accessor data must be aligned to the component size
+                padding_length = -byte_offset % 4
+                if padding_length:
+                    segments.append(bytes(padding_length))
+                    byte_offset += padding_length
+                segments.append(binary)
+                bin_length = memoryview(binary).nbytes
+                buffer_view_indices.append(self.get_new_buffer_view_id())
+                buffer_view_dicts.append(
+                    {
+                        "buffer": 0,
+                        "byteOffset": byte_offset,
+                        "byteLength": bin_length,
+                    }
+                )
+                byte_offset += bin_length
+
+            vab_dict: Dict[str, Json] = {}
+            if vab.sparse is None:
+                vab_dict["bufferView"] = buffer_view_indices[0]
+                vab_dict["byteOffset"] = 0
+            vab_dict.update(
+                {
+                    "type": vab.array_type,
+                    "componentType": vab.component_type,
+                    "count": vab.array_count,
+                    "normalized": vab.normalized,
+                }
+            )
             if vab.min_max:
                 vab_dict["min"] = make_json(vab.min_max[0])
                 vab_dict["max"] = make_json(vab.min_max[1])
+            if vab.sparse is not None:
+                # The accessor is initialized with zeros and only the
+                # non-zero elements are stored
+                vab_dict["sparse"] = sparse_accessor_dict(
+                    vab.sparse, buffer_view_indices[0], buffer_view_indices[1]
+                )
             accessor_dicts.append(vab_dict)
-            buffer_view_dicts.append(
-                {
-                    "buffer": 0,
-                    "byteOffset": byte_offset,
-                    "byteLength": vab.bin_length,
-                }
-            )
-            byte_offset += vab.bin_length
 
         if self.image_bins:
             image_dicts: List[Json] = []
             bin_dict["images"] = image_dicts
             for img in self.image_bins:
-                self.bin.extend(img.bin)
+                segments.append(img.bin)
                 image_dicts.append(
                     {
                         "name": img.name,
@@ -71,7 +100,7 @@ class GlbBinCollection:
         bin_dict["buffers"] = [{"byteLength": byte_offset}]
 
         buffer_view_and_accessors_ordered_dict = bin_dict
-        return buffer_view_and_accessors_ordered_dict, bytes(self.bin)
+        return buffer_view_and_accessors_ordered_dict, segments
 
     buffer_count = 0
 
@@ -88,18 +117,18 @@ class GlbBinCollection:
 
 @dataclass
 class BaseBin:
-    bin: bytes
+    bin: BinaryChunk
     glb_bin_collection: GlbBinCollection
     bin_length: int = field(init=False)
 
     def __post_init__(self) -> None:
-        self.bin_length = len(self.bin)
+        self.bin_length = memoryview(self.bin).nbytes
 
 
 class ImageBin(BaseBin):
     def __init__(
         self,
-        image_bin: bytes,
+        image_bin: BinaryChunk,
         name: str,
         image_type: str,
         glb_bin_collection: GlbBinCollection,
@@ -114,19 +143,23 @@ class ImageBin(BaseBin):
 class GlbBin(BaseBin):
     def __init__(
         self,
-        binary: Union[bytes, bytearray],
+        binary: BinaryChunk,
         array_type: str,
         component_type: int,
         array_count: int,
         min_max_tuple: Optional[List[List[float]]],
         glb_bin_collection: GlbBinCollection,
+        sparse: Optional[SparseValues] = None,
+        normalized: bool = False,
     ) -> None:
-        if isinstance(binary, bytearray):
-            binary = bytes(binary)
         super().__init__(binary, glb_bin_collection)
         self.array_type = array_type  # String: scalar, VEC3 etc...
         self.component_type = component_type  # GL_CONSTANTS:FLOAT, uint etc...
         self.array_count = array_count  # array num
         self.min_max = min_max_tuple  # position attribute must need min_max
+        # If it is set, the binary is the values of the sparse accessor
+        self.sparse = sparse
+        # Integer components are mapped to [0, 1] or [-1, 1] if it is True
+        self.normalized = normalized
         self.accessor_id = glb_bin_collection.get_new_glb_bin_id()
         glb_bin_collection.vertex_attribute_bins.append(self)
@@ -1,16 +1,16 @@
 import math
 import os
-import tempfile
 from sys import float_info
 from typing import Dict, List, Optional, Tuple, Union
 
 import bpy
 from mathutils import Matrix, Quaternion
 
-from ..common import convert, deep, gltf, shader
+from ..common import convert, deep, gltf, shader, sparse_accessor
 from ..common.char import INTERNAL_NAME_PREFIX
 from ..common.deep import Json
 from ..common.logging import get_logger
+from ..common.profiler import Profiler
 from ..common.version import addon_version
 from ..editor import search
 from ..editor.mtoon1.property_group import (
@@ -26,7 +26,11 @@ from ..editor.vrm1.property_group import (
     Vrm1LookAtPropertyGroup,
     Vrm1MetaPropertyGroup,
 )
-from ..external.io_scene_gltf2_support import image_to_image_bytes, init_extras_export
+from ..external.io_scene_gltf2_support import (
+    image_to_image_bytes,
+    init_extras_export,
+    write_temporary_file,
+)
 from .abstract_base_vrm_exporter import AbstractBaseVrmExporter, assign_dict
 
 logger = get_logger(__name__)
@@ -37,9 +41,13 @@ class Gltf2AddonVrmExporter(AbstractBaseVrmExporter):
         self,
         context: bpy.types.Context,
         export_objects: List[bpy.types.Object],
+        sparse_morph_target_threshold: Optional[float] = None,
+        profiler: Optional[Profiler] = None,
     ) -> None:
-        super().__init__(context)
+        super().__init__(context, profiler)
         self.export_objects = export_objects
+        # Morph targets are written as sparse accessors if it is not None
+        self.sparse_morph_target_threshold = sparse_morph_target_threshold
 
         armatures = [obj for obj in export_objects if obj.type == "ARMATURE"]
         if not armatures:
@@ -1562,17 +1570,43 @@ class Gltf2AddonVrmExporter(AbstractBaseVrmExporter):
                     if "NORMAL" in target_dict:
                         del target_dict["NORMAL"]
 
-    def export_vrm(self) -> Optional[bytes]:
+    @staticmethod
+    def export_glb(filepath: str) -> None:
+        try:
+            bpy.ops.export_scene.gltf(
+                filepath=filepath,
+                check_existing=False,
+                export_format="GLB",
+                export_extras=True,
+                export_current_frame=True,
+                use_selection=True,
+            )
+        except RuntimeError as e:
+            logger.error(str(e))
+            # TODO: check traceback
+            bpy.ops.export_scene.gltf(
+                filepath=filepath,
+                check_existing=False,
+                export_format="GLB",
+                export_extras=True,
+                export_current_frame=True,
+                use_selection=True,
+                export_animations=False,
+            )
+
+    def export_vrm(self) -> Optional[Tuple[Dict[str, Json], List[gltf.BinaryChunk]]]:
         init_extras_export()
 
         vrm = self.armature.data.vrm_addon_extension.vrm1
         # dummy_skinned_mesh_object_name = self.create_dummy_skinned_mesh_object()
+        profiler = self.profiler
         try:
-            self.setup_pose(
-                self.armature,
-                vrm.humanoid.pose_library,
-                vrm.humanoid.pose_marker_name,
-            )
+            with profiler.phase("setup_pose"):
+                self.setup_pose(
+                    self.armature,
+                    vrm.humanoid.pose_library,
+                    vrm.humanoid.pose_marker_name,
+                )
 
             self.armature[self.extras_main_armature_key] = {}
             # 他glTF2ExportUserExtensionの影響を最小化するため、影響が少ないと思われるカスタムプロパティを使ってBlenderのオブジェクトとインデックスの対応をとる。
@@ -1591,31 +1625,10 @@ class Gltf2AddonVrmExporter(AbstractBaseVrmExporter):
             self.overwrite_object_visibility_and_selection()
             self.mount_skinned_mesh_parent()
 
-            with tempfile.TemporaryDirectory() as temp_dir:
-                filepath = os.path.join(temp_dir, "out.glb")
-                try:
-                    bpy.ops.export_scene.gltf(
-                        filepath=filepath,
-                        check_existing=False,
-                        export_format="GLB",
-                        export_extras=True,
-                        export_current_frame=True,
-                        use_selection=True,
-                    )
-                except RuntimeError as e:
-                    logger.error(str(e))
-                    # TODO: check traceback
-                    bpy.ops.export_scene.gltf(
-                        filepath=filepath,
-                        check_existing=False,
-                        export_format="GLB",
-                        export_extras=True,
-                        export_current_frame=True,
-                        use_selection=True,
-                        export_animations=False,
-                    )
-                with open(filepath, "rb") as file:
-                    extra_name_assigned_glb = file.read()
+            with profiler.phase("export_glb"), write_temporary_file(
+                "out.glb", self.export_glb
+            ) as filepath, open(filepath, "rb") as file:
+                extra_name_assigned_glb = file.read()
         finally:
             for bone in self.armature.pose.bones:
                 if self.extras_bone_name_key in bone:
@@ -1636,8 +1649,9 @@ class Gltf2AddonVrmExporter(AbstractBaseVrmExporter):
             # self.destroy_dummy_skinned_mesh_object(dummy_skinned_mesh_object_name)
             self.restore_pose(self.armature)
 
-        json_dict, body_binary = gltf.parse_glb(extra_name_assigned_glb)
-        body_binary = bytearray(body_binary)
+        with profiler.phase("parse_glb"):
+            json_dict, glb_body_binary = gltf.parse_glb(extra_name_assigned_glb)
+            body_binary = bytearray(glb_body_binary)
 
         bone_name_to_index_dict: Dict[str, int] = {}
         object_name_to_index_dict: Dict[str, int] = {}
@@ -1884,10 +1898,17 @@ class Gltf2AddonVrmExporter(AbstractBaseVrmExporter):
             if not extras_dict:
                 del material_dict["extras"]
 
-        self.save_vrm_materials(json_dict, body_binary, material_name_to_index_dict)
+        with profiler.phase("save_vrm_materials"):
+            self.save_vrm_materials(json_dict, body_binary, material_name_to_index_dict)
         self.unassign_normal_from_mtoon_primitive_morph_target(
             json_dict, material_name_to_index_dict
         )
+        if self.sparse_morph_target_threshold is not None:
+            with profiler.phase("convert_morph_targets_to_sparse"):
+                saved_bytes = sparse_accessor.convert_morph_target_accessors_to_sparse(
+                    json_dict, body_binary, self.sparse_morph_target_threshold
+                )
+            logger.info(f"Sparse morph targets saved {saved_bytes} bytes")
 
         extensions_used = json_dict.get("extensionsUsed")
         if not isinstance(extensions_used, list):
@@ -1989,7 +2010,7 @@ class Gltf2AddonVrmExporter(AbstractBaseVrmExporter):
             if not json_dict[key]:
                 del json_dict[key]
 
-        return gltf.pack_glb(json_dict, body_binary)
+        return (json_dict, [body_binary])
 
 
 def find_node_world_matrix(
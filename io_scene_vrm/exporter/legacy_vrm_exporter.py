@@ -5,25 +5,49 @@ https://opensource.org/licenses/mit-license.php
 
 """
 
+import array
+import contextlib
 import datetime
 import math
+import operator
 import os
 import re
 import statistics
 import struct
+import sys
 from collections import abc
+from dataclasses import replace
+from itertools import chain, compress
 from sys import float_info
-from typing import Dict, List, Optional, Sequence, Tuple, Union
+from typing import Dict, Iterator, List, Optional, Sequence, Set, Tuple, Union
 
 import bgl
 import bmesh
 import bpy
 from mathutils import Matrix, Quaternion, Vector
 
-from ..common import convert, deep, gltf, shader
+from ..common import (
+    accessor,
+    convert,
+    deep,
+    gltf,
+    mesh_quantization,
+    shader,
+    sparse_accessor,
+    vertex_buffer,
+    vertex_cache,
+)
 from ..common.deep import Json, make_json
 from ..common.logging import get_logger
+from ..common.mesh_encoding import (
+    MeshArrays,
+    MeshBins,
+    MeshEncoder,
+    PendingMeshBins,
+    vertex_joints_and_weights,
+)
 from ..common.mtoon0_constants import MaterialMtoon0
+from ..common.profiler import Profiler
 from ..common.version import addon_version
 from ..common.vrm0.human_bone import HumanBoneSpecifications
 from ..editor import migration, search
@@ -62,14 +86,38 @@ class LegacyVrmExporter(AbstractBaseVrmExporter):
         context: bpy.types.Context,
         export_objects: List[bpy.types.Object],
         export_fb_ngon_encoding: bool,
+        sparse_morph_target_threshold: Optional[float] = None,
+        mesh_quantization_mode: str = mesh_quantization.MESH_QUANTIZATION_NONE,
+        optimize_vertex_cache: bool = False,
+        profiler: Optional[Profiler] = None,
     ) -> None:
-        super().__init__(context)
+        super().__init__(context, profiler)
         self.export_objects = export_objects
         self.export_fb_ngon_encoding = export_fb_ngon_encoding
+        self.optimize_vertex_cache = optimize_vertex_cache
+        # Morph targets are written as sparse accessors if it is not None
+        self.sparse_morph_target_threshold = sparse_morph_target_threshold
+        self.sparse_morph_target_saved_bytes = 0
+        self.quantize_indices = (
+            mesh_quantization_mode != mesh_quantization.MESH_QUANTIZATION_NONE
+        )
+        self.quantize_attributes = mesh_quantization_mode in [
+            mesh_quantization.MESH_QUANTIZATION_ATTRIBUTES,
+            mesh_quantization.MESH_QUANTIZATION_KHR_MESH_QUANTIZATION,
+        ]
+        self.quantize_morph_normals = (
+            mesh_quantization_mode
+            == mesh_quantization.MESH_QUANTIZATION_KHR_MESH_QUANTIZATION
+        )
+        self.quantization_report = mesh_quantization.QuantizationReport()
+        self.use_khr_mesh_quantization = False
         self.json_dict: Dict[str, Json] = {}
         self.glb_bin_collector = GlbBinCollection()
         self.use_dummy_armature = False
         self.mesh_name_to_index: Dict[str, int] = {}
+        # メッシュの出力中に使う索引。同名のノードがある場合は最初のものを使う
+        self.node_name_to_index: Dict[str, int] = {}
+        self.node_index_to_joint_index: Dict[int, int] = {}
         armatures = [obj for obj in self.export_objects if obj.type == "ARMATURE"]
         if armatures:
             self.armature = armatures[0]
@@ -87,38 +135,50 @@ class LegacyVrmExporter(AbstractBaseVrmExporter):
             self.use_dummy_armature = True
         migration.migrate(self.armature.name, defer=False)
 
-        self.result: Optional[bytes] = None
+        self.result: Optional[Tuple[Dict[str, Json], List[gltf.BinaryChunk]]] = None
 
-    def export_vrm(self) -> Optional[bytes]:
+    def export_vrm(self) -> Optional[Tuple[Dict[str, Json], List[gltf.BinaryChunk]]]:
         wm = self.context.window_manager
         wm.progress_begin(0, 9)
+        profiler = self.profiler
         try:
-            self.setup_pose(
-                self.armature,
-                self.armature.data.vrm_addon_extension.vrm0.humanoid.pose_library,
-                self.armature.data.vrm_addon_extension.vrm0.humanoid.pose_marker_name,
-            )
+            humanoid = self.armature.data.vrm_addon_extension.vrm0.humanoid
+            with profiler.phase("setup_pose"):
+                self.setup_pose(
+                    self.armature,
+                    humanoid.pose_library,
+                    humanoid.pose_marker_name,
+                )
             wm.progress_update(1)
-            self.image_to_bin()
+            with profiler.phase("image_to_bin"):
+                self.image_to_bin()
             wm.progress_update(2)
-            self.armature_to_node_and_scenes_dict()
+            with profiler.phase("armature_to_node_and_scenes_dict"):
+                self.armature_to_node_and_scenes_dict()
             wm.progress_update(3)
-            self.material_to_dict()
+            with profiler.phase("material_to_dict"):
+                self.material_to_dict()
             wm.progress_update(4)
-            self.mesh_to_bin_and_dict()
+            with profiler.phase("mesh_to_bin_and_dict"):
+                self.mesh_to_bin_and_dict()
             wm.progress_update(5)
             self.json_dict["scene"] = 0
-            self.gltf_meta_to_dict()
+            with profiler.phase("gltf_meta_to_dict"):
+                self.gltf_meta_to_dict()
             wm.progress_update(6)
-            self.vrm_meta_to_dict()  # colliderとかmetaとか....
+            with profiler.phase("vrm_meta_to_dict"):
+                self.vrm_meta_to_dict()  # colliderとかmetaとか....
             wm.progress_update(7)
-            self.fill_empty_material()
+            with profiler.phase("fill_empty_material"):
+                self.fill_empty_material()
             wm.progress_update(8)
-            self.pack()
+            with profiler.phase("pack"):
+                self.pack()
         finally:
             try:
-                self.restore_pose(self.armature)
-                self.cleanup()
+                with profiler.phase("restore_pose_and_cleanup"):
+                    self.restore_pose(self.armature)
+                    self.cleanup()
             finally:
                 wm.progress_end()
         return self.result
@@ -1449,33 +1509,50 @@ class LegacyVrmExporter(AbstractBaseVrmExporter):
             {"extensions": {"VRM": {"materialProperties": vrm_material_props_list}}}
         )
 
-    def joint_id_from_node_name_solver(
-        self, node_name: str, node_id_dict: Dict[str, int]
-    ) -> int:
-        # 存在しないボーンを指してる場合は-1を返す
-        node_id = node_id_dict.get(node_name)
-        if not isinstance(node_id, int):
-            return -1
-        skin_dicts = self.json_dict.get("skins")
-        if not isinstance(skin_dicts, list) or not skin_dicts:
-            return -1
-        skin_dict = skin_dicts[0]
-        if not isinstance(skin_dict, dict):
-            return -1
-        joints = skin_dict.get("joints")
-        if not isinstance(joints, list):
-            return -1
-        if node_id not in joints:
-            return -1
-        return joints.index(node_id)
+    # {vertex group index: joint index}
+    # 存在しないボーンを指してる頂点グループは含まない
+    def create_node_indices(self) -> None:
+        self.node_name_to_index = {}
+        node_dicts = self.json_dict.get("nodes")
+        if isinstance(node_dicts, list):
+            for node_index, node_dict in enumerate(node_dicts):
+                if isinstance(node_dict, dict):
+                    self.node_name_to_index.setdefault(
+                        str(node_dict.get("name")), node_index
+                    )
+
+        self.node_index_to_joint_index = {}
+        joints = deep.get(self.json_dict, ["skins", 0, "joints"])
+        if isinstance(joints, list):
+            # Iterate in reverse so that the first joint of each node remains
+            # like list.index()
+            self.node_index_to_joint_index = {
+                node_id: joint_id
+                for joint_id, node_id in reversed(list(enumerate(joints)))
+                if isinstance(node_id, int)
+            }
 
+    def create_vertex_group_joint_dict(self, mesh: bpy.types.Object) -> Dict[int, int]:
+        vertex_group_joint_dict: Dict[int, int] = {}
+        for vertex_group_index, vertex_group in enumerate(mesh.vertex_groups):
+            node_id = self.node_name_to_index.get(vertex_group.name)
+            if node_id is None:
+                continue
+            joint_id = self.node_index_to_joint_index.get(node_id)
+            if joint_id is None:
+                continue
+            vertex_group_joint_dict[vertex_group_index] = joint_id
+        return vertex_group_joint_dict
+
+    # Yields the name, the position differences and the normal differences of
+    # each shape key except the first one. The differences are flat VEC3 arrays
+    # indexed by the vertex index.
     @staticmethod
-    def fetch_morph_vertex_normal_difference(
+    def fetch_morph_vertex_differences(
         mesh_data: bpy.types.Mesh,
-    ) -> Dict[str, List[List[float]]]:
-        exclusion_vertex_indices = set()
-        for polygon in mesh_data.polygons:
-            material = mesh_data.materials[polygon.material_index]
+    ) -> Iterator[Tuple[str, "array.array[float]", "array.array[float]"]]:
+        exclusion_material_indices = set()
+        for material_index, material in enumerate(mesh_data.materials):
             if material is None:
                 continue
             # Use non-evaluated material
@@ -1485,66 +1562,70 @@ class LegacyVrmExporter(AbstractBaseVrmExporter):
             if material.vrm_addon_extension.mtoon1.export_shape_key_normals:
                 continue
             if material.vrm_addon_extension.mtoon1.enabled:
-                exclusion_vertex_indices.update(polygon.vertices)
+                exclusion_material_indices.add(material_index)
                 continue
             node = search.vrm_shader_node(material)
             if not node:
                 continue
             if node.node_tree["SHADER"] == "MToon_unversioned":
-                exclusion_vertex_indices.update(polygon.vertices)
+                exclusion_material_indices.add(material_index)
+
+        vertex_count = len(mesh_data.vertices)
+        vertex_inclusion_flags = [1.0] * vertex_count
+        if exclusion_material_indices:
+            polygon_material_indices: "array.array[int]" = vertex_buffer.create_array(
+                "i", len(mesh_data.polygons)
+            )
+            mesh_data.polygons.foreach_get("material_index", polygon_material_indices)
+            for polygon_index in compress(
+                range(len(polygon_material_indices)),
+                map(exclusion_material_indices.__contains__, polygon_material_indices),
+            ):
+                for vertex_index in mesh_data.polygons[polygon_index].vertices:
+                    vertex_inclusion_flags[vertex_index] = 0.0
+        component_inclusion_flags = list(
+            chain.from_iterable(zip(*[vertex_inclusion_flags] * 3))
+        )
+
+        loop_vertex_indices: "array.array[int]" = vertex_buffer.create_array(
+            "i", len(mesh_data.loops)
+        )
+        mesh_data.loops.foreach_get("vertex_index", loop_vertex_indices)
+        loop_groups = vertex_buffer.group_rows(loop_vertex_indices, vertex_count)
 
-        morph_normal_diff_dict = {}
-        vert_base_normal_dict = {}
-        for kb in mesh_data.shape_keys.key_blocks:
+        def vertex_normals(key_block: bpy.types.ShapeKey) -> "array.array[float]":
             # 頂点のノーマルではなくsplit(loop)のノーマルを使う
             # https://github.com/KhronosGroup/glTF-Blender-IO/pull/1129
-            split_normals = kb.normals_split_get()
-
-            vertex_normal_vectors = [Vector([0.0, 0.0, 0.0])] * len(mesh_data.vertices)
-            for loop_index in range(len(split_normals) // 3):
-                loop = mesh_data.loops[loop_index]
-                if loop.vertex_index in exclusion_vertex_indices:
-                    continue
-                v = Vector(
-                    [
-                        split_normals[loop_index * 3 + 0],
-                        split_normals[loop_index * 3 + 1],
-                        split_normals[loop_index * 3 + 2],
-                    ]
-                )
-                if v.length <= float_info.epsilon:
-                    continue
-                vertex_normal_vectors[loop.vertex_index] = (
-                    vertex_normal_vectors[loop.vertex_index] + v
+            return vertex_buffer.normalize_vec3(
+                vertex_buffer.sum_grouped_rows(
+                    key_block.normals_split_get(), 3, loop_groups
                 )
+            )
 
-            vertex_normals = [0.0] * len(vertex_normal_vectors) * 3
-            for index, _ in enumerate(vertex_normal_vectors):
-                if index in exclusion_vertex_indices:
-                    continue
-                n = vertex_normal_vectors[index]
-                if n.length <= float_info.epsilon:
-                    continue
-                n = n.normalized()
-                vertex_normals[index * 3 + 0] = n[0]
-                vertex_normals[index * 3 + 1] = n[1]
-                vertex_normals[index * 3 + 2] = n[2]
-
-            vert_base_normal_dict.update({kb.name: vertex_normals})
-        reference_key_name = mesh_data.shape_keys.reference_key.name
-        for k, v in vert_base_normal_dict.items():
-            if k == reference_key_name:
-                continue
-            values = []
-            for vert_morph_normal, vert_base_normal in zip(
-                zip(*[iter(v)] * 3),
-                zip(*[iter(vert_base_normal_dict[reference_key_name])] * 3),
-            ):
-                values.append(
-                    [vert_morph_normal[i] - vert_base_normal[i] for i in range(3)]
-                )
-            morph_normal_diff_dict.update({k: values})
-        return morph_normal_diff_dict
+        def vertex_positions(key_block: bpy.types.ShapeKey) -> "array.array[float]":
+            positions: "array.array[float]" = vertex_buffer.create_array(
+                "f", vertex_count * 3
+            )
+            key_block.data.foreach_get("co", positions)
+            return positions
+
+        base_positions: "array.array[float]" = vertex_buffer.create_array(
+            "f", vertex_count * 3
+        )
+        mesh_data.vertices.foreach_get("co", base_positions)
+        base_normals = vertex_normals(mesh_data.shape_keys.reference_key)
+        for key_block in mesh_data.shape_keys.key_blocks[1:]:
+            normal_differences = vertex_buffer.subtract(
+                vertex_normals(key_block), base_normals
+            )
+            yield (
+                key_block.name,
+                vertex_buffer.subtract(vertex_positions(key_block), base_positions),
+                array.array(
+                    "f",
+                    map(operator.mul, normal_differences, component_inclusion_flags),
+                ),
+            )
 
     def is_skin_mesh(self, mesh: bpy.types.Object) -> bool:
         while mesh:
@@ -1635,532 +1716,872 @@ class LegacyVrmExporter(AbstractBaseVrmExporter):
                         )
         return polys
 
-    def mesh_to_bin_and_dict(self) -> None:
-        mesh_dicts = self.json_dict.get("meshes")
-        if not isinstance(mesh_dicts, list):
-            mesh_dicts = []
-            self.json_dict["meshes"] = mesh_dicts
-
-        meshes = [
-            obj
-            for obj in self.export_objects
-            if obj.type in search.MESH_CONVERTIBLE_OBJECT_TYPES
-        ]
-        while True:
-            swapped = False
-            for mesh in list(meshes):
-                if (
-                    mesh.parent_type == "OBJECT"
-                    and mesh.parent
-                    and mesh.parent.type in search.MESH_CONVERTIBLE_OBJECT_TYPES
-                    and meshes.index(mesh) < meshes.index(mesh.parent)
-                ):
-                    meshes.remove(mesh)
-                    meshes.append(mesh)
-                    swapped = True
-            if not swapped:
+    def nearest_bone_node_index(self, mesh: bpy.types.Object) -> int:
+        bone_name: Optional[str] = None
+        mesh_parent = mesh
+        while (
+            mesh_parent
+            and mesh_parent.type in search.MESH_CONVERTIBLE_OBJECT_TYPES
+            and mesh_parent != mesh
+        ):
+            if (
+                mesh_parent.parent_type == "BONE"
+                and mesh_parent.parent_bone in self.armature.data.bones
+            ):
+                bone_name = mesh_parent.parent_bone
                 break
+            mesh_parent = mesh.parent
+        if not bone_name:
+            for (
+                human_bone
+            ) in self.armature.data.vrm_addon_extension.vrm0.humanoid.human_bones:
+                if human_bone.bone == "hips":
+                    bone_name = human_bone.node.value
+            if bone_name is None or bone_name not in self.armature.data.bones:
+                raise ValueError("No hips bone found")
+        node_index = self.node_name_to_index.get(bone_name)
+        if node_index is None:
+            raise ValueError(f"No node found for bone {bone_name}")
+        return node_index
+
+    # Returns the (weight, joint index) pairs of the vertices and the joint
+    # which the vertices without weights are attached to
+    def vertex_influences(
+        self,
+        mesh: bpy.types.Object,
+        mesh_data: bpy.types.Mesh,
+        vertex_indices: Sequence[int],
+        vertex_group_joint_dict: Dict[int, int],
+    ) -> Tuple[List[List[Tuple[float, int]]], int]:
+        vertices = mesh_data.vertices
+        influences = [
+            [
+                (group.weight, vertex_group_joint_dict[group.group])
+                for group in vertices[vertex_index].groups
+                # ウエイトがゼロのジョイントの値は無視してゼロになるようにする
+                # https://github.com/KhronosGroup/glTF/tree/f33f90ad9439a228bf90cde8319d851a52a3f470/specification/2.0#skinned-mesh-attributes
+                if group.group in vertex_group_joint_dict
+                and not group.weight < float_info.epsilon
+            ]
+            for vertex_index in vertex_indices
+        ]
+        for vertex_index, vertex_influences in zip(vertex_indices, influences):
+            if len(vertex_influences) > 4:
+                logger.warning(
+                    f"Joints on vertex id:{vertex_index} in: {mesh.name} are truncated"
+                )
 
-        for mesh in meshes:
-            is_skin_mesh = self.is_skin_mesh(mesh)
-            node_dict = {
-                "name": mesh.name,
-                "translation": self.axis_blender_to_glb(mesh.location),
-                "rotation": [0, 0, 0, 1],  # このへんは規約なので
-                "scale": [1, 1, 1],  # このへんは規約なので
-            }
-            if is_skin_mesh:
-                node_dict["translation"] = [0, 0, 0]  # skinnedmeshはtransformを無視される
-
-            node_dicts = self.json_dict.get("nodes")
-            if not isinstance(node_dicts, list):
-                node_dicts = []
-                self.json_dict["nodes"] = node_dicts
-
-            node_dicts.append(node_dict)
-
-            mesh_node_id = len(node_dicts) - 1
-
-            if is_skin_mesh:
-                first_scene_nodes = deep.get(self.json_dict, ["scenes", 0, "nodes"])
-                if isinstance(first_scene_nodes, list):
-                    first_scene_nodes.append(mesh_node_id)
-            else:
-                if mesh.parent_type == "BONE":
-                    parent_node = (
-                        [
-                            node_dict
-                            for node_dict in node_dicts
-                            if isinstance(node_dict, dict)
-                            and node_dict.get("name") == mesh.parent_bone
-                        ]
-                        + [None]
-                    )[0]
-                elif mesh.parent_type == "OBJECT":
-                    parent_node = (
-                        [
-                            node_dict
-                            for node_dict in node_dicts
-                            if isinstance(node_dict, dict)
-                            and node_dict.get("name") == mesh.parent.name
-                        ]
-                        + [None]
-                    )[0]
-                else:
-                    parent_node = None
-                base_pos = [0, 0, 0]
-                if parent_node:
-                    children = parent_node.get("children")
-                    if not isinstance(children, list):
-                        children = []
-                        parent_node["children"] = children
-                    children.append(mesh_node_id)
-                    if mesh.parent_type == "BONE":
-                        base_pos = (
-                            self.armature.matrix_world
-                            @ self.armature.pose.bones[mesh.parent_bone].matrix.to_4x4()
-                        ).to_translation()
-                    else:
-                        base_pos = mesh.parent.matrix_world.to_translation()
-                else:
-                    first_scene_nodes = deep.get(self.json_dict, ["scenes", 0, "nodes"])
-                    if isinstance(first_scene_nodes, list):
-                        first_scene_nodes.append(mesh_node_id)
-                mesh_pos = mesh.matrix_world.to_translation()
-                relate_pos = [mesh_pos[i] - base_pos[i] for i in range(3)]
-
-                if 0 <= mesh_node_id < len(node_dicts):
-                    mesh_node_dict = node_dicts[mesh_node_id]
-                    if isinstance(mesh_node_dict, dict):
-                        mesh_node_dict["translation"] = make_json(
-                            self.axis_blender_to_glb(relate_pos)
-                        )
+        fallback_joint: Optional[int] = None
+        for vertex_index, vertex_influences in zip(vertex_indices, influences):
+            if vertex_influences:
+                continue
+            logger.warning(f"No weight on vertex id:{vertex_index} in: {mesh.name}")
+            if fallback_joint is None:
+                # Attach near bone
+                fallback_joint = self.nearest_bone_node_index(mesh)
+        return influences, fallback_joint or 0
+
+    # Slow fallback which walks the BMesh loops one by one. FB_ngon_encoding
+    # requires it because tessface_fan() builds the triangle fans from BMesh faces.
+    def mesh_to_bins_with_bmesh(
+        self,
+        mesh: bpy.types.Object,
+        mesh_data: bpy.types.Mesh,
+        is_skin_mesh: bool,
+        material_index_to_primitive_index: Dict[int, int],
+        vertex_group_joint_dict: Dict[int, int],
+    ) -> MeshBins:
+        bm = bmesh.new()
+        bm.from_mesh(mesh_data)
+
+        fmin, fmax = gltf.FLOAT_NEGATIVE_MAX, gltf.FLOAT_POSITIVE_MAX
+        unique_vertex_id = 0
+        # {(uv...,vertex_index):unique_vertex_id} (uvと頂点番号が同じ頂点は同じものとして省くようにする)
+        unique_vertex_dict: Dict[Tuple[object, ...], int] = {}
+        uvlayers_dict = {
+            i: uvlayer.name for i, uvlayer in enumerate(mesh_data.uv_layers)
+        }
 
-            # region hell
-            # Check added to resolve https://github.com/saturday06/VRM_Addon_for_Blender/issues/70
-            if self.context.view_layer.objects.active is not None:
-                bpy.ops.object.mode_set(mode="OBJECT")
+        primitive_index_bin_dict: Dict[Optional[int], bytearray] = {
+            primitive_index: bytearray()
+            for primitive_index in material_index_to_primitive_index.values()
+        }
+        primitive_index_vertex_count: Dict[Optional[int], int] = {
+            primitive_index: 0
+            for primitive_index in material_index_to_primitive_index.values()
+        }
 
-            # https://docs.blender.org/api/2.80/bpy.types.Depsgraph.html
-            depsgraph = self.context.evaluated_depsgraph_get()
-            mesh_owner = mesh.evaluated_get(depsgraph)
-            mesh_from_mesh_owner = mesh_owner.to_mesh(
-                preserve_all_data_layers=True, depsgraph=depsgraph
-            )
-            if not mesh_from_mesh_owner:
-                continue
-            mesh_data = mesh_from_mesh_owner.copy()
-            for prop in mesh.data.keys():
-                mesh_data[prop] = mesh.data[prop]
-
-            mesh.hide_viewport = False
-            mesh.hide_select = False
-            self.context.view_layer.objects.active = mesh
-            bpy.ops.object.mode_set(mode="EDIT")
-
-            mesh_data_transform = Matrix.Identity(4)
-            if not is_skin_mesh:
-                mesh_data_transform @= Matrix.Translation(
-                    -mesh.matrix_world.to_translation()
-                )
-            mesh_data_transform @= mesh.matrix_world
-            mesh_data.transform(mesh_data_transform, shape_keys=True)
-            mesh_data.calc_loop_triangles()
-            mesh_data.calc_normals_split()
-
-            bm = bmesh.new()
-            bm.from_mesh(mesh_data)
-
-            # region temporary used
-            material_dicts = self.json_dict.get("materials")
-            if not isinstance(material_dicts, list):
-                material_dicts = []
-                self.json_dict["materials"] = material_dicts
-
-            mat_id_dict = {
-                str(material_dict.get("name")): i
-                for i, material_dict in enumerate(material_dicts)
-                if isinstance(material_dict, dict)
+        shape_pos_bin_dict: Dict[str, bytearray] = {}
+        shape_normal_bin_dict: Dict[str, bytearray] = {}
+        shape_min_max_dict: Dict[str, List[List[float]]] = {}
+        morph_vertex_differences: Dict[
+            str, Tuple["array.array[float]", "array.array[float]"]
+        ] = {}
+        if mesh_data.shape_keys is not None:
+            # 0番目Basisは省く
+            shape_pos_bin_dict = {
+                shape.name: bytearray() for shape in mesh_data.shape_keys.key_blocks[1:]
             }
-            material_slot_dict = {
-                i: mat.name for i, mat in enumerate(mesh.material_slots) if mat.name
+            shape_normal_bin_dict = {
+                shape.name: bytearray() for shape in mesh_data.shape_keys.key_blocks[1:]
             }
-            node_id_dict: Dict[str, int] = {
-                str(node_dict.get("name")): i
-                for i, node_dict in enumerate(node_dicts)
-                if isinstance(node_dict, dict)
+            shape_min_max_dict = {
+                shape.name: [[fmax, fmax, fmax], [fmin, fmin, fmin]]
+                for shape in mesh_data.shape_keys.key_blocks[1:]
             }
-
-            v_group_name_dict = {i: vg.name for i, vg in enumerate(mesh.vertex_groups)}
-            fmin, fmax = gltf.FLOAT_NEGATIVE_MAX, gltf.FLOAT_POSITIVE_MAX
-            unique_vertex_id = 0
-            # {(uv...,vertex_index):unique_vertex_id} (uvと頂点番号が同じ頂点は同じものとして省くようにする)
-            unique_vertex_dict: Dict[Tuple[object, ...], int] = {}
-            uvlayers_dict = {
-                i: uvlayer.name for i, uvlayer in enumerate(mesh_data.uv_layers)
+            morph_vertex_differences = {
+                shape_name: (position_differences, normal_differences)
+                for (
+                    shape_name,
+                    position_differences,
+                    normal_differences,
+                ) in self.fetch_morph_vertex_differences(mesh_data)
             }
-
-            # endregion  temporary_used
-            primitive_index_bin_dict: Dict[Optional[int], bytearray] = {
-                mat_id_dict[mat.name]: bytearray()
-                for mat in mesh.material_slots
-                if mat.name
-            }
-            primitive_index_vertex_count: Dict[Optional[int], int] = {
-                mat_id_dict[mat.name]: 0 for mat in mesh.material_slots if mat.name
+        position_bin = bytearray()
+        position_min_max = [[fmax, fmax, fmax], [fmin, fmin, fmin]]
+        normal_bin = bytearray()
+        joints_bin = bytearray()
+        weights_bin = bytearray()
+        texcoord_bins = {uvlayer_id: bytearray() for uvlayer_id in uvlayers_dict.keys()}
+        float_vec4_packer = struct.Struct("<ffff").pack
+        float_vec3_packer = struct.Struct("<fff").pack
+        float_pair_packer = struct.Struct("<ff").pack
+        unsigned_int_scalar_packer = struct.Struct("<I").pack
+        unsigned_short_vec4_packer = struct.Struct("<HHHH").pack
+
+        polys = self.tessface_fan(bm, self.export_fb_ngon_encoding)
+        vertex_joints = array.array("H")
+        vertex_weights = array.array("f")
+        vertex_rows: Dict[int, int] = {}
+        if is_skin_mesh:
+            vertex_indices = dict.fromkeys(
+                loop.vert.index for _, loops in polys for loop in loops
+            )
+            vertex_rows = {
+                vertex_index: row for row, vertex_index in enumerate(vertex_indices)
             }
-
-            shape_pos_bin_dict: Dict[str, bytearray] = {}
-            shape_normal_bin_dict: Dict[str, bytearray] = {}
-            shape_min_max_dict: Dict[str, List[List[float]]] = {}
-            morph_normal_diff_dict: Dict[str, List[List[float]]] = {}
-            if mesh_data.shape_keys is not None:
-                # 0番目Basisは省く
-                shape_pos_bin_dict = {
-                    shape.name: bytearray()
-                    for shape in mesh_data.shape_keys.key_blocks[1:]
-                }
-                shape_normal_bin_dict = {
-                    shape.name: bytearray()
-                    for shape in mesh_data.shape_keys.key_blocks[1:]
-                }
-                shape_min_max_dict = {
-                    shape.name: [[fmax, fmax, fmax], [fmin, fmin, fmin]]
-                    for shape in mesh_data.shape_keys.key_blocks[1:]
-                }
-                # {morphname:{vertexid:[diff_X,diff_y,diff_z]}}
-                morph_normal_diff_dict = self.fetch_morph_vertex_normal_difference(
-                    mesh_data
+            vertex_joints, vertex_weights = vertex_joints_and_weights(
+                *self.vertex_influences(
+                    mesh, mesh_data, list(vertex_rows), vertex_group_joint_dict
                 )
-            position_bin = bytearray()
-            position_min_max = [[fmax, fmax, fmax], [fmin, fmin, fmin]]
-            normal_bin = bytearray()
-            joints_bin = bytearray()
-            weights_bin = bytearray()
-            texcoord_bins = {
-                uvlayer_id: bytearray() for uvlayer_id in uvlayers_dict.keys()
-            }
-            float_vec4_packer = struct.Struct("<ffff").pack
-            float_vec3_packer = struct.Struct("<fff").pack
-            float_pair_packer = struct.Struct("<ff").pack
-            unsigned_int_scalar_packer = struct.Struct("<I").pack
-            unsigned_short_vec4_packer = struct.Struct("<HHHH").pack
-
-            for material_index, loops in self.tessface_fan(
-                bm, self.export_fb_ngon_encoding
-            ):
-                for loop in loops:
-                    uv_list = []
-                    for uvlayer_name in uvlayers_dict.values():
-                        uv_layer = bm.loops.layers.uv[uvlayer_name]
-                        uv_list.extend([loop[uv_layer].uv[0], loop[uv_layer].uv[1]])
-
-                    # 頂点のノーマルではなくloopのノーマルを使う。これで失うものはあると思うが、
-                    # glTF 2.0アドオンと同一にしておくのが無難だろうと判断。
-                    # https://github.com/KhronosGroup/glTF-Blender-IO/pull/1127
-                    vert_normal = mesh_data.loops[loop.index].normal
-                    vertex_key = (*uv_list, *vert_normal, loop.vert.index)
-                    cached_vert_id = unique_vertex_dict.get(
-                        vertex_key
-                    )  # keyがなければNoneを返す
-                    if cached_vert_id is not None:
-                        primitive_index = None
-                        material_slot_name = material_slot_dict.get(material_index)
-                        if isinstance(material_slot_name, str):
-                            primitive_index = mat_id_dict[material_slot_name]
-                        primitive_index_bin_dict[primitive_index].extend(
-                            unsigned_int_scalar_packer(cached_vert_id)
-                        )
-                        primitive_index_vertex_count[primitive_index] += 1
-                        continue
-                    unique_vertex_dict[vertex_key] = unique_vertex_id
-                    for uvlayer_id, uvlayer_name in uvlayers_dict.items():
-                        uv_layer = bm.loops.layers.uv[uvlayer_name]
-                        uv = loop[uv_layer].uv
-                        texcoord_bins[uvlayer_id].extend(
-                            float_pair_packer(uv[0], 1 - uv[1])
-                        )  # blenderとglbのuvは上下逆
-                    for shape_name in shape_pos_bin_dict:
-                        shape_layer = bm.verts.layers.shape[shape_name]
-                        morph_pos = self.axis_blender_to_glb(
-                            [
-                                loop.vert[shape_layer][i] - loop.vert.co[i]
-                                for i in range(3)
-                            ]
-                        )
-                        shape_pos_bin_dict[shape_name].extend(
-                            float_vec3_packer(*morph_pos)
-                        )
-                        shape_normal_bin_dict[shape_name].extend(
-                            float_vec3_packer(
-                                *self.axis_blender_to_glb(
-                                    morph_normal_diff_dict[shape_name][loop.vert.index]
-                                )
-                            )
-                        )
-                        self.min_max(shape_min_max_dict[shape_name], morph_pos)
-                    if is_skin_mesh:
-                        weight_and_joint_list: List[Tuple[float, int]] = []
-                        for v_group in mesh_data.vertices[loop.vert.index].groups:
-                            v_group_name = v_group_name_dict.get(v_group.group)
-                            if v_group_name is None:
-                                continue
-                            joint_id = self.joint_id_from_node_name_solver(
-                                v_group_name, node_id_dict
-                            )
-                            # 存在しないボーンを指してる場合は-1を返されてるので、その場合は飛ばす
-                            if joint_id == -1:
-                                continue
-                            # ウエイトがゼロのジョイントの値は無視してゼロになるようにする
-                            # https://github.com/KhronosGroup/glTF/tree/f33f90ad9439a228bf90cde8319d851a52a3f470/specification/2.0#skinned-mesh-attributes
-                            if v_group.weight < float_info.epsilon:
-                                continue
-
-                            weight_and_joint_list.append((v_group.weight, joint_id))
+            )
 
-                        while len(weight_and_joint_list) < 4:
-                            weight_and_joint_list.append((0.0, 0))
+        for material_index, loops in polys:
+            primitive_index = material_index_to_primitive_index.get(material_index)
+            for loop in loops:
+                uv_list = []
+                for uvlayer_name in uvlayers_dict.values():
+                    uv_layer = bm.loops.layers.uv[uvlayer_name]
+                    uv_list.extend([loop[uv_layer].uv[0], loop[uv_layer].uv[1]])
+
+                # 頂点のノーマルではなくloopのノーマルを使う。これで失うものはあると思うが、
+                # glTF 2.0アドオンと同一にしておくのが無難だろうと判断。
+                # https://github.com/KhronosGroup/glTF-Blender-IO/pull/1127
+                vert_normal = mesh_data.loops[loop.index].normal
+                vertex_key = (*uv_list, *vert_normal, loop.vert.index)
+                cached_vert_id = unique_vertex_dict.get(
+                    vertex_key
+                )  # keyがなければNoneを返す
+                if cached_vert_id is not None:
+                    primitive_index_bin_dict[primitive_index].extend(
+                        unsigned_int_scalar_packer(cached_vert_id)
+                    )
+                    primitive_index_vertex_count[primitive_index] += 1
+                    continue
+                unique_vertex_dict[vertex_key] = unique_vertex_id
+                for uvlayer_id, uvlayer_name in uvlayers_dict.items():
+                    uv_layer = bm.loops.layers.uv[uvlayer_name]
+                    uv = loop[uv_layer].uv
+                    texcoord_bins[uvlayer_id].extend(
+                        float_pair_packer(uv[0], 1 - uv[1])
+                    )  # blenderとglbのuvは上下逆
+                vertex_slice = slice(loop.vert.index * 3, loop.vert.index * 3 + 3)
+                for shape_name in shape_pos_bin_dict:
+                    position_differences, normal_differences = morph_vertex_differences[
+                        shape_name
+                    ]
+                    morph_pos = self.axis_blender_to_glb(
+                        position_differences[vertex_slice]
+                    )
+                    shape_pos_bin_dict[shape_name].extend(float_vec3_packer(*morph_pos))
+                    shape_normal_bin_dict[shape_name].extend(
+                        float_vec3_packer(
+                            *self.axis_blender_to_glb(normal_differences[vertex_slice])
+                        )
+                    )
+                    self.min_max(shape_min_max_dict[shape_name], morph_pos)
+                if is_skin_mesh:
+                    row = vertex_rows[loop.vert.index]
+                    row_slice = slice(row * 4, row * 4 + 4)
+                    joints_bin.extend(
+                        unsigned_short_vec4_packer(*vertex_joints[row_slice])
+                    )
+                    weights_bin.extend(float_vec4_packer(*vertex_weights[row_slice]))
 
-                        weight_and_joint_list.sort(reverse=True)
+                vert_location = self.axis_blender_to_glb(loop.vert.co)
+                position_bin.extend(float_vec3_packer(*vert_location))
+                self.min_max(position_min_max, vert_location)
+                normal_bin.extend(
+                    float_vec3_packer(*self.axis_blender_to_glb(vert_normal))
+                )
+                if primitive_index not in primitive_index_bin_dict:
+                    primitive_index_bin_dict[primitive_index] = bytearray()
+                if primitive_index not in primitive_index_vertex_count:
+                    primitive_index_vertex_count[primitive_index] = 0
+                primitive_index_bin_dict[primitive_index].extend(
+                    unsigned_int_scalar_packer(unique_vertex_id)
+                )
+                primitive_index_vertex_count[primitive_index] += 1
+                unique_vertex_id += 1
+
+        bm.free()
+        return MeshBins(
+            vertex_count=unique_vertex_id,
+            primitive_index_bins=primitive_index_bin_dict,
+            primitive_index_counts=primitive_index_vertex_count,
+            position_bin=position_bin,
+            position_min_max=position_min_max,
+            normal_bin=normal_bin,
+            texcoord_bins=list(texcoord_bins.values()),
+            joints_bin=joints_bin,
+            weights_bin=weights_bin,
+            morph_position_bins=shape_pos_bin_dict,
+            morph_normal_bins=shape_normal_bin_dict,
+            morph_min_maxes=shape_min_max_dict,
+        )
 
-                        if len(weight_and_joint_list) > 4:
-                            logger.warning(
-                                f"Joints on vertex id:{loop.vert.index} in: {mesh.name} are truncated"
-                            )
-                            weight_and_joint_list = weight_and_joint_list[:4]
+    # Reads the whole mesh with foreach_get() instead of Python loops per vertex.
+    # The result is encoded by encode_mesh_arrays() with typed array operations.
+    def extract_mesh_arrays(
+        self,
+        mesh: bpy.types.Object,
+        mesh_data: bpy.types.Mesh,
+        is_skin_mesh: bool,
+        material_index_to_primitive_index: Dict[int, int],
+        vertex_group_joint_dict: Dict[int, int],
+    ) -> MeshArrays:
+        loop_count = len(mesh_data.loops)
+        triangle_count = len(mesh_data.loop_triangles)
+        triangle_loop_indices: "array.array[int]" = vertex_buffer.create_array(
+            "i", triangle_count * 3
+        )
+        mesh_data.loop_triangles.foreach_get("loops", triangle_loop_indices)
+        triangle_material_indices: "array.array[int]" = vertex_buffer.create_array(
+            "i", triangle_count
+        )
+        mesh_data.loop_triangles.foreach_get(
+            "material_index", triangle_material_indices
+        )
+        loop_vertex_indices: "array.array[int]" = vertex_buffer.create_array(
+            "i", loop_count
+        )
+        mesh_data.loops.foreach_get("vertex_index", loop_vertex_indices)
+        # BMeshを使う場合と同様に、頂点のノーマルではなくloopのノーマルを使う
+        loop_normals: "array.array[float]" = vertex_buffer.create_array(
+            "f", loop_count * 3
+        )
+        mesh_data.loops.foreach_get("normal", loop_normals)
+        vertex_positions: "array.array[float]" = vertex_buffer.create_array(
+            "f", len(mesh_data.vertices) * 3
+        )
+        mesh_data.vertices.foreach_get("co", vertex_positions)
+        loop_uvs_list: List["array.array[float]"] = []
+        for uv_layer in mesh_data.uv_layers:
+            loop_uvs: "array.array[float]" = vertex_buffer.create_array(
+                "f", loop_count * 2
+            )
+            uv_layer.data.foreach_get("uv", loop_uvs)
+            loop_uvs_list.append(loop_uvs)
+
+        morph_differences: List[
+            Tuple[str, "array.array[float]", "array.array[float]"]
+        ] = []
+        if mesh_data.shape_keys is not None:
+            morph_differences = list(self.fetch_morph_vertex_differences(mesh_data))
+
+        skin_vertex_indices: List[int] = []
+        skin_influences: List[List[Tuple[float, int]]] = []
+        fallback_joint = 0
+        if is_skin_mesh:
+            # Weights depend only on the vertex, not on the loop. The vertices
+            # are in the same order as the welded vertices refer to them.
+            skin_vertex_indices = list(
+                dict.fromkeys(
+                    map(loop_vertex_indices.__getitem__, triangle_loop_indices)
+                )
+            )
+            skin_influences, fallback_joint = self.vertex_influences(
+                mesh, mesh_data, skin_vertex_indices, vertex_group_joint_dict
+            )
 
-                        weights = [weight for weight, _ in weight_and_joint_list]
-                        joints = [joint for _, joint in weight_and_joint_list]
+        return MeshArrays(
+            loop_count=loop_count,
+            triangle_loop_indices=triangle_loop_indices,
+            triangle_material_indices=triangle_material_indices,
+            loop_vertex_indices=loop_vertex_indices,
+            loop_normals=loop_normals,
+            vertex_positions=vertex_positions,
+            loop_uvs_list=loop_uvs_list,
+            material_index_to_primitive_index=material_index_to_primitive_index,
+            morph_differences=morph_differences,
+            skin_vertex_indices=skin_vertex_indices,
+            skin_influences=skin_influences,
+            fallback_joint=fallback_joint,
+        )
 
-                        if sum(weights) < float_info.epsilon:
-                            logger.warning(
-                                f"No weight on vertex id:{loop.vert.index} in: {mesh.name}"
-                            )
+    def create_morph_target_glb_bin(
+        self,
+        binary: gltf.BinaryChunk,
+        vertex_count: int,
+        min_max: Optional[List[List[float]]],
+        quantize: bool = False,
+    ) -> GlbBin:
+        component_type = bgl.GL_FLOAT
+        normalized = False
+        if quantize:
+            values = accessor.read_typed_array(
+                binary, 0, vertex_count, 3, accessor.FLOAT
+            )
+            # 法線の差分は[-2, 2]の範囲になりうるが、正規化整数は[-1, 1]しか表せない
+            if mesh_quantization.is_in_range(values, -1.0, 1.0):
+                quantized = mesh_quantization.quantize_signed_normalized(
+                    values, accessor.SHORT
+                )
+                self.quantization_report.add(
+                    "Morph target NORMAL",
+                    memoryview(binary).nbytes,
+                    quantized,
+                    accessor.SHORT,
+                    mesh_quantization.max_quantization_error(
+                        values, quantized, accessor.SHORT
+                    ),
+                )
+                binary = vertex_buffer.to_little_endian_bytes(quantized)
+                component_type = bgl.GL_SHORT
+                normalized = True
+                self.use_khr_mesh_quantization = True
+            else:
+                self.quantization_report.skip("Morph target NORMAL")
+
+        sparse_values = None
+        if self.sparse_morph_target_threshold is not None:
+            sparse_values = sparse_accessor.create_sparse_values(
+                accessor.read_typed_array(binary, 0, vertex_count, 3, component_type),
+                3,
+                self.sparse_morph_target_threshold,
+                component_type,
+            )
+        if sparse_values is None:
+            return GlbBin(
+                binary,
+                "VEC3",
+                component_type,
+                vertex_count,
+                min_max,
+                self.glb_bin_collector,
+                normalized=normalized,
+            )
+        self.sparse_morph_target_saved_bytes += (
+            memoryview(binary).nbytes - sparse_values.byte_length()
+        )
+        return GlbBin(
+            vertex_buffer.to_little_endian_bytes(sparse_values.values),
+            "VEC3",
+            component_type,
+            vertex_count,
+            min_max,
+            self.glb_bin_collector,
+            sparse_values,
+            normalized,
+        )
 
-                            # Attach near bone
-                            bone_name: Optional[str] = None
-                            mesh_parent = mesh
-                            while (
-                                mesh_parent
-                                and mesh_parent.type
-                                in search.MESH_CONVERTIBLE_OBJECT_TYPES
-                                and mesh_parent != mesh
-                            ):
-                                if (
-                                    mesh_parent.parent_type == "BONE"
-                                    and mesh_parent.parent_bone
-                                    in self.armature.data.bones
-                                ):
-                                    bone_name = mesh_parent.parent_bone
-                                    break
-                                mesh_parent = mesh.parent
-                            if not bone_name:
-                                for (
-                                    human_bone
-                                ) in (
-                                    self.armature.data.vrm_addon_extension.vrm0.humanoid.human_bones
-                                ):
-                                    if human_bone.bone == "hips":
-                                        bone_name = human_bone.node.value
-                                if (
-                                    bone_name is None
-                                    or bone_name not in self.armature.data.bones
-                                ):
-                                    raise ValueError("No hips bone found")
-                            bone_index = next(
-                                index
-                                for index, node_dict in enumerate(node_dicts)
-                                if isinstance(node_dict, dict)
-                                and node_dict.get("name") == bone_name
-                            )
-                            weights = [1.0, 0, 0, 0]
-                            joints = [bone_index, 0, 0, 0]
+    def create_index_glb_bin(
+        self, binary: gltf.BinaryChunk, index_count: int, vertex_count: int
+    ) -> GlbBin:
+        component_type = bgl.GL_UNSIGNED_INT
+        if self.quantize_indices:
+            component_type = mesh_quantization.index_component_type(vertex_count)
+        if component_type != bgl.GL_UNSIGNED_INT:
+            quantized = mesh_quantization.convert_indices(
+                accessor.read_typed_array(
+                    binary, 0, index_count, 1, accessor.UNSIGNED_INT
+                ),
+                component_type,
+            )
+            self.quantization_report.add(
+                "Indices", memoryview(binary).nbytes, quantized, component_type
+            )
+            binary = vertex_buffer.to_little_endian_bytes(quantized)
+        return GlbBin(
+            binary,
+            "SCALAR",
+            component_type,
+            index_count,
+            None,
+            self.glb_bin_collector,
+        )
 
-                        normalized_weights = normalize_weights_compatible_with_gl_float(
-                            weights
-                        )
-                        joints_bin.extend(unsigned_short_vec4_packer(*joints))
-                        weights_bin.extend(float_vec4_packer(*normalized_weights))
-
-                    vert_location = self.axis_blender_to_glb(loop.vert.co)
-                    position_bin.extend(float_vec3_packer(*vert_location))
-                    self.min_max(position_min_max, vert_location)
-                    normal_bin.extend(
-                        float_vec3_packer(*self.axis_blender_to_glb(vert_normal))
-                    )
-                    primitive_index = None
-                    material_slot_name = material_slot_dict.get(material_index)
-                    if isinstance(material_slot_name, str):
-                        primitive_index = mat_id_dict[material_slot_name]
-                    if primitive_index not in primitive_index_bin_dict:
-                        primitive_index_bin_dict[primitive_index] = bytearray()
-                    if primitive_index not in primitive_index_vertex_count:
-                        primitive_index_vertex_count[primitive_index] = 0
-                    primitive_index_bin_dict[primitive_index].extend(
-                        unsigned_int_scalar_packer(unique_vertex_id)
-                    )
-                    primitive_index_vertex_count[primitive_index] += 1
-                    unique_vertex_id += 1
-
-            # DONE :index position, uv, normal, position morph,JOINT WEIGHT
-            # TODO: morph_normal, v_color...?
-            primitive_glbs_dict = {
-                mat_id: GlbBin(
-                    index_bin,
-                    "SCALAR",
-                    bgl.GL_UNSIGNED_INT,
-                    primitive_index_vertex_count[mat_id],
+    def create_texcoord_glb_bin(
+        self, binary: gltf.BinaryChunk, vertex_count: int
+    ) -> GlbBin:
+        if self.quantize_attributes:
+            values = accessor.read_typed_array(
+                binary, 0, vertex_count, 2, accessor.FLOAT
+            )
+            # 範囲外のUVは正規化整数で表せないため、floatのまま出力する
+            if mesh_quantization.is_in_range(values, 0.0, 1.0):
+                quantized = mesh_quantization.quantize_unsigned_normalized(
+                    values, accessor.UNSIGNED_SHORT
+                )
+                self.quantization_report.add(
+                    "TEXCOORD",
+                    memoryview(binary).nbytes,
+                    quantized,
+                    accessor.UNSIGNED_SHORT,
+                    mesh_quantization.max_quantization_error(
+                        values, quantized, accessor.UNSIGNED_SHORT
+                    ),
+                )
+                return GlbBin(
+                    vertex_buffer.to_little_endian_bytes(quantized),
+                    "VEC2",
+                    bgl.GL_UNSIGNED_SHORT,
+                    vertex_count,
                     None,
                     self.glb_bin_collector,
+                    normalized=True,
                 )
-                for mat_id, index_bin in primitive_index_bin_dict.items()
-                if index_bin
-            }
-
-            if not primitive_glbs_dict:
-                bm.free()
-                continue
-
-            mesh_index = len(mesh_dicts)
-            node_dict["mesh"] = mesh_index
-            if is_skin_mesh:
-                # TODO: 決め打ちってどうよ:一体のモデルなのだから2つもあっては困る(から決め打ち(やめろ(やだ))
-                node_dict["skin"] = 0
+            self.quantization_report.skip("TEXCOORD")
+        return GlbBin(
+            binary,
+            "VEC2",
+            bgl.GL_FLOAT,
+            vertex_count,
+            None,
+            self.glb_bin_collector,
+        )
 
-            pos_glb = GlbBin(
-                position_bin,
-                "VEC3",
+    def create_weights_glb_bin(
+        self, binary: gltf.BinaryChunk, vertex_count: int
+    ) -> GlbBin:
+        if not self.quantize_attributes:
+            return GlbBin(
+                binary,
+                "VEC4",
                 bgl.GL_FLOAT,
-                unique_vertex_id,
-                position_min_max,
+                vertex_count,
+                None,
                 self.glb_bin_collector,
             )
-            nor_glb = GlbBin(
-                normal_bin,
-                "VEC3",
-                bgl.GL_FLOAT,
-                unique_vertex_id,
+        values = accessor.read_typed_array(binary, 0, vertex_count, 4, accessor.FLOAT)
+        quantized = mesh_quantization.quantize_weights(values, accessor.UNSIGNED_SHORT)
+        self.quantization_report.add(
+            "WEIGHTS_0",
+            memoryview(binary).nbytes,
+            quantized,
+            accessor.UNSIGNED_SHORT,
+            mesh_quantization.max_quantization_error(
+                values, quantized, accessor.UNSIGNED_SHORT
+            ),
+        )
+        return GlbBin(
+            vertex_buffer.to_little_endian_bytes(quantized),
+            "VEC4",
+            bgl.GL_UNSIGNED_SHORT,
+            vertex_count,
+            None,
+            self.glb_bin_collector,
+            normalized=True,
+        )
+
+    def merge_mesh_bins(
+        self,
+        mesh: bpy.types.Object,
+        is_skin_mesh: bool,
+        node_dict: Dict[str, Json],
+        pending_mesh_bins: Union[MeshBins, PendingMeshBins],
+    ) -> None:
+        if isinstance(pending_mesh_bins, MeshBins):
+            mesh_bins = pending_mesh_bins
+        else:
+            mesh_bins = pending_mesh_bins.result()
+        if self.optimize_vertex_cache:
+            mesh_bins = optimize_mesh_bins(
+                mesh.name, mesh_bins, self.export_fb_ngon_encoding
+            )
+
+        # DONE :index position, uv, normal, position morph,JOINT WEIGHT
+        # TODO: morph_normal, v_color...?
+        primitive_glbs_dict = {
+            mat_id: self.create_index_glb_bin(
+                index_bin,
+                mesh_bins.primitive_index_counts[mat_id],
+                mesh_bins.vertex_count,
+            )
+            for mat_id, index_bin in mesh_bins.primitive_index_bins.items()
+            if index_bin
+        }
+
+        if not primitive_glbs_dict:
+            return
+
+        mesh_dicts = self.json_dict.get("meshes")
+        if not isinstance(mesh_dicts, list):
+            mesh_dicts = []
+            self.json_dict["meshes"] = mesh_dicts
+        mesh_index = len(mesh_dicts)
+        node_dict["mesh"] = mesh_index
+        if is_skin_mesh:
+            # TODO: 決め打ちってどうよ:一体のモデルなのだから2つもあっては困る(から決め打ち(やめろ(やだ))
+            node_dict["skin"] = 0
+
+        pos_glb = GlbBin(
+            mesh_bins.position_bin,
+            "VEC3",
+            bgl.GL_FLOAT,
+            mesh_bins.vertex_count,
+            mesh_bins.position_min_max,
+            self.glb_bin_collector,
+        )
+        nor_glb = GlbBin(
+            mesh_bins.normal_bin,
+            "VEC3",
+            bgl.GL_FLOAT,
+            mesh_bins.vertex_count,
+            None,
+            self.glb_bin_collector,
+        )
+        uv_glbs = [
+            self.create_texcoord_glb_bin(texcoord_bin, mesh_bins.vertex_count)
+            for texcoord_bin in mesh_bins.texcoord_bins
+        ]
+
+        joints_glb = None
+        weights_glb = None
+        if is_skin_mesh:
+            joints_glb = GlbBin(
+                mesh_bins.joints_bin,
+                "VEC4",
+                bgl.GL_UNSIGNED_SHORT,
+                mesh_bins.vertex_count,
                 None,
                 self.glb_bin_collector,
             )
-            uv_glbs = [
-                GlbBin(
-                    texcoord_bin,
-                    "VEC2",
-                    bgl.GL_FLOAT,
-                    unique_vertex_id,
+            weights_glb = self.create_weights_glb_bin(
+                mesh_bins.weights_bin, mesh_bins.vertex_count
+            )
+
+        morph_pos_glbs = None
+        morph_normal_glbs = None
+        if mesh_bins.morph_position_bins:
+            morph_pos_glbs = [
+                self.create_morph_target_glb_bin(
+                    morph_pos_bin, mesh_bins.vertex_count, morph_minmax
+                )
+                for morph_pos_bin, morph_minmax in zip(
+                    mesh_bins.morph_position_bins.values(),
+                    mesh_bins.morph_min_maxes.values(),
+                )
+            ]
+            morph_normal_glbs = [
+                self.create_morph_target_glb_bin(
+                    morph_normal_bin,
+                    mesh_bins.vertex_count,
                     None,
-                    self.glb_bin_collector,
+                    self.quantize_morph_normals,
                 )
-                for texcoord_bin in texcoord_bins.values()
+                for morph_normal_bin in mesh_bins.morph_normal_bins.values()
             ]
 
-            joints_glb = None
-            weights_glb = None
+        primitive_list = []
+        for primitive_id, index_glb in primitive_glbs_dict.items():
+            primitive: Dict[str, Json] = {"mode": 4}
+            if primitive_id is not None:
+                primitive["material"] = primitive_id
+            primitive["indices"] = index_glb.accessor_id
+            attributes_dict: Dict[str, Json] = {
+                "POSITION": pos_glb.accessor_id,
+                "NORMAL": nor_glb.accessor_id,
+            }
+            primitive["attributes"] = attributes_dict
             if is_skin_mesh:
-                joints_glb = GlbBin(
-                    joints_bin,
-                    "VEC4",
-                    bgl.GL_UNSIGNED_SHORT,
-                    unique_vertex_id,
-                    None,
-                    self.glb_bin_collector,
-                )
-                weights_glb = GlbBin(
-                    weights_bin,
-                    "VEC4",
-                    bgl.GL_FLOAT,
-                    unique_vertex_id,
-                    None,
-                    self.glb_bin_collector,
+                if joints_glb is None:
+                    raise ValueError("joints glb is None")
+                if weights_glb is None:
+                    raise ValueError("weights glb is None")
+                attributes_dict.update(
+                    {
+                        "JOINTS_0": joints_glb.accessor_id,
+                        "WEIGHTS_0": weights_glb.accessor_id,
+                    }
                 )
-
-            morph_pos_glbs = None
-            morph_normal_glbs = None
-            if shape_pos_bin_dict:
-                morph_pos_glbs = [
-                    GlbBin(
-                        morph_pos_bin,
-                        "VEC3",
-                        bgl.GL_FLOAT,
-                        unique_vertex_id,
-                        morph_minmax,
-                        self.glb_bin_collector,
-                    )
-                    for morph_pos_bin, morph_minmax in zip(
-                        shape_pos_bin_dict.values(), shape_min_max_dict.values()
-                    )
-                ]
-                morph_normal_glbs = [
-                    GlbBin(
-                        morph_normal_bin,
-                        "VEC3",
-                        bgl.GL_FLOAT,
-                        unique_vertex_id,
-                        None,
-                        self.glb_bin_collector,
-                    )
-                    for morph_normal_bin in shape_normal_bin_dict.values()
-                ]
-
-            primitive_list = []
-            for primitive_id, index_glb in primitive_glbs_dict.items():
-                primitive: Dict[str, Json] = {"mode": 4}
-                if primitive_id is not None:
-                    primitive["material"] = primitive_id
-                primitive["indices"] = index_glb.accessor_id
-                attributes_dict: Dict[str, Json] = {
-                    "POSITION": pos_glb.accessor_id,
-                    "NORMAL": nor_glb.accessor_id,
+            attributes_dict.update(
+                {
+                    f"TEXCOORD_{i}": uv_glb.accessor_id
+                    for i, uv_glb in enumerate(uv_glbs)
                 }
-                primitive["attributes"] = attributes_dict
-                if is_skin_mesh:
-                    if joints_glb is None:
-                        raise ValueError("joints glb is None")
-                    if weights_glb is None:
-                        raise ValueError("weights glb is None")
-                    attributes_dict.update(
+            )
+            if mesh_bins.morph_position_bins:
+                if morph_pos_glbs and morph_normal_glbs:
+                    primitive["targets"] = [
                         {
-                            "JOINTS_0": joints_glb.accessor_id,
-                            "WEIGHTS_0": weights_glb.accessor_id,
+                            "POSITION": morph_pos_glb.accessor_id,
+                            "NORMAL": morph_normal_glb.accessor_id,
                         }
-                    )
-                attributes_dict.update(
-                    {
-                        f"TEXCOORD_{i}": uv_glb.accessor_id
-                        for i, uv_glb in enumerate(uv_glbs)
+                        for morph_pos_glb, morph_normal_glb in zip(
+                            morph_pos_glbs, morph_normal_glbs
+                        )
+                    ]
+                primitive["extras"] = {
+                    "targetNames": list(mesh_bins.morph_position_bins.keys())
+                }
+            primitive_list.append(primitive)
+        self.mesh_name_to_index[mesh.name] = mesh_index
+
+        mesh_dict = {
+            "name": mesh.data.name,
+            "primitives": primitive_list,
+        }
+        if self.export_fb_ngon_encoding:
+            mesh_dict["extensions"] = {"FB_ngon_encoding": {}}
+
+        mesh_dicts.append(mesh_dict)
+
+    # Reads the copied evaluated mesh in the export coordinates. The mesh data
+    # is no longer used after it returns, even if the encoding is pending.
+    def extract_mesh_bins(
+        self,
+        mesh_encoder: MeshEncoder,
+        mesh: bpy.types.Object,
+        mesh_data: bpy.types.Mesh,
+        is_skin_mesh: bool,
+    ) -> Union[MeshBins, PendingMeshBins]:
+        mesh_data_transform = Matrix.Identity(4)
+        if not is_skin_mesh:
+            mesh_data_transform @= Matrix.Translation(
+                -mesh.matrix_world.to_translation()
+            )
+        mesh_data_transform @= mesh.matrix_world
+        mesh_data.transform(mesh_data_transform, shape_keys=True)
+        mesh_data.calc_loop_triangles()
+        mesh_data.calc_normals_split()
+
+        # region temporary used
+        material_dicts = self.json_dict.get("materials")
+        if not isinstance(material_dicts, list):
+            material_dicts = []
+            self.json_dict["materials"] = material_dicts
+
+        mat_id_dict = {
+            str(material_dict.get("name")): i
+            for i, material_dict in enumerate(material_dicts)
+            if isinstance(material_dict, dict)
+        }
+        material_index_to_primitive_index = {
+            i: mat_id_dict[mat.name]
+            for i, mat in enumerate(mesh.material_slots)
+            if mat.name
+        }
+        vertex_group_joint_dict = self.create_vertex_group_joint_dict(mesh)
+        # endregion  temporary_used
+
+        if self.export_fb_ngon_encoding:
+            # FB_ngon_encoding requires the BMesh faces to build triangle fans
+            return self.mesh_to_bins_with_bmesh(
+                mesh,
+                mesh_data,
+                is_skin_mesh,
+                material_index_to_primitive_index,
+                vertex_group_joint_dict,
+            )
+        return mesh_encoder.submit(
+            self.extract_mesh_arrays(
+                mesh,
+                mesh_data,
+                is_skin_mesh,
+                material_index_to_primitive_index,
+                vertex_group_joint_dict,
+            )
+        )
+
+    # Orders the meshes so that each mesh comes after its parent mesh. Children
+    # come right after their parents, and the other meshes keep their order.
+    @staticmethod
+    def sort_meshes_by_parent(
+        meshes: Sequence[bpy.types.Object],
+    ) -> List[bpy.types.Object]:
+        mesh_names = {mesh.name for mesh in meshes}
+        waiting_children: Dict[str, List[bpy.types.Object]] = {}
+        sorted_meshes: List[bpy.types.Object] = []
+        sorted_mesh_names: Set[str] = set()
+        for mesh in meshes:
+            parent = mesh.parent
+            if (
+                mesh.parent_type == "OBJECT"
+                and parent
+                and parent.name in mesh_names
+                and parent.name not in sorted_mesh_names
+            ):
+                waiting_children.setdefault(parent.name, []).append(mesh)
+                continue
+            ready_meshes = [mesh]
+            while ready_meshes:
+                ready_mesh = ready_meshes.pop()
+                sorted_meshes.append(ready_mesh)
+                sorted_mesh_names.add(ready_mesh.name)
+                ready_meshes.extend(reversed(waiting_children.pop(ready_mesh.name, [])))
+        return sorted_meshes
+
+    def mesh_to_bin_and_dict(self) -> None:
+        if not isinstance(self.json_dict.get("meshes"), list):
+            self.json_dict["meshes"] = []
+
+        meshes = self.sort_meshes_by_parent(
+            [
+                obj
+                for obj in self.export_objects
+                if obj.type in search.MESH_CONVERTIBLE_OBJECT_TYPES
+            ]
+        )
+        self.create_node_indices()
+
+        # Meshes are read from Blender on the main thread one by one, and large
+        # ones are encoded by the worker processes meanwhile. The results are
+        # merged in the order of the meshes, so the output doesn't depend on
+        # scheduling.
+        if bpy.app.version < (2, 91):
+            python_executable = bpy.app.binary_path_python
+        else:
+            # Blender 2.91 or later sets sys.executable to the bundled Python
+            python_executable = sys.executable
+        pending_meshes: List[
+            Tuple[
+                bpy.types.Object,
+                bool,
+                Dict[str, Json],
+                Union[MeshBins, PendingMeshBins],
+            ]
+        ] = []
+        # オペレーターやモードの変更をせず、全てのメッシュで同じ評価済みのdepsgraphを使う
+        # https://docs.blender.org/api/2.80/bpy.types.Depsgraph.html
+        depsgraph = self.context.evaluated_depsgraph_get()
+        with contextlib.closing(
+            MeshEncoder(python_executable=python_executable)
+        ) as mesh_encoder:
+            for mesh in meshes:
+                with self.profiler.phase(f"mesh:{mesh.name}"):
+                    is_skin_mesh = self.is_skin_mesh(mesh)
+                    node_dict = {
+                        "name": mesh.name,
+                        "translation": self.axis_blender_to_glb(mesh.location),
+                        "rotation": [0, 0, 0, 1],  # このへんは規約なので
+                        "scale": [1, 1, 1],  # このへんは規約なので
                     }
-                )
-                if shape_pos_bin_dict:
-                    if morph_pos_glbs and morph_normal_glbs:
-                        primitive["targets"] = [
-                            {
-                                "POSITION": morph_pos_glb.accessor_id,
-                                "NORMAL": morph_normal_glb.accessor_id,
-                            }
-                            for morph_pos_glb, morph_normal_glb in zip(
-                                morph_pos_glbs, morph_normal_glbs
+                    if is_skin_mesh:
+                        node_dict["translation"] = [
+                            0,
+                            0,
+                            0,
+                        ]  # skinnedmeshはtransformを無視される
+
+                    node_dicts = self.json_dict.get("nodes")
+                    if not isinstance(node_dicts, list):
+                        node_dicts = []
+                        self.json_dict["nodes"] = node_dicts
+
+                    node_dicts.append(node_dict)
+
+                    mesh_node_id = len(node_dicts) - 1
+                    self.node_name_to_index.setdefault(mesh.name, mesh_node_id)
+
+                    if is_skin_mesh:
+                        first_scene_nodes = deep.get(
+                            self.json_dict, ["scenes", 0, "nodes"]
+                        )
+                        if isinstance(first_scene_nodes, list):
+                            first_scene_nodes.append(mesh_node_id)
+                    else:
+                        parent_node_index = None
+                        if mesh.parent_type == "BONE":
+                            parent_node_index = self.node_name_to_index.get(
+                                mesh.parent_bone
                             )
-                        ]
-                    primitive["extras"] = {
-                        "targetNames": list(shape_pos_bin_dict.keys())
-                    }
-                primitive_list.append(primitive)
-            self.mesh_name_to_index[mesh.name] = mesh_index
+                        elif mesh.parent_type == "OBJECT":
+                            parent_node_index = self.node_name_to_index.get(
+                                mesh.parent.name
+                            )
+                        parent_node = None
+                        if parent_node_index is not None:
+                            parent_node_dict = node_dicts[parent_node_index]
+                            if isinstance(parent_node_dict, dict):
+                                parent_node = parent_node_dict
+                        base_pos = [0, 0, 0]
+                        if parent_node:
+                            children = parent_node.get("children")
+                            if not isinstance(children, list):
+                                children = []
+                                parent_node["children"] = children
+                            children.append(mesh_node_id)
+                            if mesh.parent_type == "BONE":
+                                base_pos = (
+                                    self.armature.matrix_world
+                                    @ self.armature.pose.bones[
+                                        mesh.parent_bone
+                                    ].matrix.to_4x4()
+                                ).to_translation()
+                            else:
+                                base_pos = mesh.parent.matrix_world.to_translation()
+                        else:
+                            first_scene_nodes = deep.get(
+                                self.json_dict, ["scenes", 0, "nodes"]
+                            )
+                            if isinstance(first_scene_nodes, list):
+                                first_scene_nodes.append(mesh_node_id)
+                        mesh_pos = mesh.matrix_world.to_translation()
+                        relate_pos = [mesh_pos[i] - base_pos[i] for i in range(3)]
+
+                        if 0 <= mesh_node_id < len(node_dicts):
+                            mesh_node_dict = node_dicts[mesh_node_id]
+                            if isinstance(mesh_node_dict, dict):
+                                mesh_node_dict["translation"] = make_json(
+                                    self.axis_blender_to_glb(relate_pos)
+                                )
 
-            mesh_dict = {
-                "name": mesh.data.name,
-                "primitives": primitive_list,
-            }
-            if self.export_fb_ngon_encoding:
-                mesh_dict["extensions"] = {"FB_ngon_encoding": {}}
+                    # region hell
+                    mesh_owner = mesh.evaluated_get(depsgraph)
+                    mesh_from_mesh_owner = mesh_owner.to_mesh(
+                        preserve_all_data_layers=True, depsgraph=depsgraph
+                    )
+                    if not mesh_from_mesh_owner:
+                        continue
+                    # シェイプキーも含めて座標変換するため、評価済みのメッシュを複製する
+                    mesh_data = mesh_from_mesh_owner.copy()
+                    mesh_owner.to_mesh_clear()
+                    try:
+                        pending_mesh_bins = self.extract_mesh_bins(
+                            mesh_encoder, mesh, mesh_data, is_skin_mesh
+                        )
+                    finally:
+                        bpy.data.meshes.remove(mesh_data)
+                    pending_meshes.append(
+                        (mesh, is_skin_mesh, node_dict, pending_mesh_bins)
+                    )
+                    # endregion hell
 
-            mesh_dicts.append(mesh_dict)
-            bm.free()
-            # endregion hell
+                # Limit the number of the extracted meshes kept in memory
+                while len(pending_meshes) > mesh_encoder.max_workers:
+                    self.merge_mesh_bins(*pending_meshes.pop(0))
 
-            bpy.ops.object.mode_set(mode="OBJECT")
-        bpy.ops.object.mode_set(mode="OBJECT")
+            while pending_meshes:
+                self.merge_mesh_bins(*pending_meshes.pop(0))
+
+        if self.sparse_morph_target_threshold is not None:
+            logger.info(
+                "Sparse morph targets saved"
+                + f" {self.sparse_morph_target_saved_bytes} bytes"
+            )
+        for line in self.quantization_report.lines():
+            logger.info(f"Mesh quantization: {line}")
 
     def exporter_name(self) -> str:
         v = addon_version()
@@ -2175,8 +2596,12 @@ class LegacyVrmExporter(AbstractBaseVrmExporter):
             "KHR_texture_transform",
             "VRMC_materials_mtoon",
         ]
+        extensions_required = []
         if self.export_fb_ngon_encoding:
             extensions_used.append("FB_ngon_encoding")
+        if self.use_khr_mesh_quantization:
+            extensions_used.append("KHR_mesh_quantization")
+            extensions_required.append("KHR_mesh_quantization")
         gltf_meta_dict: Dict[str, Json] = {
             "extensionsUsed": make_json(extensions_used),
             "asset": {
@@ -2184,6 +2609,8 @@ class LegacyVrmExporter(AbstractBaseVrmExporter):
                 "version": "2.0",  # glTF version
             },
         }
+        if extensions_required:
+            gltf_meta_dict["extensionsRequired"] = make_json(extensions_required)
 
         self.json_dict.update(gltf_meta_dict)
 
@@ -2636,13 +3063,13 @@ class LegacyVrmExporter(AbstractBaseVrmExporter):
         )
 
     def pack(self) -> None:
-        bin_json, bin_chunk = self.glb_bin_collector.pack_all()
+        bin_json, bin_chunks = self.glb_bin_collector.pack_all()
         self.json_dict.update(bin_json)
         if not self.json_dict["meshes"]:
             del self.json_dict["meshes"]
         if not self.json_dict["materials"]:
             del self.json_dict["materials"]
-        self.result = gltf.pack_glb(self.json_dict, bin_chunk)
+        self.result = (self.json_dict, bin_chunks)
 
     def cleanup(self) -> None:
         if self.use_dummy_armature:
@@ -2654,22 +3081,84 @@ def normalize_weights_compatible_with_gl_float(
 ) -> Sequence[float]:
     if abs(sum(weights) - 1.0) < float_info.epsilon:
         return weights
-
-    def to_gl_float(array4: Sequence[float]) -> Sequence[float]:
-        return list(struct.unpack("<ffff", struct.pack("<ffff", *array4)))
-
-    # Simulate export and import
-    weights = to_gl_float(weights)
-    for _ in range(10):
-        next_weights = to_gl_float([weights[i] / sum(weights) for i in range(4)])
-        error = abs(1 - math.fsum(weights))
-        next_error = abs(1 - math.fsum(next_weights))
-        if error >= float_info.epsilon and error > next_error:
-            weights = next_weights
+    return vertex_buffer.normalize_weights(weights).tolist()
+
+
+# Reorders the triangles of each primitive for the GPU vertex cache, and then
+# the vertices in the order of their first use. Only the order changes.
+def optimize_mesh_bins(name: str, mesh_bins: MeshBins, keep_fans: bool) -> MeshBins:
+    typecode = accessor.COMPONENT_TYPE_TO_TYPECODE[accessor.UNSIGNED_INT]
+    original_index_buffers = {
+        primitive_index: mesh_quantization.convert_indices(
+            accessor.read_typed_array(
+                index_bin,
+                0,
+                mesh_bins.primitive_index_counts[primitive_index],
+                1,
+                accessor.UNSIGNED_INT,
+            ),
+            accessor.UNSIGNED_INT,
+        )
+        for primitive_index, index_bin in mesh_bins.primitive_index_bins.items()
+    }
+
+    index_buffers: Dict[Optional[int], Sequence[int]] = {}
+    for primitive_index, indices in original_index_buffers.items():
+        if keep_fans:
+            # FB_ngon_encodingのため、扇状に割ったngonの三角形は連続したままにする
+            triangle_order = vertex_cache.optimize_fan_order(indices)
+            if triangle_order is None:
+                logger.warning(f"Triangle order of {name} is kept for FB_ngon_encoding")
+                index_buffers[primitive_index] = indices
+                continue
         else:
-            break
+            triangle_order = vertex_cache.optimize_triangle_order(indices)
+        index_buffers[primitive_index] = vertex_cache.reorder_triangles(
+            indices, triangle_order, typecode
+        )
 
-    return weights
+    vertex_order = vertex_cache.vertex_fetch_order(
+        list(index_buffers.values()), mesh_bins.vertex_count
+    )
+    primitive_index_bins: Dict[Optional[int], gltf.BinaryChunk] = {
+        primitive_index: vertex_buffer.to_little_endian_bytes(
+            vertex_cache.remap_indices(indices, vertex_order, typecode)
+        )
+        for primitive_index, indices in index_buffers.items()
+    }
+    original_miss_ratio = vertex_cache.average_cache_miss_ratio(
+        list(chain.from_iterable(original_index_buffers.values()))
+    )
+    miss_ratio = vertex_cache.average_cache_miss_ratio(
+        list(chain.from_iterable(index_buffers.values()))
+    )
+    logger.info(
+        f"Vertex cache miss ratio of {name}:"
+        + f" {original_miss_ratio:.3f} -> {miss_ratio:.3f}"
+    )
+
+    def reorder_vertices(binary: gltf.BinaryChunk) -> gltf.BinaryChunk:
+        return vertex_buffer.gather_byte_rows(
+            binary, mesh_bins.vertex_count, vertex_order
+        )
+
+    return replace(
+        mesh_bins,
+        primitive_index_bins=primitive_index_bins,
+        position_bin=reorder_vertices(mesh_bins.position_bin),
+        normal_bin=reorder_vertices(mesh_bins.normal_bin),
+        texcoord_bins=list(map(reorder_vertices, mesh_bins.texcoord_bins)),
+        joints_bin=reorder_vertices(mesh_bins.joints_bin),
+        weights_bin=reorder_vertices(mesh_bins.weights_bin),
+        morph_position_bins={
+            shape_name: reorder_vertices(morph_position_bin)
+            for shape_name, morph_position_bin in mesh_bins.morph_position_bins.items()
+        },
+        morph_normal_bins={
+            shape_name: reorder_vertices(morph_normal_bin)
+            for shape_name, morph_normal_bin in mesh_bins.morph_normal_bins.items()
+        },
+    )
 
 
 def matrix_loc_rot_scale(
@@ -1,7 +1,19 @@
-from typing import Set, Tuple, cast
+import contextlib
+import os
+import shutil
+import sys
+import tempfile
+from typing import Callable, Iterator, Optional, Set, Tuple, cast
 
 import bpy
 
+from ..common.logging import get_logger
+
+logger = get_logger(__name__)
+
+# Used when the size of the files exchanged with the glTF 2.0 add-on is unknown
+RAM_BACKED_TEMPORARY_DIRECTORY_MIN_FREE_BYTES = 1024 * 1024 * 1024
+
 
 class WM_OT_vrm_io_scene_gltf2_disabled_warning(bpy.types.Operator):  # type: ignore[misc] # noqa: N801
     bl_label = "glTF 2.0 add-on is disabled"
@@ -55,3 +67,54 @@ def init_extras_export() -> None:
     value = "vrm_addon_extension"
     if value not in BLACK_LIST:
         BLACK_LIST.append(value)
+
+
+def ram_backed_temporary_directory_parent(
+    required_bytes: Optional[int],
+) -> Optional[str]:
+    if not sys.platform.startswith("linux"):
+        return None
+    shm_path = "/dev/shm"  # noqa: S108
+    if not os.path.isdir(shm_path) or not os.access(shm_path, os.W_OK):
+        return None
+    try:
+        free_bytes = shutil.disk_usage(shm_path).free
+    except OSError:
+        return None
+    if required_bytes is None:
+        if free_bytes < RAM_BACKED_TEMPORARY_DIRECTORY_MIN_FREE_BYTES:
+            return None
+    elif free_bytes < required_bytes * 2:
+        return None
+    return shm_path
+
+
+# The glTF 2.0 add-on only reads and writes files. Writes the file into a
+# RAM-backed file system if possible so that large models don't take a disk
+# round-trip, and yields the path of it. If it runs out of space while
+# writing, retries in the default temporary directory. bpy.ops reports the
+# errors of the operators as RuntimeError, so it is retried as well.
+@contextlib.contextmanager
+def write_temporary_file(
+    file_name: str,
+    write: Callable[[str], None],
+    required_bytes: Optional[int] = None,
+) -> Iterator[str]:
+    parent_path = ram_backed_temporary_directory_parent(required_bytes)
+    if parent_path is not None:
+        with tempfile.TemporaryDirectory(dir=parent_path) as temp_dir:
+            filepath = os.path.join(temp_dir, file_name)
+            try:
+                write(filepath)
+            except (OSError, RuntimeError):
+                logger.warning(
+                    f'Failed to write "{filepath}". Retrying in'
+                    + f' "{tempfile.gettempdir()}"'
+                )
+            else:
+                yield filepath
+                return
+    with tempfile.TemporaryDirectory() as temp_dir:
+        filepath = os.path.join(temp_dir, file_name)
+        write(filepath)
+        yield filepath
@@ -11,17 +11,18 @@ import json
 import math
 import uuid
 from abc import ABC, abstractmethod
-from typing import Dict, List, Optional, Sequence, Set
+from typing import Dict, List, Optional, Sequence, Set, Tuple
 
 import bgl
 import bpy
 from mathutils import Matrix
 
-from ..common import convert, deep, shader
+from ..common import convert, deep, shader, texture_extraction
 from ..common.deep import Json
 from ..common.logging import get_logger
 from ..common.mtoon0_constants import MaterialMtoon0
 from ..common.preferences import get_preferences
+from ..common.profiler import Profiler
 from ..common.shader import shader_node_group_import
 from ..common.version import addon_version
 from ..common.vrm0.human_bone import HumanBoneName, HumanBoneSpecifications
@@ -55,14 +56,20 @@ class AbstractBaseVrmImporter(ABC):
         parse_result: ParseResult,
         extract_textures_into_folder: bool,
         make_new_texture_folder: bool,
+        profiler: Optional[Profiler] = None,
     ) -> None:
         self.context = context
         self.parse_result = parse_result
         self.extract_textures_into_folder = extract_textures_into_folder
         self.make_new_texture_folder = make_new_texture_folder
+        self.profiler = profiler or Profiler()
 
         self.meshes: Dict[int, bpy.types.Object] = {}
         self.images: Dict[int, bpy.types.Image] = {}
+        # 同じ内容の画像のインデックスから、実際に使う画像のインデックスへの対応
+        self.image_index_remap: Dict[int, int] = {}
+        # 画像名から、その色空間を最初に設定した画像のインデックスと色空間への対応
+        self.image_name_to_first_colorspace: Dict[str, Tuple[int, str]] = {}
         self.armature: Optional[bpy.types.Object] = None
         self.bone_names: Dict[int, str] = {}
         self.materials: Dict[int, bpy.types.Material] = {}
@@ -74,6 +81,27 @@ class AbstractBaseVrmImporter(ABC):
     def import_vrm(self) -> None:
         pass
 
+    def get_image(self, image_index: int) -> Optional[bpy.types.Image]:
+        return self.images.get(self.image_index_remap.get(image_index, image_index))
+
+    def get_image_for_colorspace(
+        self, image_index: int, colorspace: str
+    ) -> Optional[bpy.types.Image]:
+        image = self.get_image(image_index)
+        if image is None:
+            return None
+        if texture_extraction.is_image_shared_with_another_colorspace(
+            self.image_name_to_first_colorspace, image.name, image_index, colorspace
+        ):
+            # 同じ内容の画像が異なる色空間で使われている場合は共有しない
+            image = image.copy()
+            self.images[image_index] = image
+            self.image_index_remap.pop(image_index, None)
+        self.image_name_to_first_colorspace.setdefault(
+            image.name, (image_index, colorspace)
+        )
+        return image
+
     @staticmethod
     def axis_glb_to_blender(vec3: Sequence[float]) -> List[float]:
         return [vec3[i] * t for i, t in zip([0, 2, 1], [-1, 1, 1])]
@@ -308,8 +336,10 @@ class AbstractBaseVrmImporter(ABC):
             json_texture = json_textures[json_texture_index]
             if isinstance(json_texture, dict):
                 image_index = json_texture.get("source")
-                if isinstance(image_index, int) and image_index in self.images:
-                    self.images[image_index].use_fake_user = True
+                if isinstance(image_index, int):
+                    image = self.get_image(image_index)
+                    if image:
+                        image.use_fake_user = True
 
     # region material
     @staticmethod
@@ -407,6 +437,7 @@ class AbstractBaseVrmImporter(ABC):
         tex_index: int,
         color_socket_to_connect: Optional[bpy.types.NodeSocketColor] = None,
         alpha_socket_to_connect: Optional[bpy.types.NodeSocketFloat] = None,
+        colorspace: str = "sRGB",
     ) -> Optional[bpy.types.ShaderNodeTexImage]:
         textures = self.parse_result.json_dict.get("textures")
         if not isinstance(textures, list) or not 0 <= tex_index < len(textures):
@@ -429,8 +460,9 @@ class AbstractBaseVrmImporter(ABC):
         if not isinstance(sampler_dict, dict):
             return None
         image_node = material.node_tree.nodes.new("ShaderNodeTexImage")
-        if image_index in self.images:
-            image_node.image = self.images[image_index]
+        image = self.get_image_for_colorspace(image_index, colorspace)
+        if image:
+            image_node.image = image
         if color_socket_to_connect is not None:
             image_node.label = color_socket_to_connect.name
         elif alpha_socket_to_connect is not None:
@@ -622,6 +654,7 @@ class AbstractBaseVrmImporter(ABC):
                     b_mat,
                     tex_index,
                     color_socket_to_connect=sg.inputs[color_socket_name],
+                    colorspace="Non-Color",
                 )
                 if normalmap_node:
                     try:
@@ -1245,10 +1278,12 @@ class AbstractBaseVrmImporter(ABC):
         bpy.ops.object.mode_set(mode="OBJECT")
         bpy.ops.object.select_all(action="DESELECT")
         for obj in self.meshes.values():
-            self.context.view_layer.objects.active = obj
-            obj.select_set(True)
-            bpy.ops.object.shade_smooth()
-            bpy.ops.object.select_all(action="DESELECT")
+            self.set_smooth_shading(obj.data)
+
+    # Same as bpy.ops.object.shade_smooth() without selecting the object
+    @staticmethod
+    def set_smooth_shading(mesh: bpy.types.Mesh) -> None:
+        mesh.polygons.foreach_set("use_smooth", [True] * len(mesh.polygons))
 
     def make_pole_target(
         self, rl: str, upper_leg_name: str, lower_leg_name: str, foot_name: str
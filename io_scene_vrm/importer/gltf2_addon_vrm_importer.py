@@ -6,7 +6,6 @@ import os.path
 import re
 import shutil
 import struct
-import tempfile
 from typing import Dict, List, Optional, Set, Tuple, Union
 
 import bgl
@@ -14,9 +13,11 @@ import bpy
 import mathutils
 from mathutils import Matrix, Vector
 
-from ..common import convert, deep, gltf, shader
+from ..common import convert, deep, gltf, shader, texture_extraction
+from ..common.accessor import read_buffer_view
 from ..common.deep import Json
 from ..common.logging import get_logger
+from ..common.profiler import Profiler
 from ..common.version import addon_version
 from ..common.vrm1 import human_bone as vrm1_human_bone
 from ..common.vrm1.human_bone import HumanBoneName, HumanBoneSpecifications
@@ -42,6 +43,7 @@ from ..editor.vrm1.property_group import (
     Vrm1MetaPropertyGroup,
     Vrm1PropertyGroup,
 )
+from ..external import io_scene_gltf2_support
 from .abstract_base_vrm_importer import AbstractBaseVrmImporter
 from .gltf2_addon_importer_user_extension import Gltf2AddonImporterUserExtension
 from .vrm_parser import ParseResult, remove_unsafe_path_chars
@@ -60,9 +62,14 @@ class Gltf2AddonVrmImporter(AbstractBaseVrmImporter):
         parse_result: ParseResult,
         extract_textures_into_folder: bool,
         make_new_texture_folder: bool,
+        profiler: Optional[Profiler] = None,
     ) -> None:
         super().__init__(
-            context, parse_result, extract_textures_into_folder, make_new_texture_folder
+            context,
+            parse_result,
+            extract_textures_into_folder,
+            make_new_texture_folder,
+            profiler,
         )
         self.import_id = Gltf2AddonImporterUserExtension.update_current_import_id()
         self.temp_object_name_count = 0
@@ -72,34 +79,46 @@ class Gltf2AddonVrmImporter(AbstractBaseVrmImporter):
     def import_vrm(self) -> None:
         wm = self.context.window_manager
         wm.progress_begin(0, 9)
+        profiler = self.profiler
         try:
-            affected_object = self.scene_init()
+            with profiler.phase("scene_init"):
+                affected_object = self.scene_init()
             wm.progress_update(1)
-            self.import_gltf2_with_indices()
+            with profiler.phase("import_gltf2_with_indices"):
+                self.import_gltf2_with_indices()
+            with profiler.phase("merge_duplicate_images"):
+                self.merge_duplicate_images()
             wm.progress_update(2)
-            if self.extract_textures_into_folder:
-                self.extract_textures(repack=False)
-            elif bpy.app.version < (3, 1):
-                self.extract_textures(repack=True)
+            with profiler.phase("extract_textures"):
+                if self.extract_textures_into_folder:
+                    self.extract_textures(repack=False)
+                elif bpy.app.version < (3, 1):
+                    self.extract_textures(repack=True)
 
             wm.progress_update(3)
-            self.use_fake_user_for_thumbnail()
+            with profiler.phase("use_fake_user_for_thumbnail"):
+                self.use_fake_user_for_thumbnail()
             wm.progress_update(4)
-            if self.parse_result.vrm1_extension:
-                self.make_mtoon1_materials()
-            elif self.parse_result.vrm0_extension:
-                self.make_material()
+            with profiler.phase("make_material"):
+                if self.parse_result.vrm1_extension:
+                    self.make_mtoon1_materials()
+                elif self.parse_result.vrm0_extension:
+                    self.make_material()
             wm.progress_update(5)
-            if self.parse_result.vrm1_extension:
-                self.load_vrm1_extensions()
-            elif self.parse_result.vrm0_extension:
-                self.load_vrm0_extensions()
+            with profiler.phase("load_extensions"):
+                if self.parse_result.vrm1_extension:
+                    self.load_vrm1_extensions()
+                elif self.parse_result.vrm0_extension:
+                    self.load_vrm0_extensions()
             wm.progress_update(6)
-            self.cleaning_data()
+            with profiler.phase("cleaning_data"):
+                self.cleaning_data()
             wm.progress_update(7)
-            self.finishing(affected_object)
+            with profiler.phase("finishing"):
+                self.finishing(affected_object)
             wm.progress_update(8)
-            self.viewport_setup()
+            with profiler.phase("viewport_setup"):
+                self.viewport_setup()
         finally:
             try:
                 Gltf2AddonImporterUserExtension.clear_current_import_id()
@@ -114,12 +133,10 @@ class Gltf2AddonVrmImporter(AbstractBaseVrmImporter):
     ) -> None:
         source = texture_dict.get("source")
         if isinstance(source, int):
-            image = self.images.get(source)
+            colorspace = "Non-Color" if linear else "sRGB"
+            image = self.get_image_for_colorspace(source, colorspace)
             if image:
-                if linear:
-                    image.colorspace_settings.name = "Non-Color"
-                else:
-                    image.colorspace_settings.name = "sRGB"
+                image.colorspace_settings.name = colorspace
                 texture.source = image
 
         sampler = texture_dict.get("sampler")
@@ -676,9 +693,31 @@ class Gltf2AddonVrmImporter(AbstractBaseVrmImporter):
             )
         return result
 
+    def copy_json_dict_for_annotation(self) -> Dict[str, Json]:
+        # Reuse the parsed JSON instead of reading the file again.
+        # Only the values that are annotated for the glTF 2.0 add-on are copied
+        # so that parse_result.json_dict keeps the original values.
+        json_dict = dict(self.parse_result.json_dict)
+        for key in [
+            "nodes",
+            "materials",
+            "meshes",
+            "images",
+            "scenes",
+            "extensionsRequired",
+        ]:
+            if key in json_dict:
+                json_dict[key] = deep.copy(json_dict[key])
+        # These arrays are only appended
+        for key in ["buffers", "bufferViews", "accessors", "skins"]:
+            values = json_dict.get(key)
+            if isinstance(values, list):
+                json_dict[key] = list(values)
+        return json_dict
+
     def import_gltf2_with_indices(self) -> None:
-        with open(self.parse_result.filepath, "rb") as f:
-            json_dict, body_binary = gltf.parse_glb(f.read())
+        json_dict = self.copy_json_dict_for_annotation()
+        body_binary = self.parse_result.body_binary
 
         for key in ["nodes", "materials", "meshes"]:
             if key not in json_dict or not isinstance(json_dict[key], list):
@@ -1042,10 +1081,16 @@ class Gltf2AddonVrmImporter(AbstractBaseVrmImporter):
         else:
             bone_heuristic = "BLENDER"
         full_vrm_import_success = False
-        with tempfile.TemporaryDirectory() as temp_dir:
-            indexed_vrm_filepath = os.path.join(temp_dir, "indexed.vrm")
-            with open(indexed_vrm_filepath, "wb") as file:
-                file.write(gltf.pack_glb(json_dict, body_binary))
+        # The JSON chunk is covered by the margin of the free space check
+        required_bytes = len(body_binary)
+
+        def write_indexed_vrm(filepath: str) -> None:
+            with open(filepath, "wb") as file:
+                gltf.write_glb(file, json_dict, [body_binary])
+
+        with io_scene_gltf2_support.write_temporary_file(
+            "indexed.vrm", write_indexed_vrm, required_bytes
+        ) as indexed_vrm_filepath:
             try:
                 bpy.ops.import_scene.gltf(
                     filepath=indexed_vrm_filepath,
@@ -1066,10 +1111,9 @@ class Gltf2AddonVrmImporter(AbstractBaseVrmImporter):
             # https://github.com/saturday06/VRM_Addon_for_Blender/issues/58
             if "animations" in json_dict:
                 del json_dict["animations"]
-            with tempfile.TemporaryDirectory() as temp_dir:
-                indexed_vrm_filepath = os.path.join(temp_dir, "indexed.vrm")
-                with open(indexed_vrm_filepath, "wb") as file:
-                    file.write(gltf.pack_glb(json_dict, body_binary))
+            with io_scene_gltf2_support.write_temporary_file(
+                "indexed.vrm", write_indexed_vrm, required_bytes
+            ) as indexed_vrm_filepath:
                 try:
                     bpy.ops.import_scene.gltf(
                         filepath=indexed_vrm_filepath,
@@ -1329,15 +1373,32 @@ class Gltf2AddonVrmImporter(AbstractBaseVrmImporter):
     def is_temp_object_name(self, name: str) -> bool:
         return name.startswith(f"{self.import_id}Temp_")
 
+    # Merges the images whose embedded payloads are the same into the first one,
+    # so that each of them is extracted and kept in memory only once.
+    def merge_duplicate_images(self) -> None:
+        image_index_remap = texture_extraction.create_image_index_remap(
+            self.parse_result.json_dict, self.parse_result.body_binary
+        )
+        for image_index, first_image_index in image_index_remap.items():
+            image = self.images.get(image_index)
+            first_image = self.images.get(first_image_index)
+            if (
+                image is None
+                or first_image is None
+                or image.colorspace_settings.name
+                != first_image.colorspace_settings.name
+            ):
+                continue
+            if image != first_image:
+                image.user_remap(first_image)
+                bpy.data.images.remove(image)
+            del self.images[image_index]
+            self.image_index_remap[image_index] = first_image_index
+
     def extract_textures(self, repack: bool) -> None:
         dir_path = os.path.abspath(self.parse_result.filepath) + ".textures"
         if self.make_new_texture_folder or repack:
-            for i in range(100001):
-                checking_dir_path = dir_path if i == 0 else f"{dir_path}.{i}"
-                if not os.path.exists(checking_dir_path):
-                    os.mkdir(checking_dir_path)
-                    dir_path = checking_dir_path
-                    break
+            dir_path = texture_extraction.make_new_directory(dir_path)
         elif not os.path.exists(dir_path):
             os.mkdir(dir_path)
 
@@ -1356,6 +1417,11 @@ class Gltf2AddonVrmImporter(AbstractBaseVrmImporter):
                 bpy.ops.wm.save_as_mainfile(filepath=filepath)
                 break
 
+        # 既存のファイル名は一度だけ取得し、GLBのBINからまとめて並列に書き込む
+        file_names = texture_extraction.list_file_names(dir_path)
+        path_and_data_list: List[Tuple[str, memoryview]] = []
+        extracted_images: List[Tuple[bpy.types.Image, str]] = []
+
         for image_index, image in self.images.items():
             image_name = os.path.basename(image.filepath_from_user())
             if image_name:
@@ -1385,36 +1451,62 @@ class Gltf2AddonVrmImporter(AbstractBaseVrmImporter):
             ):
                 image_path += "." + image_type
 
-            written = False
-            retry_limit = 100000
-
-            for retry_count in range(retry_limit):
-                root, ext = os.path.splitext(os.path.basename(image_path))
-                if os.path.exists(image_path):
-                    next_image_name = root + "_" + str(retry_count + 1) + ext
-                    image_path = os.path.join(dir_path, next_image_name)
-                    continue
+            image_file_root, image_file_ext = os.path.splitext(
+                os.path.basename(image_path)
+            )
+            image_file_name = texture_extraction.reserve_unique_file_name(
+                image_file_root, image_file_ext, file_names
+            )
+            if image_file_name is None:
+                logger.error(
+                    f"There are more than {texture_extraction.UNIQUE_NAME_RETRY_LIMIT}"
+                    + " images with the same name in the folder."
+                    + f" Failed to write file: {image_name}"
+                )
+                continue
+            image_path = os.path.join(dir_path, image_file_name)
 
+            image_binary = self.read_image_binary(image_index)
+            if image_binary is None:
                 image.unpack(method="WRITE_ORIGINAL")
                 with contextlib.suppress(shutil.SameFileError):
                     shutil.move(image.filepath_from_user(), image_path)
-                image.filepath = image_path
-                image.reload()
-                if repack:
-                    image.pack()
+            else:
+                path_and_data_list.append((image_path, image_binary))
+            extracted_images.append((image, image_path))
 
-                written = True
-                break
+        texture_extraction.write_files(path_and_data_list)
 
-            if not written:
-                logger.error(
-                    f"There are more than {retry_limit} images with the same name in the folder."
-                    + f" Failed to write file: {image_name}"
-                )
+        for image, image_path in extracted_images:
+            if image.packed_file is not None:
+                # 同じ内容を書き込み済みなので、パックされたデータは書き出さずに破棄する
+                image.unpack(method="REMOVE")
+            image.filepath = image_path
+            image.reload()
+            if repack:
+                image.pack()
 
         if repack:
             shutil.rmtree(dir_path, ignore_errors=True)
 
+    # Returns the payload of the image embedded in the GLB BIN chunk
+    def read_image_binary(self, image_index: int) -> Optional[memoryview]:
+        image_dict = deep.get(self.parse_result.json_dict, ["images", image_index])
+        if not isinstance(image_dict, dict):
+            return None
+        buffer_view_index = image_dict.get("bufferView")
+        if not isinstance(buffer_view_index, int):
+            return None
+        try:
+            return read_buffer_view(
+                self.parse_result.json_dict,
+                self.parse_result.body_binary,
+                buffer_view_index,
+            )
+        except ValueError:
+            logger.exception(f"Failed to read images[{image_index}]")
+            return None
+
     def setup_vrm1_humanoid_bones(self) -> None:
         armature = self.armature
         if not armature:
@@ -1889,7 +1981,7 @@ class Gltf2AddonVrmImporter(AbstractBaseVrmImporter):
 
         thumbnail_image_index = meta_dict.get("thumbnailImage")
         if isinstance(thumbnail_image_index, int):
-            thumbnail_image = self.images.get(thumbnail_image_index)
+            thumbnail_image = self.get_image(thumbnail_image_index)
             if thumbnail_image:
                 meta.thumbnail_image = thumbnail_image
 
@@ -6,9 +6,14 @@ import bpy
 from bpy.app.translations import pgettext
 from bpy_extras.io_utils import ImportHelper
 
-from ..common import version
+from ..common import gltf, version
 from ..common.logging import get_logger
-from ..common.preferences import get_preferences, use_legacy_importer_exporter
+from ..common.preferences import (
+    create_profiler,
+    get_preferences,
+    use_legacy_importer_exporter,
+)
+from ..common.profiler import Profiler
 from ..editor.ops import VRM_OT_open_url_in_web_browser
 from .gltf2_addon_vrm_importer import Gltf2AddonVrmImporter, RetryUsingLegacyVrmImporter
 from .legacy_vrm_importer import LegacyVrmImporter
@@ -277,51 +282,79 @@ def create_blend_model(
     context: bpy.types.Context,
     license_validation: bool,
 ) -> Set[str]:
-    legacy_importer = use_legacy_importer_exporter()
     has_ui_localization = bpy.app.version < (2, 83)
     ui_localization = False
     if has_ui_localization:
         ui_localization = context.preferences.view.use_international_fonts
+    profiler = create_profiler(context)
     try:
-        if not legacy_importer:
-            with contextlib.suppress(RetryUsingLegacyVrmImporter):
+        # The file is mapped until the import finishes, and then it's closed so
+        # that the file isn't kept locked
+        with gltf.read_glb_file(addon.filepath) as glb_data:
+            import_glb(addon, context, license_validation, glb_data, profiler)
+    finally:
+        if has_ui_localization and ui_localization:
+            context.preferences.view.use_international_fonts = ui_localization
+        profiler.report("import", addon.filepath)
+
+    return {"FINISHED"}
+
+
+def import_glb(
+    addon: Union[IMPORT_SCENE_OT_vrm, WM_OT_license_confirmation],
+    context: bpy.types.Context,
+    license_validation: bool,
+    glb_data: Union[bytes, memoryview],
+    profiler: Profiler,
+) -> None:
+    legacy_importer = use_legacy_importer_exporter()
+    # Parse the file only once for the whole import pipeline
+    with profiler.phase("parse_glb"):
+        parsed_glb = gltf.parse_glb(glb_data)
+    if not legacy_importer:
+        with contextlib.suppress(RetryUsingLegacyVrmImporter):
+            with profiler.phase("parse"):
                 parse_result = VrmParser(
                     addon.filepath,
                     addon.extract_textures_into_folder,
                     addon.make_new_texture_folder,
                     license_validation=license_validation,
                     legacy_importer=False,
+                    parsed_glb=parsed_glb,
+                    profiler=profiler,
                 ).parse()
 
-                if parse_result.vrm1_extension:
-                    bpy.ops.wm.vrm_vrm1_incomplete_support_warning("INVOKE_DEFAULT")
+            if parse_result.vrm1_extension:
+                bpy.ops.wm.vrm_vrm1_incomplete_support_warning("INVOKE_DEFAULT")
 
+            with profiler.phase("import_vrm"):
                 Gltf2AddonVrmImporter(
                     context,
                     parse_result,
                     addon.extract_textures_into_folder,
                     addon.make_new_texture_folder,
+                    profiler=profiler,
                 ).import_vrm()
-                return {"FINISHED"}
+            return
 
+    with profiler.phase("legacy_parse"):
         parse_result = VrmParser(
             addon.filepath,
             addon.extract_textures_into_folder,
             addon.make_new_texture_folder,
             license_validation=license_validation,
             legacy_importer=True,
+            parsed_glb=parsed_glb,
+            profiler=profiler,
         ).parse()
+    with profiler.phase("legacy_import_vrm"):
         LegacyVrmImporter(
             context,
             parse_result,
             addon.extract_textures_into_folder,
             addon.make_new_texture_folder,
+            profiler=profiler,
         ).import_vrm()
-    finally:
-        if has_ui_localization and ui_localization:
-            context.preferences.view.use_international_fonts = ui_localization
-
-    return {"FINISHED"}
 
 
 def menu_import(
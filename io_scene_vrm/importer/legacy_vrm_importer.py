@@ -1,11 +1,13 @@
+import array
 import itertools
-import sys
+import operator
 from math import radians, sqrt
-from typing import Callable, Dict, List, Sequence, Set, Tuple
+from typing import Dict, List, Sequence, Set, Tuple
 
 import bpy
 from mathutils import Matrix, Vector
 
+from ..common import vertex_buffer
 from ..common.vrm0 import human_bone
 from .abstract_base_vrm_importer import AbstractBaseVrmImporter
 from .vrm_parser import PyMesh
@@ -20,38 +22,55 @@ class LegacyVrmImporter(AbstractBaseVrmImporter):
             return z + 1
 
         wm.progress_begin(0, 11)
+        profiler = self.profiler
         try:
             i = 1
-            affected_object = self.scene_init()
+            with profiler.phase("scene_init"):
+                affected_object = self.scene_init()
             i = prog(i)
-            self.texture_load()
+            with profiler.phase("texture_load"):
+                self.texture_load()
             i = prog(i)
-            self.make_armature()
+            with profiler.phase("make_armature"):
+                self.make_armature()
             i = prog(i)
-            self.use_fake_user_for_thumbnail()
+            with profiler.phase("use_fake_user_for_thumbnail"):
+                self.use_fake_user_for_thumbnail()
             i = prog(i)
-            self.make_material()
+            with profiler.phase("make_material"):
+                self.make_material()
             i = prog(i)
-            self.make_primitive_mesh_objects(wm, i)
+            with profiler.phase("make_primitive_mesh_objects"):
+                self.make_primitive_mesh_objects(wm, i)
             # i=prog(i) ↑関数内でやる
-            self.load_vrm0_extensions()
+            with profiler.phase("load_vrm0_extensions"):
+                self.load_vrm0_extensions()
             i = prog(i)
-            self.cleaning_data()
+            with profiler.phase("cleaning_data"):
+                self.cleaning_data()
             i = prog(i)
-            self.set_bone_roll()
+            with profiler.phase("set_bone_roll"):
+                self.set_bone_roll()
             i = prog(i)
-            self.finishing(affected_object)
+            with profiler.phase("finishing"):
+                self.finishing(affected_object)
             i = prog(i)
-            self.viewport_setup()
+            with profiler.phase("viewport_setup"):
+                self.viewport_setup()
         finally:
             wm.progress_end()
 
     def texture_load(self) -> None:
+        # 同じ内容の画像は同じファイルに展開されているので、一つの画像として読み込む
+        filepath_to_image: Dict[str, bpy.types.Image] = {}
         for (image_index, image_props) in enumerate(self.parse_result.image_properties):
-            img = bpy.data.images.load(image_props.filepath)
-            if not self.extract_textures_into_folder:
-                # https://github.com/KhronosGroup/glTF-Blender-IO/blob/blender-v2.82-release/addons/io_scene_gltf2/blender/imp/gltf2_blender_image.py#L100
-                img.pack()
+            img = filepath_to_image.get(image_props.filepath)
+            if img is None:
+                img = bpy.data.images.load(image_props.filepath)
+                if not self.extract_textures_into_folder:
+                    # https://github.com/KhronosGroup/glTF-Blender-IO/blob/blender-v2.82-release/addons/io_scene_gltf2/blender/imp/gltf2_blender_image.py#L100
+                    img.pack()
+                filepath_to_image[image_props.filepath] = img
             self.images[image_index] = img
 
     def make_armature(self) -> None:
@@ -205,356 +224,327 @@ class LegacyVrmImporter(AbstractBaseVrmImporter):
             pymesh[0].object_id: [] for pymesh in self.parse_result.meshes
         }
         morph_cache_dict: Dict[
-            Tuple[int, int], List[List[float]]
+            Tuple[int, int], "array.array[float]"
         ] = {}  # key:tuple(POSITION,targets.POSITION),value:points_data
         # mesh_obj_build
         mesh_progress = 0.0
         mesh_progress_unit = 1 / max(1, len(self.parse_result.meshes))
         for pymesh in self.parse_result.meshes:
-            b_mesh = bpy.data.meshes.new(pymesh[0].name)
-
-            # FB_ngon_encoding実装
-            # 前のポリゴンの最初の頂点が今回の最初の頂点と同じ場合、そのポリゴンを一つのポリゴン(ngon)としてインデックスを再構築する
-            face_indices = []
-            primitive_length_list = []
-            for prim in pymesh:
-                face_count = len(prim.face_indices)
-                face_indices.append(prim.face_indices[0])
-                face_offset = len(face_indices)
-                for i in range(1, face_count):
+            with self.profiler.phase(f"mesh:{pymesh[0].name}"):
+                b_mesh = bpy.data.meshes.new(pymesh[0].name)
+
+                # FB_ngon_encoding実装
+                # 前のポリゴンの最初の頂点が今回の最初の頂点と同じ場合、そのポリゴンを一つのポリゴン(ngon)としてインデックスを再構築する
+                primitive_polygons_list = [
+                    vertex_buffer.create_polygons(
+                        array.array(
+                            "i", itertools.chain.from_iterable(prim.face_indices)
+                        ),
+                        prim.has_FB_ngon_encoding,
+                    )
+                    for prim in pymesh
+                ]
+                polygons = vertex_buffer.join_polygons(primitive_polygons_list)
+                if pymesh[0].POSITION is None:
+                    continue
+                self.create_mesh_geometry(
+                    b_mesh,
+                    vertex_buffer.glb_to_blender_vec3(
+                        array.array(
+                            "f", itertools.chain.from_iterable(pymesh[0].POSITION)
+                        )
+                    ),
+                    polygons,
+                )
+                obj = bpy.data.objects.new(pymesh[0].name, b_mesh)
+                obj.parent = self.armature
+                self.meshes[pymesh[0].object_id] = obj
+                # region obj setting
+                # origin 0:Vtype_Node 1:mesh 2:skin
+                origin = None
+                for key_is_node_id, node in self.parse_result.origin_nodes_dict.items():
+                    if node[1] != pymesh[0].object_id:
+                        continue
+                    # origin boneの場所に移動
+                    obj.location = self.axis_glb_to_blender(node[0].position)
+                    if len(node) == 3:
+                        origin = node
+                        continue
+                    # len=2 ≒ skinがない場合
+                    parent_node_id = None
+                    for node_id, py_node in self.parse_result.nodes_dict.items():
+                        if py_node.children is None:
+                            continue
+                        if key_is_node_id in py_node.children:
+                            parent_node_id = node_id
+                    obj.parent_type = "BONE"
+                    if parent_node_id is not None:
+                        obj.parent_bone = armature.data.bones[
+                            self.parse_result.nodes_dict[parent_node_id].name
+                        ].name
                     if (
-                        face_indices[-1][0] == prim.face_indices[i][0]
-                        and prim.has_FB_ngon_encoding
+                        obj.parent_bone is None
+                        or obj.parent_bone not in armature.data.bones
                     ):
-                        face_indices[-1].append(prim.face_indices[i][2])
-                    else:
-                        face_indices.append(prim.face_indices[i])
-                primitive_length_list.append(
-                    [
-                        prim.material_index,
-                        len(face_indices) - face_offset,
-                    ]
-                )
-            # face_index = [tri for prim in pymesh for tri in prim.face_indices]
-            if pymesh[0].POSITION is None:
-                continue
-            pos = list(map(self.axis_glb_to_blender, pymesh[0].POSITION))
-            b_mesh.from_pydata(pos, [], face_indices)
-            b_mesh.update()
-            obj = bpy.data.objects.new(pymesh[0].name, b_mesh)
-            obj.parent = self.armature
-            self.meshes[pymesh[0].object_id] = obj
-            # region obj setting
-            # origin 0:Vtype_Node 1:mesh 2:skin
-            origin = None
-            for key_is_node_id, node in self.parse_result.origin_nodes_dict.items():
-                if node[1] != pymesh[0].object_id:
-                    continue
-                # origin boneの場所に移動
-                obj.location = self.axis_glb_to_blender(node[0].position)
-                if len(node) == 3:
-                    origin = node
-                    continue
-                # len=2 ≒ skinがない場合
-                parent_node_id = None
-                for node_id, py_node in self.parse_result.nodes_dict.items():
-                    if py_node.children is None:
                         continue
-                    if key_is_node_id in py_node.children:
-                        parent_node_id = node_id
-                obj.parent_type = "BONE"
-                if parent_node_id is not None:
-                    obj.parent_bone = armature.data.bones[
-                        self.parse_result.nodes_dict[parent_node_id].name
-                    ].name
-                if (
-                    obj.parent_bone is None
-                    or obj.parent_bone not in armature.data.bones
-                ):
-                    continue
-                # boneのtail側にparentされるので、根元からmesh nodeのpositionに動かしなおす
-                obj.matrix_world = Matrix.Translation(
-                    [
-                        armature.matrix_world.to_translation()[i]
-                        + armature.data.bones[
-                            obj.parent_bone
-                        ].matrix_local.to_translation()[i]
-                        + self.axis_glb_to_blender(node[0].position)[i]
-                        for i in range(3)
-                    ]
-                )
-            scene = self.context.scene
-            scene.collection.objects.link(obj)
-            # endregion obj setting
-
-            # region  vertex groupの作成
-            if origin is not None:
-                skin_index = list(origin)[2]
-                if not isinstance(skin_index, int):
-                    raise ValueError
-
-                # TODO bone名の不具合などでリネームが発生してるとうまくいかない
-                nodes_index_list = self.parse_result.skins_joints_list[skin_index]
-                # TODO bone名の不具合などでリネームが発生してるとうまくいかない
-                # VertexGroupに頂点属性から一個ずつウェイトを入れる用の辞書作り
-                for prim in pymesh:
-                    if prim.JOINTS_0 is not None and prim.WEIGHTS_0 is not None:
-                        # 使うkey(bone名)のvalueを空のリストで初期化(中身まで全部内包表記で?キモすぎるからしない。
-                        vg_dict: Dict[str, List[Tuple[int, float]]] = {
-                            self.parse_result.nodes_dict[
+                    # boneのtail側にparentされるので、根元からmesh nodeのpositionに動かしなおす
+                    obj.matrix_world = Matrix.Translation(
+                        [
+                            armature.matrix_world.to_translation()[i]
+                            + armature.data.bones[
+                                obj.parent_bone
+                            ].matrix_local.to_translation()[i]
+                            + self.axis_glb_to_blender(node[0].position)[i]
+                            for i in range(3)
+                        ]
+                    )
+                scene = self.context.scene
+                scene.collection.objects.link(obj)
+                # endregion obj setting
+
+                # region  vertex groupの作成
+                if origin is not None:
+                    skin_index = list(origin)[2]
+                    if not isinstance(skin_index, int):
+                        raise ValueError
+
+                    # TODO bone名の不具合などでリネームが発生してるとうまくいかない
+                    nodes_index_list = self.parse_result.skins_joints_list[skin_index]
+                    for prim in pymesh:
+                        if prim.JOINTS_0 is None or prim.WEIGHTS_0 is None:
+                            continue
+                        # VroidがJoints:[18,18,0,0]とかで格納してるので、同じjointのウェイトは合算する
+                        joint_weight_groups = vertex_buffer.group_joint_weights(
+                            prim.JOINTS_0, prim.WEIGHTS_0
+                        )
+                        joint_names = {
+                            joint_id: self.parse_result.nodes_dict[
                                 nodes_index_list[joint_id]
-                            ].name: []
-                            for joint_id in [
-                                joint_id
-                                for joint_ids in prim.JOINTS_0
-                                for joint_id in joint_ids
-                            ]
+                            ].name
+                            for joint_id in joint_weight_groups
                         }
-                        for v_index, (joint_ids, weights) in enumerate(
-                            zip(prim.JOINTS_0, prim.WEIGHTS_0)
-                        ):
-                            # region VroidがJoints:[18,18,0,0]とかで格納してるからその処理を
-                            normalized_joint_ids = list(dict.fromkeys(joint_ids))
-
-                            # for deterministic export
-                            def sort_by_vg_dict_key(
-                                sort_data: Tuple[
-                                    int,
-                                    List[int],
-                                    List[int],
-                                    Dict[str, List[Tuple[int, float]]],
-                                ]
-                            ) -> int:
-                                (
-                                    sort_joint_id,
-                                    sort_joint_ids,
-                                    sort_nodes_index_list,
-                                    sort_vg_dict,
-                                ) = sort_data
-                                name = self.parse_result.nodes_dict[
-                                    sort_nodes_index_list[sort_joint_id]
-                                ].name
-                                keys = list(sort_vg_dict.keys())
-                                if name in keys:
-                                    return keys.index(name)
-                                return len(keys) + sort_joint_ids.index(sort_joint_id)
-
-                            get_first_element: Callable[
-                                [Tuple[int, object, object, object]], int
-                            ] = lambda input: input[0]
-                            sorted_joint_ids = map(
-                                get_first_element,
-                                sorted(
-                                    zip(
-                                        normalized_joint_ids,
-                                        itertools.repeat(joint_ids),
-                                        itertools.repeat(nodes_index_list),
-                                        itertools.repeat(vg_dict),
-                                    ),
-                                    key=sort_by_vg_dict_key,
+                        # for deterministic export
+                        # VertexGroupはjointが最初に現れた順に作成する
+                        vg_dict = {
+                            vg_key: obj.vertex_groups.new(name=vg_key)
+                            for vg_key in dict.fromkeys(joint_names.values())
+                            if vg_key not in obj.vertex_groups
+                        }
+                        for joint_id, weight_groups in joint_weight_groups.items():
+                            vg = vg_dict.get(joint_names[joint_id])
+                            if vg is None:
+                                continue
+                            # 同じウェイトの頂点はまとめて追加する
+                            for weight, vertex_indices in weight_groups.items():
+                                vg.add(vertex_indices, weight, "REPLACE")
+                    obj.modifiers.new("amt", "ARMATURE").object = self.armature
+                # endregion  vertex groupの作成
+
+                # region uv
+                # 全primitiveで頂点属性は共有されるので、後のprimitiveの値で上書きする
+                for channel_name, vrm_texcoord in self.primitive_attributes(
+                    pymesh, "TEXCOORD_"
+                ).items():
+                    uv_layer = b_mesh.uv_layers.get(channel_name)
+                    if uv_layer is None:
+                        uv_layer = b_mesh.uv_layers.new(name=channel_name)
+                    # to blender axis (上下反転)
+                    uv_layer.data.foreach_set(
+                        "uv",
+                        vertex_buffer.glb_to_blender_uv(
+                            vertex_buffer.gather_rows(
+                                array.array(
+                                    "f", itertools.chain.from_iterable(vrm_texcoord)
                                 ),
+                                2,
+                                polygons.loop_vertex_indices,
                             )
-
-                            normalized_joint_dict: Dict[int, float] = {
-                                joint_id: 0 for joint_id in sorted_joint_ids
-                            }
-
-                            for i, k in enumerate(joint_ids):
-                                normalized_joint_dict[k] += weights[i]
-                            # endregion VroidがJoints:[18,18,0,0]とかで格納してるからその処理を
-                            for joint_id, weight in normalized_joint_dict.items():
-                                node_id = nodes_index_list[joint_id]
-                                # TODO bone名の不具合などでリネームが発生してるとうまくいかない
-                                vg_dict[
-                                    self.parse_result.nodes_dict[node_id].name
-                                ].append((v_index, weight))
-                        vg_list = []  # VertexGroupのリスト
-                        for vg_key in vg_dict.keys():
-                            if vg_key not in obj.vertex_groups:
-                                vg_list.append(obj.vertex_groups.new(name=vg_key))
-                        # 頂点リストに辞書から書き込む
-                        for vg in vg_list:
-                            joint_id_and_weights = vg_dict[vg.name]
-                            for (joint_id, weight) in joint_id_and_weights:
-                                if weight != 0.0:
-                                    # 頂点はまとめてリストで追加できるようにしかなってない
-                                    vg.add([joint_id], weight, "REPLACE")
-                obj.modifiers.new("amt", "ARMATURE").object = self.armature
-            # endregion  vertex groupの作成
-
-            # region uv
-            flatten_vrm_mesh_vert_index = [v for verts in face_indices for v in verts]
-
-            for prim in pymesh:
-                texcoord_num = 0
-                uv_flag = True
-                while uv_flag:
-                    channel_name = "TEXCOORD_" + str(texcoord_num)
-                    if hasattr(prim, channel_name):
-                        if channel_name not in b_mesh.uv_layers:
-                            b_mesh.uv_layers.new(name=channel_name)
-                        blender_uv_data = b_mesh.uv_layers[channel_name].data
-                        vrm_texcoord = getattr(prim, channel_name)
-                        for node_id, v_index in enumerate(flatten_vrm_mesh_vert_index):
-                            blender_uv_data[node_id].uv = vrm_texcoord[v_index]
-                            # to blender axis (上下反転)
-                            blender_uv_data[node_id].uv[1] = (
-                                blender_uv_data[node_id].uv[1] * -1 + 1
-                            )
-                        texcoord_num += 1
-                    else:
-                        uv_flag = False
-                        break
-            # endregion uv
-
-            # region Normal #TODO
-            bpy.ops.object.mode_set(mode="OBJECT")
-            bpy.ops.object.select_all(action="DESELECT")
-            self.context.view_layer.objects.active = obj
-            obj.select_set(True)
-            bpy.ops.object.shade_smooth()  # this is need
-            b_mesh.create_normals_split()
-            # bpy.ops.mesh.customdata_custom_splitnormals_add()
-            for prim in pymesh:
-                if prim.NORMAL is None:
-                    continue
-                normalized_normal = prim.NORMAL
-                if (
-                    prim.vert_normal_normalized is None
-                    or not prim.vert_normal_normalized
-                ):
-                    normalized_normal = [
-                        Vector(n)
-                        if abs(Vector(n).magnitude - 1.0) < sys.float_info.epsilon
-                        else Vector(n).normalized()
-                        for n in prim.NORMAL
-                    ]
-                    prim.vert_normal_normalized = True
-                    prim.NORMAL = normalized_normal
-                b_mesh.normals_split_custom_set_from_vertices(
-                    list(map(self.axis_glb_to_blender, normalized_normal))
+                        ),
+                    )
+                # endregion uv
+
+                # region Normal
+                # bpy.ops.object.shade_smooth()を使わずにスムーズシェードにする
+                self.set_smooth_shading(b_mesh)
+                b_mesh.create_normals_split()
+                # 全primitiveで頂点属性は共有されるので、最後のprimitiveの法線を使う
+                vrm_normal = next(
+                    (
+                        prim.NORMAL
+                        for prim in reversed(pymesh)
+                        if prim.NORMAL is not None
+                    ),
+                    None,
                 )
-            b_mesh.use_auto_smooth = True
-            # endregion Normal
-
-            # region material適用
-            face_length = 0
-            for i, prim in enumerate(pymesh):
-                if (
-                    prim.material_index is None
-                    or prim.material_index not in self.materials
-                ):
-                    continue
-                if self.materials[prim.material_index].name not in obj.data.materials:
-                    obj.data.materials.append(self.materials[prim.material_index])
-                mat_index = 0
-                for j, mat in enumerate(obj.material_slots):
-                    if mat.material.name == self.materials[prim.material_index].name:
-                        mat_index = j
-
-                for n in range(primitive_length_list[i][1]):
-                    b_mesh.polygons[face_length + n].material_index = mat_index
-                face_length += primitive_length_list[i][1] + 1
-            # endregion material適用
-
-            # region vertex_color
-            # なぜかこれだけ面基準で、loose verts and edgesに色は塗れない
-            # また、2.79では頂点カラーにalpha(4要素目)がないから完全対応は無理だったが
-            # 2.80では4要素になった模様
-            # TODO: テスト (懸案:cleaningで頂点結合でデータ物故割れる説)
-            flat_non_reducted_vert_index = [
-                ind
-                for prim in pymesh
-                for ind in itertools.chain.from_iterable(prim.face_indices)
-            ]
-            for prim in pymesh:
-                vcolor_count = 0
-                vc_flag = True
-                while vc_flag:
-                    vc_color_name = f"COLOR_{vcolor_count}"
-                    if hasattr(prim, vc_color_name):
-                        vc = b_mesh.vertex_colors.get(vc_color_name)
-                        if vc is None:
-                            vc = b_mesh.vertex_colors.new(name=vc_color_name)
-                        for v_index, _ in enumerate(vc.data):
-                            vc.data[v_index].color = getattr(prim, vc_color_name)[
-                                flat_non_reducted_vert_index[v_index]
-                            ]
-                        vcolor_count += 1
-                    else:
-                        vc_flag = False
-                        break
-            # endregion vertex_color
-
-            # region shape_key
-            # shapekey_data_factory with cache
-            def absolutize_morph_positions(
-                base_points: List[List[float]],
-                morph_target_pos_and_index: List[object],
-                prim: PyMesh,
-            ) -> List[List[float]]:
-                shape_key_positions = []
-                morph_target_pos = morph_target_pos_and_index[0]
-                morph_target_index = morph_target_pos_and_index[1]
-
-                if prim.POSITION_accessor is None:
-                    return []
-
-                # すでに変換したことがあるならそれを使う
-                if (
-                    prim.POSITION_accessor,
-                    morph_target_index,
-                ) in morph_cache_dict:
-                    return morph_cache_dict[
-                        (prim.POSITION_accessor, morph_target_index)  # type: ignore[index]
-                    ]
+                if vrm_normal is not None:
+                    normals = vertex_buffer.glb_to_blender_vec3(
+                        vertex_buffer.normalize_vec3(
+                            array.array("f", itertools.chain.from_iterable(vrm_normal))
+                        )
+                    )
+                    b_mesh.normals_split_custom_set_from_vertices(
+                        list(zip(normals[0::3], normals[1::3], normals[2::3]))
+                    )
+                b_mesh.use_auto_smooth = True
+                # endregion Normal
 
-                for base_pos, morph_pos in zip(base_points, morph_target_pos):  # type: ignore[call-overload]
-                    shape_key_positions.append(
-                        self.axis_glb_to_blender(
-                            [base_pos[i] + morph_pos[i] for i in range(3)]  # noqa: B023
+                # region material適用
+                polygon_material_indices: "array.array[int]" = array.array("i")
+                for prim, primitive_polygons in zip(pymesh, primitive_polygons_list):
+                    mat_index = 0
+                    if (
+                        prim.material_index is not None
+                        and prim.material_index in self.materials
+                    ):
+                        material = self.materials[prim.material_index]
+                        if material.name not in obj.data.materials:
+                            obj.data.materials.append(material)
+                        for j, mat in enumerate(obj.material_slots):
+                            if mat.material.name == material.name:
+                                mat_index = j
+                    polygon_material_indices.extend(
+                        itertools.repeat(mat_index, len(primitive_polygons))
+                    )
+                b_mesh.polygons.foreach_set("material_index", polygon_material_indices)
+                # endregion material適用
+
+                # region vertex_color
+                # なぜかこれだけ面基準で、loose verts and edgesに色は塗れない
+                # また、2.79では頂点カラーにalpha(4要素目)がないから完全対応は無理だったが
+                # 2.80では4要素になった模様
+                for vc_color_name, vrm_color in self.primitive_attributes(
+                    pymesh, "COLOR_"
+                ).items():
+                    vc = b_mesh.vertex_colors.get(vc_color_name)
+                    if vc is None:
+                        vc = b_mesh.vertex_colors.new(name=vc_color_name)
+                    component_count = len(vrm_color[0]) if vrm_color else 4
+                    vc.data.foreach_set(
+                        "color",
+                        vertex_buffer.gather_rows(
+                            vertex_buffer.to_rgba(
+                                array.array(
+                                    "f", itertools.chain.from_iterable(vrm_color)
+                                ),
+                                component_count,
+                            ),
+                            4,
+                            polygons.loop_vertex_indices,
+                        ),
+                    )
+                # endregion vertex_color
+
+                # region shape_key
+                # shapekey_data_factory with cache
+                def absolutize_morph_positions(
+                    base_points: List[List[float]],
+                    morph_target_pos_and_index: List[object],
+                    prim: PyMesh,
+                ) -> "array.array[float]":
+                    morph_target_pos = morph_target_pos_and_index[0]
+                    morph_target_index = morph_target_pos_and_index[1]
+
+                    if (
+                        prim.POSITION_accessor is None
+                        or not isinstance(morph_target_pos, list)
+                        or not isinstance(morph_target_index, int)
+                    ):
+                        return array.array("f")
+
+                    # すでに変換したことがあるならそれを使う
+                    cache_key = (prim.POSITION_accessor, morph_target_index)
+                    shape_key_positions = morph_cache_dict.get(cache_key)
+                    if shape_key_positions is not None:
+                        return shape_key_positions
+
+                    shape_key_positions = vertex_buffer.glb_to_blender_vec3(
+                        array.array(
+                            "f",
+                            map(
+                                operator.add,
+                                itertools.chain.from_iterable(base_points),
+                                itertools.chain.from_iterable(morph_target_pos),
+                            ),
                         )
                     )
-                morph_cache_dict[
-                    (prim.POSITION_accessor, morph_target_index)  # type: ignore[index]
-                ] = shape_key_positions
-                return shape_key_positions
-
-            # shapeKeys
-            for prim in pymesh:
-                if (
-                    prim.morph_target_point_list_and_accessor_index_dict is None
-                    or b_mesh is None
-                ):
-                    continue
-                if b_mesh.shape_keys is None:
-                    obj.shape_key_add(name="Basis")
-                for (
-                    morph_name,
-                    morph_pos_and_index,
-                ) in prim.morph_target_point_list_and_accessor_index_dict.items():
+                    morph_cache_dict[cache_key] = shape_key_positions
+                    return shape_key_positions
+
+                # shapeKeys
+                for prim in pymesh:
                     if (
-                        b_mesh.shape_keys is None
-                        or morph_name not in b_mesh.shape_keys.key_blocks
+                        prim.morph_target_point_list_and_accessor_index_dict is None
+                        or b_mesh is None
                     ):
-                        obj.shape_key_add(name=morph_name)
-                    if b_mesh.shape_keys is None:
                         continue
-                    keyblock = b_mesh.shape_keys.key_blocks[morph_name]
-                    if prim.POSITION is not None:
+                    if b_mesh.shape_keys is None:
+                        obj.shape_key_add(name="Basis")
+                    for (
+                        morph_name,
+                        morph_pos_and_index,
+                    ) in prim.morph_target_point_list_and_accessor_index_dict.items():
+                        if (
+                            b_mesh.shape_keys is None
+                            or morph_name not in b_mesh.shape_keys.key_blocks
+                        ):
+                            obj.shape_key_add(name=morph_name)
+                        if b_mesh.shape_keys is None or prim.POSITION is None:
+                            continue
+                        keyblock = b_mesh.shape_keys.key_blocks[morph_name]
                         shape_data = absolutize_morph_positions(
                             prim.POSITION, morph_pos_and_index, prim
                         )
-                    else:
-                        shape_data = []
-                    for i, co in enumerate(shape_data):
-                        keyblock.data[i].co = co
-            # endregion shape_key
-            # progress update
-            mesh_progress += mesh_progress_unit
-            wm.progress_update(progress + mesh_progress)
+                        keyblock_positions: "array.array[float]" = (
+                            vertex_buffer.create_array("f", len(keyblock.data) * 3)
+                        )
+                        if len(shape_data) != len(keyblock_positions):
+                            # 頂点数が一致しない場合は、一致する部分だけ書き込む
+                            keyblock.data.foreach_get("co", keyblock_positions)
+                            shape_data_length = min(
+                                len(shape_data), len(keyblock_positions)
+                            )
+                            keyblock_positions[slice(shape_data_length)] = shape_data[
+                                slice(shape_data_length)
+                            ]
+                            shape_data = keyblock_positions
+                        keyblock.data.foreach_set("co", shape_data)
+                # endregion shape_key
+                # progress update
+                mesh_progress += mesh_progress_unit
+                wm.progress_update(progress + mesh_progress)
         wm.progress_update(progress + 1)
 
+    # from_pydata()や要素ごとの代入の代わりに、foreach_set()でまとめて書き込む
+    @staticmethod
+    def create_mesh_geometry(
+        b_mesh: bpy.types.Mesh,
+        positions: "array.array[float]",
+        polygons: vertex_buffer.Polygons,
+    ) -> None:
+        b_mesh.vertices.add(len(positions) // 3)
+        b_mesh.vertices.foreach_set("co", positions)
+        b_mesh.loops.add(len(polygons.loop_vertex_indices))
+        b_mesh.loops.foreach_set("vertex_index", polygons.loop_vertex_indices)
+        b_mesh.polygons.add(len(polygons))
+        b_mesh.polygons.foreach_set("loop_start", polygons.loop_starts())
+        b_mesh.polygons.foreach_set("loop_total", polygons.loop_totals)
+        b_mesh.update(calc_edges=True)
+
+    # Returns the numbered attributes such as TEXCOORD_0, TEXCOORD_1, ...
+    # The attributes of the later primitives take precedence.
+    @staticmethod
+    def primitive_attributes(
+        pymesh: List[PyMesh], prefix: str
+    ) -> Dict[str, List[List[float]]]:
+        attributes: Dict[str, List[List[float]]] = {}
+        for prim in pymesh:
+            for attribute_index in itertools.count():
+                attribute_name = f"{prefix}{attribute_index}"
+                if not hasattr(prim, attribute_name):
+                    break
+                attributes[attribute_name] = getattr(prim, attribute_name)
+        return attributes
+
     def set_bone_roll(self) -> None:
         armature = self.armature
         if armature is None:
@@ -1,8 +1,8 @@
 from typing import Dict, List, Tuple
 
 from ..common import deep, gltf
-from ..common.deep import Json, make_json
-from .vrm_parser import decode_bin
+from ..common.accessor_diff import DEFAULT_MAX_REPORTED_INDICES, diff_accessors
+from ..common.deep import Json
 
 
 def human_bone_sort_key(human_bone_dict: Json) -> int:
@@ -14,11 +14,7 @@ def human_bone_sort_key(human_bone_dict: Json) -> int:
     return node
 
 
-def create_vrm_json_dict(data: bytes) -> Dict[str, Json]:
-    vrm_json, binary_chunk = gltf.parse_glb(data)
-
-    vrm_json["~accessors_decoded"] = make_json(decode_bin(vrm_json, binary_chunk))
-
+def create_vrm_json_dict(vrm_json: Dict[str, Json]) -> Dict[str, Json]:
     extensions_dict = vrm_json.get("extensions")
     if not isinstance(extensions_dict, dict):
         return vrm_json
@@ -136,7 +132,29 @@ def create_vrm_json_dict(data: bytes) -> Dict[str, Json]:
     return vrm_json
 
 
-def vrm_diff(before: bytes, after: bytes, float_tolerance: float) -> List[str]:
-    return deep.diff(
-        create_vrm_json_dict(before), create_vrm_json_dict(after), float_tolerance
+def vrm_diff(
+    before: bytes,
+    after: bytes,
+    float_tolerance: float,
+    max_reported_indices: int = DEFAULT_MAX_REPORTED_INDICES,
+) -> List[str]:
+    before_json, before_binary = gltf.parse_glb(before)
+    after_json, after_binary = gltf.parse_glb(after)
+    diffs = deep.diff(
+        create_vrm_json_dict(before_json),
+        create_vrm_json_dict(after_json),
+        float_tolerance,
+    )
+    # Accessors are compared as typed arrays instead of JSON lists
+    diffs.extend(
+        diff_accessors(
+            before_json,
+            before_binary,
+            after_json,
+            after_binary,
+            float_tolerance,
+            '["~accessors_decoded"]',
+            max_reported_indices,
+        )
     )
+    return diffs
@@ -12,19 +12,20 @@ import sys
 import tempfile
 from dataclasses import dataclass, field
 from itertools import repeat
-from typing import Dict, List, Optional, Sequence, Tuple, Union
+from typing import Dict, List, Optional, Sequence, Set, Tuple, Union
 
 import bgl
 import bpy
 from bpy.app.translations import pgettext
 
-from ..common import deep
-from ..common.binary_reader import BinaryReader
+from ..common import deep, texture_extraction
+from ..common.accessor import LazyAccessorTable, decode_accessors, read_buffer_view
 from ..common.convert import deep_dict_or, float3_or, float4_or, str_or
 from ..common.deep import Json
 from ..common.gltf import parse_glb
 from ..common.logging import get_logger
 from ..common.mtoon0_constants import MaterialMtoon0, MaterialTransparentZWrite
+from ..common.profiler import Profiler
 from .license_validation import validate_license
 
 logger = get_logger(__name__)
@@ -131,6 +132,8 @@ class ParseResult:
     ] = field(init=False, default_factory=dict)
     skins_joints_list: List[List[int]] = field(init=False, default_factory=list)
     skins_root_node_list: List[int] = field(init=False, default_factory=list)
+    accessors: LazyAccessorTable = field(init=False, default_factory=LazyAccessorTable)
+    body_binary: memoryview = field(init=False, default=memoryview(b""))
 
 
 def create_py_bone(node: Dict[str, Json]) -> PyNode:
@@ -303,61 +306,13 @@ def remove_unsafe_path_chars(filename: str) -> str:
 
 #  "accessorの順に" データを読み込んでリストにしたものを返す
 def decode_bin(
-    json_dict: Dict[str, Json], binary: bytes
+    json_dict: Dict[str, Json], binary: Union[bytes, memoryview]
 ) -> List[List[Union[int, float, List[int], List[float]]]]:
-    br = BinaryReader(binary)
     # This list indexed by accessor index
-    decoded_binary: List[List[Union[int, float, List[int], List[float]]]] = []
-    buffer_view_dicts = json_dict["bufferViews"]
-    if not isinstance(buffer_view_dicts, list):
-        buffer_view_dicts = []
-    accessor_dicts = json_dict["accessors"]
-    if not isinstance(accessor_dicts, list):
-        return []
-    type_num_dict = {"SCALAR": 1, "VEC2": 2, "VEC3": 3, "VEC4": 4, "MAT4": 16}
-    for accessor_index, accessor_dict in enumerate(accessor_dicts):
-        if not isinstance(accessor_dict, dict):
-            continue
-        accessor_type = accessor_dict.get("type")
-        if not isinstance(accessor_type, str):
-            continue
-        type_num = type_num_dict.get(accessor_type)
-        if not isinstance(type_num, int):
-            logger.warning(f"Unrecognized accessor type: {accessor_type}")
-            continue
-        buffer_view_index = accessor_dict.get("bufferView")
-        if not isinstance(buffer_view_index, int):
-            logger.warning(
-                f"accessors[{accessor_index}] doesn't have bufferView that is not implemented yet"
-            )
-            decoded_binary.append([])
-            continue
-        buffer_view_dict = buffer_view_dicts[buffer_view_index]
-        if not isinstance(buffer_view_dict, dict):
-            continue
-        buffer_view_byte_offset = buffer_view_dict.get("byteOffset")
-        if not isinstance(buffer_view_byte_offset, int):
-            buffer_view_byte_offset = 0
-        br.set_pos(buffer_view_byte_offset)
-        data_list: List[Union[int, float, List[int], List[float]]] = []
-        accessor_count = accessor_dict.get("count")
-        if not isinstance(accessor_count, int):
-            accessor_count = 0
-        component_type = accessor_dict.get("componentType")
-        if not isinstance(component_type, int):
-            raise ValueError(f"Unsupported component type: {component_type}")
-        for _ in range(accessor_count):
-            if type_num == 1:
-                single_data = br.read_as_data_type(component_type)
-                data_list.append(single_data)
-            else:
-                multiple_data = []
-                for _ in range(type_num):
-                    multiple_data.append(br.read_as_data_type(component_type))
-                data_list.append(multiple_data)
-        decoded_binary.append(data_list)
-
-    return decoded_binary
+    return [
+        decoded_accessor.to_list() if decoded_accessor else []
+        for decoded_accessor in decode_accessors(json_dict, binary)
+    ]
 
 
 @dataclass
@@ -367,16 +322,21 @@ class VrmParser:
     make_new_texture_folder: bool
     license_validation: bool
     legacy_importer: bool
-    decoded_binary: List[List[Union[int, float, List[int], List[float]]]] = field(
-        init=False, default_factory=list
+    # The result of parse_glb() that was already read from the filepath
+    parsed_glb: Optional[Tuple[Dict[str, Json], memoryview]] = None
+    profiler: Profiler = field(default_factory=Profiler)
+    decoded_binary: Dict[int, List[Union[int, float, List[int], List[float]]]] = field(
+        init=False, default_factory=dict
     )
     json_dict: Dict[str, Json] = field(init=False, default_factory=dict)
 
     def parse(self) -> ParseResult:
         # bin chunkは一つだけであることを期待
-        with open(self.filepath, "rb") as f:
-            json_dict, body_binary = parse_glb(f.read())
-            self.json_dict = json_dict
+        if self.parsed_glb is None:
+            with open(self.filepath, "rb") as f:
+                self.parsed_glb = parse_glb(f.read())
+        json_dict, body_binary = self.parsed_glb
+        self.json_dict = json_dict
 
         if (
             self.legacy_importer
@@ -392,16 +352,25 @@ class VrmParser:
             validate_license(self.json_dict)
 
         parse_result = ParseResult(filepath=self.filepath, json_dict=self.json_dict)
-        self.vrm_extension_read(parse_result)
+        parse_result.body_binary = body_binary
+        parse_result.accessors = LazyAccessorTable(self.json_dict, body_binary)
+        profiler = self.profiler
+        with profiler.phase("vrm_extension_read"):
+            self.vrm_extension_read(parse_result)
         if self.legacy_importer:
-            self.texture_rip(parse_result, body_binary)
-            self.decoded_binary = decode_bin(self.json_dict, body_binary)
-            self.mesh_read(parse_result)
-            self.material_read(parse_result)
-            self.skin_read(parse_result)
-            self.node_read(parse_result)
+            with profiler.phase("texture_rip"):
+                self.texture_rip(parse_result, body_binary)
+            with profiler.phase("mesh_read"):
+                self.mesh_read(parse_result)
+            with profiler.phase("material_read"):
+                self.material_read(parse_result)
+            with profiler.phase("skin_read"):
+                self.skin_read(parse_result)
+            with profiler.phase("node_read"):
+                self.node_read(parse_result)
         else:
-            self.material_read(parse_result)
+            with profiler.phase("material_read"):
+                self.material_read(parse_result)
 
         return parse_result
 
@@ -458,34 +427,44 @@ class VrmParser:
     def texture_rip(
         self,
         parse_result: ParseResult,
-        body_binary: bytes,
+        body_binary: memoryview,
     ) -> None:
         buffer_views = self.json_dict.get("bufferViews")
         if not isinstance(buffer_views, list):
             return
 
-        binary_reader = BinaryReader(body_binary)
         if "images" not in self.json_dict:
             return
 
         if self.extract_textures_into_folder:
             dir_path = os.path.abspath(self.filepath) + ".textures"
             if self.make_new_texture_folder:
-                for i in range(100001):
-                    checking_dir_path = dir_path if i == 0 else f"{dir_path}.{i}"
-                    if not os.path.exists(checking_dir_path):
-                        os.mkdir(checking_dir_path)
-                        dir_path = checking_dir_path
-                        break
+                dir_path = texture_extraction.make_new_directory(dir_path)
         else:
             dir_path = tempfile.mkdtemp()  # TODO: cleanup
 
+        # 既存のファイル名は一度だけ取得し、書き込みはまとめて並列に行う
+        file_names = texture_extraction.list_file_names(dir_path)
+        image_names: Set[str] = set()
+        path_and_data_list: List[Tuple[str, memoryview]] = []
+        # 同じ内容の画像は一度だけ書き込む
+        image_index_remap = texture_extraction.create_image_index_remap(
+            self.json_dict, body_binary
+        )
+        image_index_to_image_property: Dict[int, ImageProperties] = {}
+
         image_dicts = self.json_dict.get("images")
         if not isinstance(image_dicts, list):
             image_dicts = []
         for image_index, image_dict in enumerate(image_dicts):
             if not isinstance(image_dict, dict):
                 continue
+            first_image_property = image_index_to_image_property.get(
+                image_index_remap.get(image_index, -1)
+            )
+            if first_image_property is not None:
+                parse_result.image_properties.append(first_image_property)
+                continue
             if "extra" in image_dict:
                 image_name = deep.get(image_dict, ["extra", "name"])
             else:
@@ -501,15 +480,17 @@ class VrmParser:
             if not isinstance(buffer_view_dict, dict):
                 continue
 
-            byte_offset = buffer_view_dict.get("byteOffset")
-            if isinstance(byte_offset, int) and byte_offset >= 0:
-                binary_reader.set_pos(byte_offset)
-
             byte_length = buffer_view_dict.get("byteLength")
             if not isinstance(byte_length, int) or byte_length <= 0:
                 continue
 
-            image_binary = binary_reader.read_binary(byte_length)
+            try:
+                image_binary = read_buffer_view(
+                    self.json_dict, body_binary, buffer_view_index
+                )
+            except ValueError:
+                logger.exception(f"Failed to read images[{image_index}]")
+                continue
 
             mime_type = image_dict.get("mimeType")
             if not isinstance(mime_type, str):
@@ -527,38 +508,58 @@ class VrmParser:
                 image_name = new_image_name
 
             image_name = remove_unsafe_path_chars(image_name)
-            image_path = os.path.join(dir_path, image_name)
+            image_file_name = image_name
             if os.path.splitext(image_name)[1].lower() != ("." + image_type).lower():
-                image_path += "." + image_type
-            if not os.path.exists(image_path):  # すでに同名の画像がある場合は基本上書きしない
-                with open(image_path, "wb") as image_writer:
-                    image_writer.write(image_binary)
-            elif image_name in [
-                img.name for img in parse_result.image_properties
-            ]:  # ただ、それがこのVRMを開いた時の名前の時はちょっと考えて書いてみる。
-                written_flag = False
-                for i in range(100000):
-                    second_image_name = image_name + "_" + str(i)
-                    image_path = os.path.join(
-                        dir_path, second_image_name + "." + image_type
-                    )
-                    if not os.path.exists(image_path):
-                        with open(image_path, "wb") as image_writer:
-                            image_writer.write(image_binary)
-                        image_name = second_image_name
-                        written_flag = True
-                        break
-                if not written_flag:
+                image_file_name += "." + image_type
+            image_path = os.path.join(dir_path, image_file_name)
+            image_file_root, image_file_ext = os.path.splitext(image_file_name)
+            if texture_extraction.reserve_unique_file_name(
+                image_file_root, image_file_ext, file_names, retry_limit=0
+            ):  # すでに同名の画像がある場合は基本上書きしない
+                path_and_data_list.append((image_path, image_binary))
+            elif (
+                image_name in image_names
+            ):  # ただ、それがこのVRMを開いた時の名前の時はちょっと考えて書いてみる。
+                second_image_file_name = texture_extraction.reserve_unique_file_name(
+                    image_file_root, "." + image_type, file_names
+                )
+                if second_image_file_name is None:
                     logger.warning(
-                        "There are more than 100000 images with the same name in the folder."
+                        f"There are more than {texture_extraction.UNIQUE_NAME_RETRY_LIMIT}"
+                        + " images with the same name in the folder."
                         + f" Failed to write file: {image_name}"
                     )
+                else:
+                    image_path = os.path.join(dir_path, second_image_file_name)
+                    path_and_data_list.append((image_path, image_binary))
+                    image_name = os.path.splitext(second_image_file_name)[0]
             else:
                 logger.warning(
                     image_name + " Image already exists. Was not overwritten."
                 )
+            image_names.add(image_name)
             image_property = ImageProperties(image_name, image_path, image_type)
             parse_result.image_properties.append(image_property)
+            image_index_to_image_property[image_index] = image_property
+
+        texture_extraction.write_files(path_and_data_list)
+
+    def read_accessor(
+        self, parse_result: ParseResult, accessor_index: object
+    ) -> Optional[List[Union[int, float, List[int], List[float]]]]:
+        if accessor_index not in parse_result.accessors or not isinstance(
+            accessor_index, int
+        ):
+            return None
+        data_list = self.decoded_binary.get(accessor_index)
+        if data_list is not None:
+            return data_list
+        decoded_accessor = parse_result.accessors.get(accessor_index)
+        data_list = decoded_accessor.to_list() if decoded_accessor else []
+        # 変換後の型付き配列は使わないので、リストだけをキャッシュする
+        parse_result.accessors.release(accessor_index)
+        self.decoded_binary[accessor_index] = data_list
+        return data_list
 
     def mesh_read(self, parse_result: ParseResult) -> None:
         # メッシュをパースする
@@ -594,9 +595,10 @@ class VrmParser:
                     # TODO その他メッシュタイプ対応
                     primitive_mode = primitive_dict.get("mode")
                     raise ValueError(f"Unsupported polygon type(:{primitive_mode})")
-                indices = primitive_dict.get("indices")
-                if isinstance(indices, int) and 0 <= indices < len(self.decoded_binary):
-                    scalar_face_indices = self.decoded_binary[indices]
+                scalar_face_indices = self.read_accessor(
+                    parse_result, primitive_dict.get("indices")
+                )
+                if scalar_face_indices is not None:
                     while len(scalar_face_indices) % 3 != 0:
                         logger.warning(
                             f"meshes[{n}]primitives[{j}] length is not a multiple of 3"
@@ -617,11 +619,10 @@ class VrmParser:
                     vertex_attributes = {}
                 # 頂点属性は実装によっては存在しない属性(例えばJOINTSやWEIGHTSがなかったりもする)もあるし、UVや頂点カラー0->Nで増やせる(スキニングは1要素(ボーン4本)限定
                 for attr_key, attr_value in vertex_attributes.items():
-                    if not isinstance(attr_value, int) or not 0 <= attr_value < len(
-                        self.decoded_binary
-                    ):
+                    attr_data = self.read_accessor(parse_result, attr_value)
+                    if attr_data is None:
                         continue
-                    vrm_mesh.__setattr__(attr_key, self.decoded_binary[attr_value])
+                    vrm_mesh.__setattr__(attr_key, attr_data)
 
                 # region TEXCOORD_FIX [ 古いUniVRM誤り: uv.y = -uv.y ->修復 uv.y = 1 - ( -uv.y ) => uv.y=1+uv.y]
                 legacy_uv_flag = False  # f***
@@ -666,12 +667,11 @@ class VrmParser:
                     for i, morph_target_dict in enumerate(morph_target_dicts):
                         if not isinstance(morph_target_dict, dict):
                             continue
-                        position_index = morph_target_dict.get("POSITION")
-                        if not isinstance(
-                            position_index, int
-                        ) or not 0 <= position_index < len(self.decoded_binary):
+                        pos_array = self.read_accessor(
+                            parse_result, morph_target_dict.get("POSITION")
+                        )
+                        if pos_array is None:
                             continue
-                        pos_array = self.decoded_binary[position_index]
                         if "extra" in morph_target_dict:  # for old AliciaSolid
                             # accessorのindexを持つのは変換時のキャッシュ対応のため
                             morph_name = str(
@@ -26,10 +26,56 @@ translation_dictionary = {
     ("*", "Export Invisible Objects"): "非表示のオブジェクトも含める",
     ("*", "Export Only Selections"): "選択されたオブジェクトのみ",
     ("*", "Enable Advanced Options"): "高度なオプションを有効にする",
+    ("*", "Profiling"): "プロファイリング",
+    ("*", "Record Import/Export Profiles"): "インポート・エクスポートのプロファイルを記録",
+    (
+        "*",
+        "Write the time and memory usage of import/export phases to a JSON file",
+    ): "インポート・エクスポートの各段階の処理時間とメモリ使用量をJSONファイルに書き出す",
     (
         "*",
         "Try the FB_ngon_encoding under development (Exported meshes can be corrupted)",
     ): "開発中のFB_ngon_encodingエクステンションを試してみる(エクスポートされるメッシュが壊れることがあります)",
+    ("*", "Export Sparse Morph Targets"): "モーフターゲットをスパースアクセサで出力",
+    (
+        "*",
+        "Write morph targets which move few vertices as sparse accessors",
+    ): "少数の頂点しか動かさないモーフターゲットをスパースアクセサとして書き出す",
+    ("*", "Sparse Morph Target Threshold"): "スパースモーフターゲットのしきい値",
+    (
+        "*",
+        "The maximum ratio of moved vertices to write a morph target as a sparse accessor",
+    ): "モーフターゲットをスパースアクセサとして書き出す、動く頂点の割合の上限",
+    ("*", "Mesh Quantization"): "メッシュの量子化",
+    (
+        "*",
+        "Write VRM 0.x meshes with smaller component types",
+    ): "VRM 0.xのメッシュをより小さな型で書き出す",
+    (
+        "*",
+        "Write indices as unsigned ints and attributes as floats",
+    ): "インデックスを符号なし整数、頂点属性を浮動小数点数で書き出す",
+    ("*", "Indices"): "インデックス",
+    (
+        "*",
+        "Write indices with the smallest component types",
+    ): "インデックスを収まる最小の型で書き出す",
+    ("*", "Indices, UVs and Weights"): "インデックス、UV、ウェイト",
+    (
+        "*",
+        "Also write UVs and weights as normalized integers of glTF 2.0",
+    ): "UVとウェイトもglTF 2.0の正規化整数で書き出す",
+    ("*", "All with KHR_mesh_quantization"): "KHR_mesh_quantizationで全て",
+    (
+        "*",
+        "Also write morph target normals as normalized integers."
+        + " Some VRM apps don't support it",
+    ): "モーフターゲットの法線も正規化整数で書き出す。対応していないVRMアプリもあります",
+    ("*", "Optimize Vertex Cache"): "頂点キャッシュを最適化",
+    (
+        "*",
+        "Reorder the triangles and vertices of VRM 0.x meshes for the GPU vertex cache",
+    ): "GPUの頂点キャッシュのため、VRM 0.xのメッシュの三角形と頂点を並べ替える",
     (
         "*",
         "VRM 1.0 support is under development.\n"
@@ -0,0 +1,470 @@
+#!/usr/bin/env python3
+
+"""
+Import/export benchmark using synthetic VRM files.
+
+Generate files only:
+    python scripts/vrm_benchmark.py generate --output-dir /tmp/vrm_benchmark
+
+Run the benchmark in Blender:
+    blender --background --factory-startup --python-exit-code 1 \
+        --python scripts/vrm_benchmark.py -- run --output result.json
+
+Compare two runs:
+    python scripts/vrm_benchmark.py compare baseline.json result.json
+
+Peak memory is measured with tracemalloc. It covers Python allocations only and
+doesn't include memory allocated by Blender itself.
+"""
+
+import argparse
+import dataclasses
+import functools
+import gc
+import json
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable, Dict, List, Sequence, Tuple, TypeVar
+
+repository_root_dir = Path(__file__).resolve().parent.parent
+if str(repository_root_dir) not in sys.path:
+    sys.path.insert(0, str(repository_root_dir))
+
+if TYPE_CHECKING:
+    from io_scene_vrm.common.deep import Json
+    from io_scene_vrm.common.gltf import BinaryChunk
+    from tests.synthetic_vrm import SyntheticVrmSpec
+
+RESULT_FORMAT_VERSION = 1
+
+PRESETS: Dict[str, Dict[str, int]] = {
+    "small": {
+        "vertex_count": 2000,
+        "morph_target_count": 4,
+        "bone_count": 32,
+        "material_count": 2,
+        "texture_count": 2,
+        "texture_size": 128,
+    },
+    "medium": {
+        "vertex_count": 20000,
+        "morph_target_count": 16,
+        "bone_count": 96,
+        "material_count": 4,
+        "texture_count": 4,
+        "texture_size": 512,
+    },
+    "large": {
+        "vertex_count": 100000,
+        "morph_target_count": 52,
+        "bone_count": 160,
+        "material_count": 8,
+        "texture_count": 8,
+        "texture_size": 1024,
+    },
+}
+
+# Overrides of SyntheticVrmSpec fields
+SCALE_ARGUMENTS = {
+    "vertices": "vertex_count",
+    "morph_targets": "morph_target_count",
+    "bones": "bone_count",
+    "materials": "material_count",
+    "textures": "texture_count",
+    "texture_size": "texture_size",
+}
+
+T = TypeVar("T")
+
+
+@dataclasses.dataclass
+class PhaseResult:
+    name: str
+    wall_seconds: List[float] = dataclasses.field(default_factory=list)
+    peak_memory_bytes: int = 0
+
+    def to_dict(self) -> Dict[str, object]:
+        return {
+            "name": self.name,
+            "wall_seconds": self.wall_seconds,
+            "min_seconds": min(self.wall_seconds),
+            "median_seconds": statistics.median(self.wall_seconds),
+            "peak_memory_bytes": self.peak_memory_bytes,
+        }
+
+
+class PhaseRecorder:
+    def __init__(self, trace_memory: bool) -> None:
+        self.trace_memory = trace_memory
+        self.phases: Dict[str, PhaseResult] = {}
+
+    def measure(self, name: str, function: Callable[[], T]) -> T:
+        gc.collect()
+        if self.trace_memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        try:
+            return function()
+        finally:
+            elapsed = time.perf_counter() - start
+            peak_memory_bytes = 0
+            if self.trace_memory:
+                _, peak_memory_bytes = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+            phase = self.phases.get(name)
+            if phase is None:
+                phase = PhaseResult(name)
+                self.phases[name] = phase
+            phase.wall_seconds.append(elapsed)
+            phase.peak_memory_bytes = max(phase.peak_memory_bytes, peak_memory_bytes)
+
+
+def create_specs(args: argparse.Namespace) -> List["SyntheticVrmSpec"]:
+    from tests.synthetic_vrm import SyntheticVrmSpec
+
+    specs: List[SyntheticVrmSpec] = []
+    for preset in args.preset or ["small"]:
+        for spec_version in args.spec_version or ["0.0", "1.0"]:
+            scale = dict(PRESETS[preset])
+            for argument_name, field_name in SCALE_ARGUMENTS.items():
+                value = getattr(args, argument_name)
+                if value is not None:
+                    scale[field_name] = value
+            spec = SyntheticVrmSpec(spec_version=spec_version, **scale)
+            if spec not in specs:
+                specs.append(spec)
+    return specs
+
+
+def generate(args: argparse.Namespace) -> int:
+    from tests.synthetic_vrm import create_synthetic_vrm_bytes
+
+    output_dir = Path(args.output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    for spec in create_specs(args):
+        path = output_dir / f"{spec.name()}.vrm"
+        path.write_bytes(create_synthetic_vrm_bytes(spec))
+        print(f"{path} ({path.stat().st_size} bytes)")
+    return 0
+
+
+def read_and_parse_glb(filepath: str) -> Tuple[Dict[str, "Json"], memoryview]:
+    from io_scene_vrm.common import gltf
+
+    # The parse result outlives this function, so the file isn't mapped
+    with open(filepath, "rb") as f:
+        return gltf.parse_glb(f.read())
+
+
+def write_glb_file(
+    path: Path,
+    json_dict: Dict[str, "Json"],
+    binary_chunks: List["BinaryChunk"],
+) -> None:
+    from io_scene_vrm.common import gltf
+
+    with path.open("wb") as f:
+        gltf.write_glb(f, json_dict, binary_chunks)
+
+
+def reset_scene() -> None:
+    import bpy
+
+    for obj in list(bpy.data.objects):
+        bpy.data.objects.remove(obj, do_unlink=True)
+    for collection in list(bpy.data.collections):
+        bpy.data.collections.remove(collection)
+    for datablocks in [
+        bpy.data.meshes,
+        bpy.data.armatures,
+        bpy.data.materials,
+        bpy.data.textures,
+        bpy.data.images,
+    ]:
+        for datablock in list(datablocks):
+            datablocks.remove(datablock)
+
+
+def run_case(
+    spec: "SyntheticVrmSpec", work_dir: Path, repeat: int, trace_memory: bool
+) -> Dict[str, object]:
+    import bpy
+
+    from io_scene_vrm.editor import search
+    from io_scene_vrm.exporter.abstract_base_vrm_exporter import (
+        AbstractBaseVrmExporter,
+    )
+    from io_scene_vrm.exporter.gltf2_addon_vrm_exporter import Gltf2AddonVrmExporter
+    from io_scene_vrm.exporter.legacy_vrm_exporter import LegacyVrmExporter
+    from io_scene_vrm.importer.abstract_base_vrm_importer import (
+        AbstractBaseVrmImporter,
+    )
+    from io_scene_vrm.importer.gltf2_addon_vrm_importer import Gltf2AddonVrmImporter
+    from io_scene_vrm.importer.legacy_vrm_importer import LegacyVrmImporter
+    from io_scene_vrm.importer.vrm_parser import VrmParser, decode_bin
+    from tests.synthetic_vrm import create_synthetic_vrm_bytes
+
+    context = bpy.context
+    input_path = work_dir / f"{spec.name()}.vrm"
+    input_path.write_bytes(create_synthetic_vrm_bytes(spec))
+    output_path = work_dir / f"{spec.name()}.out.vrm"
+
+    # The legacy importer supports VRM 0.x only
+    importers: List[Tuple[str, bool]] = [("gltf2_addon", False)]
+    if spec.spec_version.startswith("0."):
+        importers.insert(0, ("legacy", True))
+
+    recorder = PhaseRecorder(trace_memory)
+    result: Dict[str, object] = {
+        "name": spec.name(),
+        "spec": spec.to_dict(),
+        "file_bytes": input_path.stat().st_size,
+    }
+    try:
+        for _ in range(repeat):
+            parsed_glb = recorder.measure(
+                "parse_glb", functools.partial(read_and_parse_glb, str(input_path))
+            )
+            recorder.measure("decode_bin", functools.partial(decode_bin, *parsed_glb))
+
+            for importer_name, legacy_importer in importers:
+                vrm_parser = VrmParser(
+                    str(input_path),
+                    extract_textures_into_folder=False,
+                    make_new_texture_folder=False,
+                    license_validation=False,
+                    legacy_importer=legacy_importer,
+                    parsed_glb=parsed_glb,
+                )
+                parse_result = recorder.measure(
+                    f"{importer_name}.vrm_parser_parse", vrm_parser.parse
+                )
+
+                reset_scene()
+                if legacy_importer:
+                    importer: AbstractBaseVrmImporter = LegacyVrmImporter(
+                        context, parse_result, False, False
+                    )
+                else:
+                    importer = Gltf2AddonVrmImporter(
+                        context, parse_result, False, False
+                    )
+                recorder.measure(f"{importer_name}.import_vrm", importer.import_vrm)
+
+                export_objects = search.export_objects(context, False, False)
+                if any(
+                    obj.type == "ARMATURE" and obj.data.vrm_addon_extension.is_vrm1()
+                    for obj in export_objects
+                ):
+                    exporter_name = "gltf2_addon"
+                    exporter: AbstractBaseVrmExporter = Gltf2AddonVrmExporter(
+                        context, export_objects
+                    )
+                else:
+                    exporter_name = "legacy"
+                    exporter = LegacyVrmExporter(context, export_objects, False)
+                phase_prefix = f"{importer_name}.{exporter_name}"
+                vrm = recorder.measure(
+                    f"{phase_prefix}.export_vrm", exporter.export_vrm
+                )
+                if vrm is None:
+                    raise ValueError(f"Failed to export {spec.name()}")
+                recorder.measure(
+                    f"{phase_prefix}.write_glb",
+                    functools.partial(write_glb_file, output_path, *vrm),
+                )
+                reset_scene()
+    except Exception as e:
+        # Keep the results of the other cases
+        result["error"] = f"{type(e).__name__}: {e}"
+    result["phases"] = [phase.to_dict() for phase in recorder.phases.values()]
+    return result
+
+
+def run(args: argparse.Namespace) -> int:
+    try:
+        import bpy
+    except ImportError:
+        print("The run command must be executed in Blender.")
+        return 1
+
+    from io_scene_vrm.external.fake_bpy_module_support import is_fake_bpy_module
+
+    if is_fake_bpy_module():
+        print("bpy module is 'fake_bpy_module'. Real Blender bpy is required.")
+        return 1
+
+    if "io_scene_vrm" not in bpy.context.preferences.addons:
+        bpy.ops.preferences.addon_enable(module="io_scene_vrm")
+
+    import io_scene_vrm
+
+    cases: List[Dict[str, object]] = []
+    with tempfile.TemporaryDirectory() as temp_dir:
+        work_dir = Path(args.work_dir) if args.work_dir else Path(temp_dir)
+        work_dir.mkdir(parents=True, exist_ok=True)
+        for spec in create_specs(args):
+            print(f"Running {spec.name()}")
+            case = run_case(spec, work_dir, args.repeat, not args.no_trace_memory)
+            print_case(case)
+            cases.append(case)
+
+    result = {
+        "format_version": RESULT_FORMAT_VERSION,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "addon_version": list(io_scene_vrm.bl_info["version"]),
+        "blender_version": bpy.app.version_string,
+        "python_version": platform.python_version(),
+        "platform": platform.platform(),
+        "repeat": args.repeat,
+        "trace_memory": not args.no_trace_memory,
+        "cases": cases,
+    }
+    output = json.dumps(result, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + "\n", encoding="utf-8")
+    else:
+        print(output)
+    return 1 if any("error" in case for case in cases) else 0
+
+
+def print_case(case: Dict[str, object]) -> None:
+    phases = case.get("phases")
+    if isinstance(phases, list):
+        for phase in phases:
+            if not isinstance(phase, dict):
+                continue
+            print(
+                f"  {phase.get('name'):<45}"
+                + f" {phase.get('median_seconds', 0):10.3f} s"
+                + f" {phase.get('peak_memory_bytes', 0) / 1024 / 1024:10.1f} MiB"
+            )
+    error = case.get("error")
+    if error:
+        print(f"  ERROR: {error}")
+
+
+def load_phases(path: str) -> Dict[Tuple[str, str], Tuple[float, int]]:
+    result = json.loads(Path(path).read_text(encoding="utf-8"))
+    if result.get("format_version") != RESULT_FORMAT_VERSION:
+        raise ValueError(f"Unsupported benchmark result format: {path}")
+    phases: Dict[Tuple[str, str], Tuple[float, int]] = {}
+    for case in result.get("cases", []):
+        for phase in case.get("phases", []):
+            phases[(case["name"], phase["name"])] = (
+                float(phase["median_seconds"]),
+                int(phase["peak_memory_bytes"]),
+            )
+    return phases
+
+
+def format_change(baseline: float, current: float) -> str:
+    if baseline == 0:
+        return "     n/a"
+    return f"{current / baseline - 1:+8.1%}"
+
+
+def compare(args: argparse.Namespace) -> int:
+    baseline = load_phases(args.baseline)
+    current = load_phases(args.current)
+
+    regressions: List[str] = []
+    print(
+        f"{'case':<40} {'phase':<45}"
+        + f" {'baseline':>10} {'current':>10} {'change':>8}"
+        + f" {'memory':>8}"
+    )
+    for key in [*baseline, *[key for key in current if key not in baseline]]:
+        case_name, phase_name = key
+        baseline_values = baseline.get(key)
+        current_values = current.get(key)
+        if baseline_values is None or current_values is None:
+            missing = "baseline" if baseline_values is None else "current"
+            print(f"{case_name:<40} {phase_name:<45} (missing in {missing})")
+            continue
+        baseline_seconds, baseline_memory = baseline_values
+        current_seconds, current_memory = current_values
+        print(
+            f"{case_name:<40} {phase_name:<45}"
+            + f" {baseline_seconds:10.3f} {current_seconds:10.3f}"
+            + f" {format_change(baseline_seconds, current_seconds)}"
+            + f" {format_change(baseline_memory, current_memory)}"
+        )
+        if (
+            current_seconds > baseline_seconds * (1 + args.threshold)
+            and current_seconds - baseline_seconds > args.min_seconds
+        ):
+            regressions.append(
+                f"{case_name} {phase_name}: time"
+                + f" {baseline_seconds:.3f}s -> {current_seconds:.3f}s"
+            )
+        if current_memory > baseline_memory * (1 + args.threshold):
+            regressions.append(
+                f"{case_name} {phase_name}: memory"
+                + f" {baseline_memory} -> {current_memory} bytes"
+            )
+
+    if not regressions:
+        print("No regressions")
+        return 0
+    print(f"{len(regressions)} regression(s) over {args.threshold:.0%}")
+    for regression in regressions:
+        print(f"  {regression}")
+    return 1
+
+
+def add_scale_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--preset", action="append", choices=list(PRESETS), help="default: small"
+    )
+    parser.add_argument(
+        "--spec-version", action="append", choices=["0.0", "1.0"], help="default: all"
+    )
+    for argument_name in SCALE_ARGUMENTS:
+        parser.add_argument("--" + argument_name.replace("_", "-"), type=int)
+
+
+def main(argv: Sequence[str]) -> int:
+    parser = argparse.ArgumentParser(description="VRM import/export benchmark")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    generate_parser = subparsers.add_parser("generate")
+    generate_parser.add_argument("--output-dir", required=True)
+    add_scale_arguments(generate_parser)
+    generate_parser.set_defaults(function=generate)
+
+    run_parser = subparsers.add_parser("run")
+    run_parser.add_argument("--output", help="JSON output path. default: stdout")
+    run_parser.add_argument("--work-dir", help="default: temporary directory")
+    run_parser.add_argument("--repeat", type=int, default=3)
+    run_parser.add_argument("--no-trace-memory", action="store_true")
+    add_scale_arguments(run_parser)
+    run_parser.set_defaults(function=run)
+
+    compare_parser = subparsers.add_parser("compare")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=0.1)
+    compare_parser.add_argument(
+        "--min-seconds",
+        type=float,
+        default=0.01,
+        help="Ignore time differences smaller than this",
+    )
+    compare_parser.set_defaults(function=compare)
+
+    args = parser.parse_args(argv)
+    function: Callable[[argparse.Namespace], int] = args.function
+    return function(args)
+
+
+if __name__ == "__main__":
+    if "--" in sys.argv:
+        sys.exit(main(sys.argv[slice(sys.argv.index("--") + 1, len(sys.argv))]))
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,489 @@
+import array
+import hashlib
+import math
+import struct
+import sys
+import zlib
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from io_scene_vrm.common import accessor, gltf
+from io_scene_vrm.common.deep import Json
+
+# (human bone name, parent human bone name, translation)
+HUMANOID_BONES: List[Tuple[str, Optional[str], Tuple[float, float, float]]] = [
+    ("hips", None, (0.0, 0.9, 0.0)),
+    ("spine", "hips", (0.0, 0.1, 0.0)),
+    ("chest", "spine", (0.0, 0.15, 0.0)),
+    ("neck", "chest", (0.0, 0.2, 0.0)),
+    ("head", "neck", (0.0, 0.1, 0.0)),
+    ("leftUpperLeg", "hips", (0.1, -0.05, 0.0)),
+    ("leftLowerLeg", "leftUpperLeg", (0.0, -0.4, 0.0)),
+    ("leftFoot", "leftLowerLeg", (0.0, -0.4, 0.0)),
+    ("rightUpperLeg", "hips", (-0.1, -0.05, 0.0)),
+    ("rightLowerLeg", "rightUpperLeg", (0.0, -0.4, 0.0)),
+    ("rightFoot", "rightLowerLeg", (0.0, -0.4, 0.0)),
+    ("leftUpperArm", "chest", (0.2, 0.15, 0.0)),
+    ("leftLowerArm", "leftUpperArm", (0.25, 0.0, 0.0)),
+    ("leftHand", "leftLowerArm", (0.25, 0.0, 0.0)),
+    ("rightUpperArm", "chest", (-0.2, 0.15, 0.0)),
+    ("rightLowerArm", "rightUpperArm", (-0.25, 0.0, 0.0)),
+    ("rightHand", "rightLowerArm", (-0.25, 0.0, 0.0)),
+]
+
+HAIR_CHAIN_LENGTH = 8
+
+ARRAY_BUFFER = 34962
+ELEMENT_ARRAY_BUFFER = 34963
+
+
+@dataclass(frozen=True)
+class SyntheticVrmSpec:
+    spec_version: str = "0.0"
+    vertex_count: int = 2000
+    morph_target_count: int = 4
+    bone_count: int = 32
+    material_count: int = 2
+    texture_count: int = 2
+    texture_size: int = 128
+
+    def name(self) -> str:
+        major = self.spec_version.split(".")[0]
+        return (
+            f"vrm{major}"
+            + f"_v{self.vertex_count}"
+            + f"_mt{self.morph_target_count}"
+            + f"_b{self.bone_count}"
+            + f"_mat{self.material_count}"
+            + f"_tex{self.texture_count}x{self.texture_size}"
+        )
+
+    def to_dict(self) -> Dict[str, Json]:
+        return dict(asdict(self))
+
+
+class GlbBuilder:
+    def __init__(self) -> None:
+        self.buffer_views: List[Json] = []
+        self.accessors: List[Json] = []
+        self.segments: List[gltf.BinaryChunk] = []
+        self.byte_length = 0
+
+    def add_buffer_view(self, data: bytes, target: Optional[int] = None) -> int:
+        padding = -self.byte_length % 4
+        if padding:
+            self.segments.append(bytes(padding))
+            self.byte_length += padding
+        buffer_view: Dict[str, Json] = {
+            "buffer": 0,
+            "byteOffset": self.byte_length,
+            "byteLength": len(data),
+        }
+        if target is not None:
+            buffer_view["target"] = target
+        self.segments.append(data)
+        self.byte_length += len(data)
+        self.buffer_views.append(buffer_view)
+        return len(self.buffer_views) - 1
+
+    def add_accessor(
+        self,
+        values: accessor.TypedArray,
+        component_type: int,
+        accessor_type: str,
+        target: Optional[int] = None,
+        min_max: bool = False,
+    ) -> int:
+        component_count = accessor.TYPE_TO_COMPONENT_COUNT[accessor_type]
+        if sys.byteorder == "big":
+            values = array.array(values.typecode, values)
+            values.byteswap()
+        accessor_dict: Dict[str, Json] = {
+            "bufferView": self.add_buffer_view(values.tobytes(), target),
+            "byteOffset": 0,
+            "componentType": component_type,
+            "type": accessor_type,
+            "count": len(values) // component_count,
+        }
+        if min_max:
+            columns = [values[i::component_count] for i in range(component_count)]
+            accessor_dict["min"] = [min(column) for column in columns]
+            accessor_dict["max"] = [max(column) for column in columns]
+        self.accessors.append(accessor_dict)
+        return len(self.accessors) - 1
+
+
+def create_png(width: int, height: int, seed: int) -> bytes:
+    # Deterministic noise. It doesn't compress well like real textures.
+    row_size = width * 3
+    pixels = hashlib.shake_256(f"synthetic_vrm_texture_{seed}".encode()).digest(
+        row_size * height
+    )
+    raw = bytearray()
+    for y in range(height):
+        start = y * row_size
+        raw.append(0)  # Filter type: None
+        raw.extend(pixels[slice(start, start + row_size)])
+
+    def chunk(chunk_type: bytes, data: bytes) -> bytes:
+        return (
+            struct.pack(">I", len(data))
+            + chunk_type
+            + data
+            + struct.pack(">I", zlib.crc32(chunk_type + data) & 0xFFFFFFFF)
+        )
+
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+        + chunk(b"IDAT", zlib.compress(raw))
+        + chunk(b"IEND", b"")
+    )
+
+
+def create_bones(
+    bone_count: int,
+) -> List[Tuple[str, Optional[int], Tuple[float, float, float]]]:
+    bones: List[Tuple[str, Optional[int], Tuple[float, float, float]]] = []
+    human_bone_indices: Dict[str, int] = {}
+    for name, parent_name, translation in HUMANOID_BONES:
+        parent_index = None if parent_name is None else human_bone_indices[parent_name]
+        human_bone_indices[name] = len(bones)
+        bones.append((name, parent_index, translation))
+
+    head_index = human_bone_indices["head"]
+    parent_index = head_index
+    while len(bones) < bone_count:
+        extra_index = len(bones) - len(HUMANOID_BONES)
+        chain_index, link_index = divmod(extra_index, HAIR_CHAIN_LENGTH)
+        if link_index == 0:
+            parent_index = head_index
+            angle = chain_index * 2.399963  # golden angle
+            translation = (math.cos(angle) * 0.08, 0.1, math.sin(angle) * 0.08)
+        else:
+            translation = (0.0, -0.04, 0.0)
+        bones.append((f"hair_{chain_index}_{link_index}", parent_index, translation))
+        parent_index = len(bones) - 1
+    return bones
+
+
+def world_translations(
+    bones: Sequence[Tuple[str, Optional[int], Tuple[float, float, float]]],
+) -> List[Tuple[float, float, float]]:
+    result: List[Tuple[float, float, float]] = []
+    for _, parent_index, (x, y, z) in bones:
+        if parent_index is None:
+            result.append((x, y, z))
+            continue
+        parent_x, parent_y, parent_z = result[parent_index]
+        result.append((parent_x + x, parent_y + y, parent_z + z))
+    return result
+
+
+def nearest_bone_index(
+    bone_world_translations: Sequence[Tuple[float, float, float]], x: float, y: float
+) -> int:
+    nearest = 0
+    nearest_distance = math.inf
+    for i, (bone_x, bone_y, _) in enumerate(bone_world_translations):
+        distance = (bone_x - x) ** 2 + (bone_y - y) ** 2
+        if distance < nearest_distance:
+            nearest = i
+            nearest_distance = distance
+    return nearest
+
+
+def create_synthetic_vrm(spec: SyntheticVrmSpec) -> Tuple[Dict[str, Json], bytes]:
+    builder = GlbBuilder()
+    bones = create_bones(max(spec.bone_count, len(HUMANOID_BONES)))
+    bone_world_translations = world_translations(bones)
+
+    columns = max(2, math.ceil(math.sqrt(spec.vertex_count)))
+    rows = max(2, math.ceil(spec.vertex_count / columns))
+    vertex_count = columns * rows
+
+    positions = array.array("f")
+    normals = array.array("f")
+    uvs = array.array("f")
+    joints = array.array("H")
+    weights = array.array("f")
+    for row in range(rows):
+        v = row / (rows - 1)
+        for column in range(columns):
+            u = column / (columns - 1)
+            x = u - 0.5
+            y = 1.8 * (1 - v)
+            z = 0.05 * math.sin(u * math.pi * 4)
+            positions.extend((x, y, z))
+            normals.extend((0.0, 0.0, 1.0))
+            uvs.extend((u, v))
+            nearest = nearest_bone_index(bone_world_translations, x, y)
+            parent_index = bones[nearest][1]
+            second = nearest if parent_index is None else parent_index
+            joints.extend((nearest, second, 0, 0))
+            weights.extend(
+                (0.75, 0.25, 0.0, 0.0) if second != nearest else (1, 0, 0, 0)
+            )
+
+    position_accessor = builder.add_accessor(
+        positions, accessor.FLOAT, "VEC3", ARRAY_BUFFER, min_max=True
+    )
+    attributes: Dict[str, Json] = {
+        "POSITION": position_accessor,
+        "NORMAL": builder.add_accessor(normals, accessor.FLOAT, "VEC3", ARRAY_BUFFER),
+        "TEXCOORD_0": builder.add_accessor(uvs, accessor.FLOAT, "VEC2", ARRAY_BUFFER),
+        "JOINTS_0": builder.add_accessor(
+            joints, accessor.UNSIGNED_SHORT, "VEC4", ARRAY_BUFFER
+        ),
+        "WEIGHTS_0": builder.add_accessor(
+            weights, accessor.FLOAT, "VEC4", ARRAY_BUFFER
+        ),
+    }
+
+    # Each morph target moves a horizontal band of the grid
+    targets: List[Json] = []
+    target_names: List[Json] = []
+    for target_index in range(spec.morph_target_count):
+        band_start = rows * target_index // spec.morph_target_count
+        band_end = max(
+            band_start + 1, rows * (target_index + 1) // spec.morph_target_count
+        )
+        deltas = array.array("f", bytes(vertex_count * 3 * 4))
+        for row in range(band_start, band_end):
+            for column in range(columns):
+                deltas[(row * columns + column) * 3 + 2] = 0.01 * (target_index + 1)
+        targets.append(
+            {
+                "POSITION": builder.add_accessor(
+                    deltas, accessor.FLOAT, "VEC3", ARRAY_BUFFER, min_max=True
+                )
+            }
+        )
+        target_names.append(f"Morph{target_index}")
+
+    material_count = max(1, spec.material_count)
+    quad_count = (rows - 1) * (columns - 1)
+    primitive_indices = [
+        array.array(accessor.COMPONENT_TYPE_TO_TYPECODE[accessor.UNSIGNED_INT])
+        for _ in range(material_count)
+    ]
+    for quad_index in range(quad_count):
+        row, column = divmod(quad_index, columns - 1)
+        i = row * columns + column
+        primitive_indices[quad_index * material_count // quad_count].extend(
+            (i, i + columns, i + 1, i + 1, i + columns, i + columns + 1)
+        )
+
+    primitives: List[Json] = []
+    for material_index, indices in enumerate(primitive_indices):
+        primitive: Dict[str, Json] = {
+            "attributes": dict(attributes),
+            "indices": builder.add_accessor(
+                indices, accessor.UNSIGNED_INT, "SCALAR", ELEMENT_ARRAY_BUFFER
+            ),
+            "material": material_index,
+            "mode": 4,
+        }
+        if targets:
+            primitive["targets"] = list(targets)
+            primitive["extras"] = {"targetNames": list(target_names)}
+        primitives.append(primitive)
+
+    mesh: Dict[str, Json] = {"name": "Body", "primitives": primitives}
+    if target_names:
+        mesh["extras"] = {"targetNames": list(target_names)}
+
+    inverse_bind_matrices = array.array("f")
+    for x, y, z in bone_world_translations:
+        inverse_bind_matrices.extend(
+            (1, 0, 0, 0, 0, 1, 0, 0, 0, 0, 1, 0, -x, -y, -z, 1)
+        )
+    bone_node_offset = 1
+    skin: Dict[str, Json] = {
+        "inverseBindMatrices": builder.add_accessor(
+            inverse_bind_matrices, accessor.FLOAT, "MAT4"
+        ),
+        "joints": [bone_node_offset + i for i in range(len(bones))],
+        "skeleton": bone_node_offset,
+    }
+
+    nodes: List[Json] = [{"name": "Body", "mesh": 0, "skin": 0}]
+    for bone_index, (name, _, translation) in enumerate(bones):
+        node: Dict[str, Json] = {"name": name, "translation": list(translation)}
+        children: List[Json] = [
+            bone_node_offset + child_index
+            for child_index, (_, parent_index, _) in enumerate(bones)
+            if parent_index == bone_index
+        ]
+        if children:
+            node["children"] = children
+        nodes.append(node)
+
+    images: List[Json] = []
+    textures: List[Json] = []
+    for texture_index in range(spec.texture_count):
+        images.append(
+            {
+                "name": f"Texture{texture_index}",
+                "mimeType": "image/png",
+                "bufferView": builder.add_buffer_view(
+                    create_png(spec.texture_size, spec.texture_size, texture_index)
+                ),
+            }
+        )
+        textures.append({"sampler": 0, "source": texture_index})
+
+    materials: List[Json] = []
+    for material_index in range(material_count):
+        pbr: Dict[str, Json] = {
+            "baseColorFactor": [1.0, 1.0, 1.0, 1.0],
+            "metallicFactor": 0.0,
+            "roughnessFactor": 0.9,
+        }
+        if textures:
+            pbr["baseColorTexture"] = {
+                "index": material_index % len(textures),
+                "texCoord": 0,
+            }
+        materials.append(
+            {
+                "name": f"Material{material_index}",
+                "pbrMetallicRoughness": pbr,
+                "alphaMode": "OPAQUE",
+                "doubleSided": False,
+            }
+        )
+
+    json_dict: Dict[str, Json] = {
+        "asset": {"version": "2.0", "generator": "VRM Add-on synthetic_vrm"},
+        "scene": 0,
+        "scenes": [{"nodes": [0, bone_node_offset]}],
+        "nodes": nodes,
+        "meshes": [mesh],
+        "skins": [skin],
+        "materials": materials,
+        "buffers": [{"byteLength": builder.byte_length}],
+        "bufferViews": builder.buffer_views,
+        "accessors": builder.accessors,
+    }
+    if images:
+        json_dict["images"] = images
+        json_dict["textures"] = textures
+        json_dict["samplers"] = [
+            {"magFilter": 9729, "minFilter": 9729, "wrapS": 10497, "wrapT": 10497}
+        ]
+
+    human_bone_node_indices = {
+        name: bone_node_offset + i
+        for i, (name, _, _) in enumerate(bones[: len(HUMANOID_BONES)])
+    }
+    if spec.spec_version.startswith("0."):
+        json_dict["extensionsUsed"] = ["VRM"]
+        json_dict["extensions"] = {
+            "VRM": create_vrm0_extension(
+                human_bone_node_indices, target_names, materials
+            )
+        }
+    else:
+        json_dict["extensionsUsed"] = ["VRMC_vrm"]
+        json_dict["extensions"] = {
+            "VRMC_vrm": create_vrm1_extension(human_bone_node_indices, target_names)
+        }
+
+    return json_dict, b"".join(bytes(segment) for segment in builder.segments)
+
+
+def create_vrm0_extension(
+    human_bone_node_indices: Dict[str, int],
+    target_names: List[Json],
+    materials: List[Json],
+) -> Dict[str, Json]:
+    return {
+        "exporterVersion": "synthetic_vrm",
+        "specVersion": "0.0",
+        "meta": {
+            "title": "Synthetic",
+            "version": "1.0",
+            "author": "VRM Add-on",
+            "allowedUserName": "Everyone",
+            "violentUssageName": "Allow",
+            "sexualUssageName": "Allow",
+            "commercialUssageName": "Allow",
+            "licenseName": "CC0",
+        },
+        "humanoid": {
+            "humanBones": [
+                {"bone": name, "node": node_index, "useDefaultValues": True}
+                for name, node_index in human_bone_node_indices.items()
+            ],
+        },
+        "firstPerson": {
+            "firstPersonBone": human_bone_node_indices["head"],
+            "firstPersonBoneOffset": {"x": 0, "y": 0.06, "z": 0},
+            "meshAnnotations": [{"mesh": 0, "firstPersonFlag": "Auto"}],
+        },
+        "blendShapeMaster": {
+            "blendShapeGroups": [
+                {
+                    "name": target_name,
+                    "presetName": "unknown",
+                    "binds": [{"mesh": 0, "index": index, "weight": 100}],
+                    "materialValues": [],
+                    "isBinary": False,
+                }
+                for index, target_name in enumerate(target_names)
+            ],
+        },
+        "secondaryAnimation": {"boneGroups": [], "colliderGroups": []},
+        "materialProperties": [
+            {
+                "name": material["name"] if isinstance(material, dict) else "",
+                "shader": "VRM_USE_GLTFSHADER",
+                "renderQueue": 2000,
+                "floatProperties": {},
+                "vectorProperties": {},
+                "textureProperties": {},
+                "keywordMap": {},
+                "tagMap": {},
+            }
+            for material in materials
+        ],
+    }
+
+
+def create_vrm1_extension(
+    human_bone_node_indices: Dict[str, int],
+    target_names: List[Json],
+) -> Dict[str, Json]:
+    return {
+        "specVersion": "1.0",
+        "meta": {
+            "name": "Synthetic",
+            "version": "1.0",
+            "authors": ["VRM Add-on"],
+            "licenseUrl": "https://vrm.dev/licenses/1.0/",
+            "avatarPermission": "everyone",
+            "commercialUsage": "corporation",
+            "allowRedistribution": True,
+            "modification": "allowModificationRedistribution",
+        },
+        "humanoid": {
+            "humanBones": {
+                name: {"node": node_index}
+                for name, node_index in human_bone_node_indices.items()
+            },
+        },
+        "expressions": {
+            "custom": {
+                str(target_name): {
+                    "morphTargetBinds": [{"node": 0, "index": index, "weight": 1.0}]
+                }
+                for index, target_name in enumerate(target_names)
+            },
+        },
+    }
+
+
+def create_synthetic_vrm_bytes(spec: SyntheticVrmSpec) -> bytes:
+    json_dict, binary = create_synthetic_vrm(spec)
+    return gltf.pack_glb(json_dict, binary)
@@ -1,7 +1,28 @@
-from typing import List
+import array
+import contextlib
+import io
+import json
+import math
+import os
+import struct
+import sys
+import tempfile
+from typing import Dict, List, Tuple
 from unittest import TestCase
 
-from io_scene_vrm.common import deep
+from io_scene_vrm.common import (
+    accessor,
+    accessor_diff,
+    deep,
+    gltf,
+    mesh_encoding,
+    mesh_quantization,
+    sparse_accessor,
+    texture_extraction,
+    vertex_buffer,
+    vertex_cache,
+)
+from io_scene_vrm.common.profiler import Profiler
 from io_scene_vrm.common.vrm0 import human_bone as vrm0_human_bone
 from io_scene_vrm.common.vrm1 import human_bone as vrm1_human_bone
 
@@ -13,6 +34,951 @@ class TestDeep(TestCase):
             deep.get({"foo": [{"bar": 123}]}, ["foo", 0, "bar"]),
         )
 
+    def test_copy(self) -> None:
+        original: deep.Json = {"foo": [{"bar": 123}], "baz": None}
+        copied = deep.copy(original)
+        self.assertEqual(original, copied)
+        foo = deep.get(copied, ["foo"])
+        if not isinstance(foo, list):
+            self.fail("foo is not a list")
+        foo.append(456)
+        self.assertEqual([{"bar": 123}], deep.get(original, ["foo"]))
+
+
+class TestAccessor(TestCase):
+    def test_decode_tightly_packed(self) -> None:
+        json_dict: Dict[str, deep.Json] = {
+            "bufferViews": [{"buffer": 0, "byteOffset": 4, "byteLength": 24}],
+            "accessors": [
+                {
+                    "bufferView": 0,
+                    "componentType": accessor.FLOAT,
+                    "type": "VEC3",
+                    "count": 2,
+                },
+                {
+                    "bufferView": 0,
+                    "byteOffset": 12,
+                    "componentType": accessor.UNSIGNED_SHORT,
+                    "type": "SCALAR",
+                    "count": 2,
+                },
+            ],
+        }
+        buffer = b"\xff" * 4 + struct.pack("<6f", 1, 2, 3, 4, 5, 6)
+        decoded = accessor.decode_accessors(json_dict, buffer)
+        self.assertEqual(
+            [[1.0, 2.0, 3.0], [4.0, 5.0, 6.0]],
+            decoded[0].to_list() if decoded[0] else None,
+        )
+        self.assertEqual(
+            list(struct.unpack("<2H", struct.pack("<f", 4))),
+            decoded[1].to_list() if decoded[1] else None,
+        )
+
+    def test_decode_strided_normalized(self) -> None:
+        json_dict: Dict[str, deep.Json] = {
+            "bufferViews": [{"buffer": 0, "byteLength": 11, "byteStride": 4}],
+            "accessors": [
+                {
+                    "bufferView": 0,
+                    "byteOffset": 1,
+                    "componentType": accessor.UNSIGNED_BYTE,
+                    "normalized": True,
+                    "type": "VEC2",
+                    "count": 3,
+                },
+            ],
+        }
+        buffer = bytes([0, 0, 255, 0, 0, 51, 102, 0, 0, 0, 255])
+        decoded = accessor.decode_accessor(json_dict, buffer, 0)
+        if decoded is None:
+            self.fail("Failed to decode")
+        self.assertEqual(3, len(decoded))
+        for expected, actual in zip(
+            [0.0, 1.0, 0.2, 0.4, 0.0, 1.0], decoded.values.tolist()
+        ):
+            self.assertAlmostEqual(expected, actual, places=6)
+
+    def test_decode_sparse(self) -> None:
+        json_dict: Dict[str, deep.Json] = {
+            "bufferViews": [
+                {"buffer": 0, "byteOffset": 0, "byteLength": 4},
+                {"buffer": 0, "byteOffset": 4, "byteLength": 8},
+            ],
+            "accessors": [
+                {
+                    "componentType": accessor.FLOAT,
+                    "type": "SCALAR",
+                    "count": 5,
+                    "sparse": {
+                        "count": 2,
+                        "indices": {
+                            "bufferView": 0,
+                            "componentType": accessor.UNSIGNED_SHORT,
+                        },
+                        "values": {"bufferView": 1},
+                    },
+                },
+            ],
+        }
+        buffer = struct.pack("<2H2f", 1, 4, 0.5, -2)
+        decoded = accessor.decode_accessor(json_dict, buffer, 0)
+        self.assertEqual(
+            [0.0, 0.5, 0.0, 0.0, -2.0], decoded.to_list() if decoded else None
+        )
+
+    def test_decode_out_of_range(self) -> None:
+        json_dict: Dict[str, deep.Json] = {
+            "bufferViews": [{"buffer": 0, "byteLength": 4}],
+            "accessors": [
+                {
+                    "bufferView": 0,
+                    "componentType": accessor.FLOAT,
+                    "type": "VEC3",
+                    "count": 1,
+                },
+            ],
+        }
+        self.assertIsNone(accessor.decode_accessor(json_dict, bytes(4), 0))
+
+    def test_lazy_accessor_table(self) -> None:
+        json_dict: Dict[str, deep.Json] = {
+            "bufferViews": [{"buffer": 0, "byteLength": 8}],
+            "accessors": [
+                {
+                    "bufferView": 0,
+                    "componentType": accessor.UNSIGNED_INT,
+                    "type": "SCALAR",
+                    "count": 1,
+                },
+                {
+                    "bufferView": 0,
+                    "byteOffset": 4,
+                    "componentType": accessor.UNSIGNED_INT,
+                    "type": "SCALAR",
+                    "count": 1,
+                },
+            ],
+        }
+        table = accessor.LazyAccessorTable(json_dict, struct.pack("<2I", 3, 7))
+        self.assertEqual(2, len(table))
+        self.assertNotIn(2, table)
+        self.assertEqual(0, table.decoded_count())
+        decoded = table.get(1)
+        self.assertEqual([7], decoded.to_list() if decoded else None)
+        self.assertIs(decoded, table.get(1))
+        self.assertEqual(1, table.decoded_count())
+
+
+class TestAccessorDiff(TestCase):
+    @staticmethod
+    def create_json_dict(component_type: int, count: int) -> Dict[str, deep.Json]:
+        return {
+            "bufferViews": [{"buffer": 0, "byteLength": count * 4}],
+            "accessors": [
+                {
+                    "bufferView": 0,
+                    "componentType": component_type,
+                    "type": "SCALAR",
+                    "count": count,
+                },
+            ],
+        }
+
+    def test_identical_buffer_views(self) -> None:
+        json_dict = self.create_json_dict(accessor.FLOAT, 3)
+        buffer = struct.pack("<3f", 1, 2, 3)
+        self.assertEqual(
+            [], accessor_diff.diff_accessors(json_dict, buffer, json_dict, buffer)
+        )
+
+    def test_float_tolerance(self) -> None:
+        json_dict = self.create_json_dict(accessor.FLOAT, 4)
+        left = struct.pack("<4f", 1, 2, 3, 4)
+        right = struct.pack("<4f", 1.25, 2, 3, 5)
+        self.assertEqual(
+            [],
+            accessor_diff.diff_accessors(json_dict, left, json_dict, right, 1.5),
+        )
+        diffs = accessor_diff.diff_accessors(
+            json_dict, left, json_dict, right, 0.5, "accessors", 1
+        )
+        self.assertEqual(1, len(diffs))
+        self.assertTrue(diffs[0].startswith("accessors[0]: 1 of 4 values differ,"))
+        self.assertTrue(
+            diffs[0].endswith("first offending indices: [3] left=4.0 right=5.0")
+        )
+
+    def test_integers_are_compared_exactly(self) -> None:
+        json_dict = self.create_json_dict(accessor.UNSIGNED_INT, 3)
+        diffs = accessor_diff.diff_accessors(
+            json_dict,
+            struct.pack("<3I", 1, 2, 3),
+            json_dict,
+            struct.pack("<3I", 1, 3, 4),
+            float_tolerance=10,
+        )
+        self.assertEqual(1, len(diffs))
+        self.assertIn("2 of 3 values differ", diffs[0])
+        self.assertIn("[1] left=2 right=3, [2] left=3 right=4", diffs[0])
+
+    def test_different_lengths(self) -> None:
+        left_json_dict = self.create_json_dict(accessor.FLOAT, 2)
+        right_json_dict = self.create_json_dict(accessor.FLOAT, 1)
+        self.assertEqual(
+            ["[0]: left length is 2 but right length is 1"],
+            accessor_diff.diff_accessors(
+                left_json_dict,
+                struct.pack("<2f", 1, 2),
+                right_json_dict,
+                struct.pack("<f", 1),
+            ),
+        )
+
+
+class TestSparseAccessor(TestCase):
+    def test_create_sparse_values(self) -> None:
+        values = array.array("f", [0] * 24)
+        values[4] = 0.5
+        values[15] = -1
+        sparse_values = sparse_accessor.create_sparse_values(values, 3, 0.5)
+        if sparse_values is None:
+            self.fail("Not sparse")
+        self.assertEqual([1, 5], sparse_values.indices.tolist())
+        self.assertEqual(accessor.UNSIGNED_BYTE, sparse_values.indices_component_type)
+        self.assertEqual([0, 0.5, 0, -1, 0, 0], sparse_values.values.tolist())
+        self.assertEqual(2 + 24, sparse_values.byte_length())
+
+        self.assertIsNone(sparse_accessor.create_sparse_values(values, 3, 0.2))
+
+    def test_create_sparse_values_of_zeros(self) -> None:
+        sparse_values = sparse_accessor.create_sparse_values(
+            array.array("f", [0] * 12), 3, 0
+        )
+        if sparse_values is None:
+            self.fail("Not sparse")
+        self.assertEqual([0], sparse_values.indices.tolist())
+        self.assertEqual([0, 0, 0], sparse_values.values.tolist())
+
+    def test_create_sparse_values_larger_than_dense(self) -> None:
+        self.assertIsNone(
+            sparse_accessor.create_sparse_values(array.array("f", [1, 2]), 1, 1)
+        )
+
+    def test_convert_morph_target_accessors_to_sparse(self) -> None:
+        json_dict: Dict[str, deep.Json] = {
+            "bufferViews": [
+                {"buffer": 0, "byteOffset": 0, "byteLength": 96},
+                {"buffer": 0, "byteOffset": 96, "byteLength": 96},
+                {"buffer": 0, "byteOffset": 192, "byteLength": 4},
+            ],
+            "accessors": [
+                {
+                    "bufferView": 0,
+                    "componentType": accessor.FLOAT,
+                    "type": "VEC3",
+                    "count": 8,
+                },
+                {
+                    "bufferView": 1,
+                    "byteOffset": 0,
+                    "componentType": accessor.FLOAT,
+                    "type": "VEC3",
+                    "count": 8,
+                    "min": [0, 0, 0],
+                    "max": [0, 2, 0],
+                },
+            ],
+            "images": [{"bufferView": 2, "mimeType": "image/png"}],
+            "meshes": [
+                {
+                    "primitives": [
+                        {"attributes": {"POSITION": 0}, "targets": [{"POSITION": 1}]}
+                    ]
+                }
+            ],
+        }
+        positions = [float(i) for i in range(24)]
+        morph_positions = [0.0] * 24
+        morph_positions[10] = 2
+        buffer = bytearray(
+            struct.pack("<24f24f4s", *positions, *morph_positions, b"\x89PNG")
+        )
+
+        saved_bytes = sparse_accessor.convert_morph_target_accessors_to_sparse(
+            json_dict, buffer, 0.5
+        )
+
+        self.assertEqual(96 - (1 + 3 + 12), saved_bytes)
+        self.assertEqual(96 + 4 + 4 + 12, len(buffer))
+        self.assertEqual(
+            [
+                {"buffer": 0, "byteOffset": 0, "byteLength": 96},
+                {"buffer": 0, "byteOffset": 96, "byteLength": 4},
+                {"buffer": 0, "byteOffset": 100, "byteLength": 1},
+                {"buffer": 0, "byteOffset": 104, "byteLength": 12},
+            ],
+            json_dict["bufferViews"],
+        )
+        self.assertEqual(
+            [{"bufferView": 1, "mimeType": "image/png"}], json_dict["images"]
+        )
+        self.assertEqual(
+            {
+                "componentType": accessor.FLOAT,
+                "type": "VEC3",
+                "count": 8,
+                "min": [0, 0, 0],
+                "max": [0, 2, 0],
+                "sparse": {
+                    "count": 1,
+                    "indices": {
+                        "bufferView": 2,
+                        "componentType": accessor.UNSIGNED_BYTE,
+                    },
+                    "values": {"bufferView": 3},
+                },
+            },
+            deep.get(json_dict, ["accessors", 1]),
+        )
+        for accessor_index, expected in enumerate([positions, morph_positions]):
+            decoded = accessor.decode_accessor(json_dict, buffer, accessor_index)
+            self.assertEqual(expected, decoded.values.tolist() if decoded else None)
+
+
+class TestGltf(TestCase):
+    def test_parse_glb_memoryview(self) -> None:
+        json_dict: Dict[str, deep.Json] = {"asset": {"version": "2.0"}}
+        glb = gltf.pack_glb(json_dict, b"\x01\x02\x03")
+        parsed_json_dict, body = gltf.parse_glb(memoryview(b"\xff" + glb)[1:])
+        self.assertEqual(json_dict, parsed_json_dict)
+        self.assertIsInstance(body, memoryview)
+        self.assertEqual(b"\x01\x02\x03\x00", bytes(body))
+
+    def test_write_glb(self) -> None:
+        json_dict: Dict[str, deep.Json] = {"asset": {"version": "2.0"}}
+        json_bytes = json.dumps(json_dict).encode("utf-8")
+        binary_chunks: List[gltf.BinaryChunk] = [
+            b"\x01\x02",
+            memoryview(b"\x03\x04\x05"),
+            bytearray(b"\x06"),
+        ]
+        file = io.BytesIO()
+        gltf.write_glb(file, json_dict, binary_chunks)
+        glb = file.getvalue()
+
+        json_length = (len(json_bytes) + 3) // 4 * 4
+        magic, version, total_length = struct.unpack_from("<4sII", glb, 0)
+        self.assertEqual((b"glTF", 2), (magic, version))
+        self.assertEqual(12 + 8 + json_length + 8 + 8, total_length)
+        self.assertEqual(len(glb), total_length)
+
+        self.assertEqual((json_length, b"JSON"), struct.unpack_from("<I4s", glb, 12))
+        json_chunk = glb[slice(20, 20 + json_length)]
+        self.assertEqual(json_bytes, json_chunk[slice(len(json_bytes))])
+        self.assertEqual(
+            b"\x20" * (json_length - len(json_bytes)),
+            json_chunk[slice(len(json_bytes), None)],
+        )
+
+        binary_offset = 20 + json_length
+        self.assertEqual(
+            (8, b"BIN\x00"), struct.unpack_from("<I4s", glb, binary_offset)
+        )
+        self.assertEqual(
+            b"\x01\x02\x03\x04\x05\x06\x00\x00", glb[slice(binary_offset + 8, None)]
+        )
+
+        self.assertEqual(gltf.pack_glb(json_dict, b"\x01\x02\x03\x04\x05\x06"), glb)
+
+    def test_read_glb_file(self) -> None:
+        json_dict: Dict[str, deep.Json] = {"asset": {"version": "2.0"}}
+        with tempfile.TemporaryDirectory() as temp_dir_path:
+            path = os.path.join(temp_dir_path, "a.glb")
+            with open(path, "wb") as file:
+                file.write(gltf.pack_glb(json_dict, b"\x01\x02\x03\x04"))
+            with gltf.read_glb_file(path) as glb_data:
+                parsed_json_dict, body = gltf.parse_glb(glb_data)
+                self.assertEqual(json_dict, parsed_json_dict)
+                self.assertEqual(b"\x01\x02\x03\x04", bytes(body))
+                del body
+            if isinstance(glb_data, memoryview):
+                # The mapping has been released on exit
+                with self.assertRaises(ValueError):
+                    bytes(glb_data)
+            os.remove(path)
+
+
+class TestMeshEncoding(TestCase):
+    @staticmethod
+    def create_mesh_arrays(offset: float) -> mesh_encoding.MeshArrays:
+        # A quad split into two triangles, whose shared loops are welded
+        return mesh_encoding.MeshArrays(
+            loop_count=6,
+            triangle_loop_indices=array.array("i", [0, 1, 2, 3, 4, 5]),
+            triangle_material_indices=array.array("i", [0, 1]),
+            loop_vertex_indices=array.array("i", [0, 1, 2, 2, 1, 3]),
+            loop_normals=array.array("f", [0, 0, 1] * 6),
+            vertex_positions=array.array(
+                "f", [offset, 0, 0, 1, 0, 0, 0, 1, 0, 1, 1, offset]
+            ),
+            loop_uvs_list=[array.array("f", [0, 0, 1, 0, 0, 1, 0, 1, 1, 0, 1, offset])],
+            material_index_to_primitive_index={0: 0, 1: 1},
+            morph_differences=[
+                (
+                    "morph",
+                    array.array("f", [0, 0, offset] * 4),
+                    array.array("f", [0] * 12),
+                )
+            ],
+            skin_vertex_indices=[0, 1, 2, 3],
+            skin_influences=[[(1, 1)], [(0.25, 1), (0.75, 2)], [], [(1, 2)]],
+            fallback_joint=0,
+        )
+
+    @staticmethod
+    def to_bytes(mesh_bins: mesh_encoding.MeshBins) -> List[bytes]:
+        return [
+            *map(bytes, mesh_bins.primitive_index_bins.values()),
+            bytes(mesh_bins.position_bin),
+            bytes(mesh_bins.normal_bin),
+            *map(bytes, mesh_bins.texcoord_bins),
+            bytes(mesh_bins.joints_bin),
+            bytes(mesh_bins.weights_bin),
+            *map(bytes, mesh_bins.morph_position_bins.values()),
+            *map(bytes, mesh_bins.morph_normal_bins.values()),
+        ]
+
+    def test_encode_mesh_arrays(self) -> None:
+        mesh_bins = mesh_encoding.encode_mesh_arrays(self.create_mesh_arrays(0))
+        self.assertEqual(4, mesh_bins.vertex_count)
+        self.assertEqual({0: 3, 1: 3}, mesh_bins.primitive_index_counts)
+        self.assertEqual(
+            [0, 1, 2, 2, 1, 3],
+            list(
+                struct.unpack(
+                    "<6I", b"".join(map(bytes, mesh_bins.primitive_index_bins.values()))
+                )
+            ),
+        )
+        self.assertEqual(
+            [1, 0, 0, 0, 2, 1, 0, 0, 0, 0, 0, 0, 2, 0, 0, 0],
+            list(struct.unpack("<16H", mesh_bins.joints_bin)),
+        )
+        self.assertEqual(
+            [1, 0, 0, 0, 0.75, 0.25, 0, 0, 1, 0, 0, 0, 1, 0, 0, 0],
+            list(struct.unpack("<16f", mesh_bins.weights_bin)),
+        )
+
+    # Returns the encoded bytes and the number of meshes sent to the workers
+    def encode_with_mesh_encoder(
+        self,
+        mesh_arrays_list: List[mesh_encoding.MeshArrays],
+        mesh_encoder: mesh_encoding.MeshEncoder,
+    ) -> Tuple[List[List[bytes]], int]:
+        with contextlib.closing(mesh_encoder):
+            pending_mesh_bins_list = list(map(mesh_encoder.submit, mesh_arrays_list))
+            return [
+                self.to_bytes(pending_mesh_bins.result())
+                for pending_mesh_bins in pending_mesh_bins_list
+            ], sum(
+                pending_mesh_bins.future is not None
+                for pending_mesh_bins in pending_mesh_bins_list
+            )
+
+    def test_pooled_encoding_is_identical_to_serial_encoding(self) -> None:
+        mesh_arrays_list = [self.create_mesh_arrays(i * 0.5) for i in range(8)]
+        serial_results = [
+            self.to_bytes(mesh_encoding.encode_mesh_arrays(mesh_arrays))
+            for mesh_arrays in mesh_arrays_list
+        ]
+        mesh_encoder = mesh_encoding.MeshEncoder(
+            max_workers=2, python_executable=sys.executable, min_pooled_loop_count=0
+        )
+        self.assertEqual(
+            (serial_results, 8),
+            self.encode_with_mesh_encoder(mesh_arrays_list, mesh_encoder),
+        )
+
+        # Small meshes are encoded in the calling thread
+        mesh_encoder = mesh_encoding.MeshEncoder(max_workers=2)
+        self.assertEqual(
+            (serial_results, 0),
+            self.encode_with_mesh_encoder(mesh_arrays_list, mesh_encoder),
+        )
+
+        # Falls back to the calling thread if the workers can't be started
+        mesh_encoder = mesh_encoding.MeshEncoder(
+            max_workers=2,
+            python_executable=os.path.join(os.path.dirname(__file__), "missing"),
+            min_pooled_loop_count=0,
+        )
+        results, _ = self.encode_with_mesh_encoder(mesh_arrays_list, mesh_encoder)
+        self.assertEqual(serial_results, results)
+        self.assertTrue(mesh_encoder.pool_unavailable)
+
+
+class TestMeshQuantization(TestCase):
+    def test_index_component_type(self) -> None:
+        self.assertEqual(
+            accessor.UNSIGNED_BYTE, mesh_quantization.index_component_type(255)
+        )
+        self.assertEqual(
+            accessor.UNSIGNED_SHORT, mesh_quantization.index_component_type(256)
+        )
+        self.assertEqual(
+            accessor.UNSIGNED_SHORT, mesh_quantization.index_component_type(65535)
+        )
+        self.assertEqual(
+            accessor.UNSIGNED_INT, mesh_quantization.index_component_type(65536)
+        )
+
+    def test_quantize_unsigned_normalized(self) -> None:
+        quantized = mesh_quantization.quantize_unsigned_normalized(
+            array.array("f", [0, 0.5, 1, -0.25, 1.5]), accessor.UNSIGNED_BYTE
+        )
+        self.assertEqual("B", quantized.typecode)
+        self.assertEqual([0, 128, 255, 0, 255], quantized.tolist())
+
+    def test_quantize_signed_normalized(self) -> None:
+        quantized = mesh_quantization.quantize_signed_normalized(
+            array.array("f", [0, 0.5, -0.5, 1, -1, -2]), accessor.BYTE
+        )
+        self.assertEqual([0, 64, -63, 127, -127, -127], quantized.tolist())
+        self.assertLessEqual(
+            mesh_quantization.max_quantization_error(
+                [0, 0.5, -0.5], quantized[0:3], accessor.BYTE
+            ),
+            0.5 / 127,
+        )
+
+    def test_quantize_weights(self) -> None:
+        quantized = mesh_quantization.quantize_weights(
+            array.array("f", [0.5, 0.25, 0.25, 0, 0, 0, 0, 0]),
+            accessor.UNSIGNED_BYTE,
+        )
+        self.assertEqual([127, 64, 64, 0, 0, 0, 0, 0], quantized.tolist())
+
+    def test_report(self) -> None:
+        report = mesh_quantization.QuantizationReport()
+        report.add("Indices", 12, array.array("H", [0, 1, 2]), accessor.UNSIGNED_SHORT)
+        report.add("Indices", 8, array.array("B", [0, 1]), accessor.UNSIGNED_BYTE, 0.25)
+        report.skip("Indices")
+        self.assertEqual(
+            [
+                "Indices: 2 accessors, 20 -> 8 bytes, max error=0.2500000,"
+                + " 1 accessors kept as floats"
+            ],
+            report.lines(),
+        )
+
+
+class TestProfiler(TestCase):
+    def test_nested_phases(self) -> None:
+        profiler = Profiler(enabled=True)
+        with profiler.phase("export_vrm"):
+            with profiler.phase("mesh_to_bin_and_dict"):
+                profiler.begin("mesh:Body")
+                data = bytearray(1024 * 1024)
+                profiler.end()
+                del data
+            with self.assertRaises(ValueError), profiler.phase("pack"):
+                profiler.begin("unclosed")
+                raise ValueError
+        self.assertEqual([], profiler.frames)
+        self.assertEqual(["export_vrm"], [phase.name for phase in profiler.phases])
+        export_vrm = profiler.phases[0]
+        self.assertEqual(
+            ["mesh_to_bin_and_dict", "pack"],
+            [phase.name for phase in export_vrm.children],
+        )
+        self.assertEqual(
+            ["unclosed"], [phase.name for phase in export_vrm.children[1].children]
+        )
+        peak_memory_bytes = export_vrm.peak_memory_bytes
+        self.assertIsNotNone(peak_memory_bytes)
+        self.assertGreaterEqual(peak_memory_bytes or 0, 1024 * 1024)
+        self.assertGreaterEqual(export_vrm.wall_seconds, 0)
+        self.assertIn("phases", profiler.to_json())
+
+    def test_disabled(self) -> None:
+        profiler = Profiler()
+        with profiler.phase("export_vrm"):
+            profiler.begin("mesh:Body")
+        self.assertEqual([], profiler.phases)
+        self.assertIsNone(profiler.report("export", "model.vrm"))
+
+
+class TestTextureExtraction(TestCase):
+    def test_reserve_unique_file_name(self) -> None:
+        file_names = {"tex.png", "tex_1.png"}
+        self.assertEqual(
+            "tex_2.png",
+            texture_extraction.reserve_unique_file_name("tex", ".png", file_names),
+        )
+        self.assertEqual(
+            "other.png",
+            texture_extraction.reserve_unique_file_name("other", ".png", file_names),
+        )
+        self.assertIn("tex_2.png", file_names)
+        self.assertIsNone(
+            texture_extraction.reserve_unique_file_name(
+                "tex", ".png", file_names, retry_limit=2
+            )
+        )
+
+    def test_create_image_index_remap(self) -> None:
+        binary = b"PNG1PNG2PNG1JPG1"
+        json_dict: Dict[str, deep.Json] = {
+            "bufferViews": [
+                {"buffer": 0, "byteOffset": 0, "byteLength": 4},
+                {"buffer": 0, "byteOffset": 4, "byteLength": 4},
+                {"buffer": 0, "byteOffset": 8, "byteLength": 4},
+                {"buffer": 0, "byteOffset": 0, "byteLength": 4},
+                {"buffer": 0, "byteOffset": 12, "byteLength": 4},
+            ],
+            "images": [
+                {"bufferView": 0, "mimeType": "image/png"},
+                {"bufferView": 1, "mimeType": "image/png"},
+                {"bufferView": 2, "mimeType": "image/png"},
+                {"bufferView": 3, "mimeType": "image/jpeg"},
+                {"uri": "external.png"},
+                {"bufferView": 2, "mimeType": "image/png"},
+                {"bufferView": 4, "mimeType": "image/jpeg"},
+            ],
+        }
+        self.assertEqual(
+            {2: 0, 5: 0},
+            texture_extraction.create_image_index_remap(json_dict, binary),
+        )
+        self.assertEqual({}, texture_extraction.create_image_index_remap({}, binary))
+
+    def test_is_image_shared_with_another_colorspace(self) -> None:
+        binary = b"PNG0PNG0"
+        json_dict: Dict[str, deep.Json] = {
+            "bufferViews": [
+                {"buffer": 0, "byteOffset": 0, "byteLength": 4},
+                {"buffer": 0, "byteOffset": 4, "byteLength": 4},
+            ],
+            "images": [
+                {"bufferView": 0, "mimeType": "image/png"},
+                {"bufferView": 1, "mimeType": "image/png"},
+            ],
+        }
+        image_index_remap = texture_extraction.create_image_index_remap(
+            json_dict, binary
+        )
+        self.assertEqual({1: 0}, image_index_remap)
+
+        # _MainTex uses images[0] and _BumpMap uses the identical images[1]
+        image_names = ["tex", "tex"]
+        image_name_to_first_colorspace: Dict[str, Tuple[int, str]] = {}
+        results: List[bool] = []
+        for image_index, colorspace in [(0, "sRGB"), (1, "Non-Color"), (0, "sRGB")]:
+            image_name = image_names[image_index_remap.get(image_index, image_index)]
+            shared = texture_extraction.is_image_shared_with_another_colorspace(
+                image_name_to_first_colorspace, image_name, image_index, colorspace
+            )
+            if shared:
+                image_name = image_name + ".001"
+                image_names[image_index] = image_name
+                image_index_remap.pop(image_index, None)
+            image_name_to_first_colorspace.setdefault(
+                image_name, (image_index, colorspace)
+            )
+            results.append(shared)
+        self.assertEqual([False, True, False], results)
+        self.assertEqual(["tex", "tex.001"], image_names)
+        self.assertEqual(
+            {"tex": (0, "sRGB"), "tex.001": (1, "Non-Color")},
+            image_name_to_first_colorspace,
+        )
+
+        # The same image index keeps sharing the image as before
+        self.assertFalse(
+            texture_extraction.is_image_shared_with_another_colorspace(
+                {"tex": (0, "sRGB")}, "tex", 0, "Non-Color"
+            )
+        )
+        # Identical images used with the same color space keep sharing
+        self.assertFalse(
+            texture_extraction.is_image_shared_with_another_colorspace(
+                {"tex": (0, "sRGB")}, "tex", 1, "sRGB"
+            )
+        )
+
+    def test_make_new_directory_and_write_files(self) -> None:
+        with tempfile.TemporaryDirectory() as temp_dir_path:
+            path = os.path.join(temp_dir_path, "a.vrm.textures")
+            self.assertEqual(path, texture_extraction.make_new_directory(path))
+            self.assertEqual(path + ".1", texture_extraction.make_new_directory(path))
+
+            binary = memoryview(b"0123456789")
+            texture_extraction.write_files(
+                [
+                    (os.path.join(path, "a.png"), binary[0:4]),
+                    (os.path.join(path, "b.png"), binary[4:10]),
+                ]
+            )
+            self.assertEqual(
+                {"a.png", "b.png"},
+                {os.path.normcase(name) for name in os.listdir(path)},
+            )
+            with open(os.path.join(path, "b.png"), "rb") as file:
+                self.assertEqual(b"456789", file.read())
+            self.assertEqual(
+                {os.path.normcase("a.png"), os.path.normcase("b.png")},
+                texture_extraction.list_file_names(path),
+            )
+
+
+class TestVertexBuffer(TestCase):
+    def test_gather_rows(self) -> None:
+        values = array.array("f", [0, 1, 2, 10, 11, 12, 20, 21, 22])
+        self.assertEqual(
+            [20, 21, 22, 0, 1, 2, 20, 21, 22],
+            vertex_buffer.gather_rows(values, 3, [2, 0, 2]).tolist(),
+        )
+        indices = array.array("i", [5, 6, 7])
+        self.assertEqual([7, 5], vertex_buffer.gather_rows(indices, 1, [2, 0]).tolist())
+
+    def test_axis_conversion(self) -> None:
+        positions = array.array("f", [1, 2, 3, -4, 0.5, 0])
+        self.assertEqual(
+            [-1, 3, 2, 4, 0, 0.5],
+            vertex_buffer.blender_to_glb_vec3(positions).tolist(),
+        )
+        self.assertEqual(
+            [1, 2, 3, -4, 0.5, 0], positions.tolist(), "The input must be kept"
+        )
+        uvs = array.array("f", [0.25, 0.75, 1, 0])
+        self.assertEqual(
+            [0.25, 0.25, 1, 1], vertex_buffer.blender_to_glb_uv(uvs).tolist()
+        )
+
+    def test_glb_to_blender(self) -> None:
+        positions = array.array("f", [1, 2, 3])
+        self.assertEqual(
+            [-1, 3, 2], vertex_buffer.glb_to_blender_vec3(positions).tolist()
+        )
+        self.assertEqual(
+            positions.tolist(),
+            vertex_buffer.blender_to_glb_vec3(
+                vertex_buffer.glb_to_blender_vec3(positions)
+            ).tolist(),
+        )
+        uvs = array.array("f", [0.25, 0.75])
+        self.assertEqual([0.25, 0.25], vertex_buffer.glb_to_blender_uv(uvs).tolist())
+
+    def test_to_rgba(self) -> None:
+        colors = array.array("f", [0.5, 0, 1, 0, 0.25, 0.75])
+        self.assertEqual(
+            [0.5, 0, 1, 1, 0, 0.25, 0.75, 1], vertex_buffer.to_rgba(colors, 3).tolist()
+        )
+        self.assertEqual(colors.tolist(), vertex_buffer.to_rgba(colors, 4).tolist())
+
+    def test_create_polygons(self) -> None:
+        # A quad and a pentagon encoded as triangle fans, and a triangle
+        indices = [0, 1, 2, 0, 2, 3, 4, 5, 6, 4, 6, 7, 4, 7, 8, 0, 3, 9]
+        polygons = vertex_buffer.create_polygons(indices, True)
+        self.assertEqual(3, len(polygons))
+        self.assertEqual(
+            [0, 1, 2, 3, 4, 5, 6, 7, 8, 0, 3, 9],
+            polygons.loop_vertex_indices.tolist(),
+        )
+        self.assertEqual([4, 5, 3], polygons.loop_totals.tolist())
+        self.assertEqual([0, 4, 9], polygons.loop_starts().tolist())
+
+        triangles = vertex_buffer.create_polygons(indices, False)
+        self.assertEqual(6, len(triangles))
+        self.assertEqual(indices, triangles.loop_vertex_indices.tolist())
+        self.assertEqual([0, 3, 6, 9, 12, 15], triangles.loop_starts().tolist())
+
+        joined = vertex_buffer.join_polygons([polygons, triangles])
+        self.assertEqual(9, len(joined))
+        self.assertEqual(12 + 18, len(joined.loop_vertex_indices))
+        self.assertEqual(
+            [], vertex_buffer.create_polygons([], True).loop_starts().tolist()
+        )
+
+    def test_vec3_min_max(self) -> None:
+        values = array.array("f", [1, -2, 3, -1, 5, 0])
+        self.assertEqual([[-1, -2, 0], [1, 5, 3]], vertex_buffer.vec3_min_max(values))
+
+    def test_weld_vertices(self) -> None:
+        vertex_indices = array.array("i", [0, 1, 2, 0, 2, 3])
+        normals = array.array("f", [0, 0, 1] * 5 + [0, 1, 0])
+        # Corners of two triangles sharing loops 0 and 2
+        welded = vertex_buffer.weld_vertices(
+            6, [vertex_indices, normals], [0, 1, 2, 3, 4, 5]
+        )
+        self.assertEqual(4, len(welded))
+        self.assertEqual([0, 1, 2, 5], welded.source_row_indices.tolist())
+        self.assertEqual([0, 1, 2, 0, 2, 3], welded.indices.tolist())
+
+        welded = vertex_buffer.weld_vertices(
+            6, [vertex_indices, normals], [5, 4, 3, 2, 1, 0]
+        )
+        self.assertEqual([5, 4, 3, 1], welded.source_row_indices.tolist())
+        self.assertEqual([0, 1, 2, 1, 3, 2], welded.indices.tolist())
+
+    def test_weld_vertices_compares_bytes(self) -> None:
+        uvs = array.array("f", [0.0, 0.0, -0.0, 0.0, math.nan, 0.0, math.nan, 0.0])
+        welded = vertex_buffer.weld_vertices(4, [uvs], [0, 1, 2, 3])
+        self.assertEqual([0, 1, 2], welded.source_row_indices.tolist())
+        self.assertEqual([0, 1, 2, 2], welded.indices.tolist())
+
+    def test_weld_vertices_invalid_length(self) -> None:
+        with self.assertRaises(ValueError):
+            vertex_buffer.weld_vertices(2, [array.array("f", [0, 0, 0])], [0, 1])
+
+    def test_group_joint_weights(self) -> None:
+        joints = [[18, 18, 0, 0], [0, 3, 18, 0], [3, 0, 0, 0]]
+        weights = [[0.25, 0.25, 0.5, 0.0], [0.5, 0.5, 0.0, 0.0], [1.0, 0.0, 0.0, 0.0]]
+        self.assertEqual(
+            {
+                18: {0.5: [0]},
+                0: {0.5: [0, 1]},
+                3: {0.5: [1], 1: [2]},
+            },
+            vertex_buffer.group_joint_weights(joints, weights),
+        )
+        self.assertEqual(
+            [18, 0, 3], list(vertex_buffer.group_joint_weights(joints, weights))
+        )
+        self.assertEqual(
+            {5: {}}, vertex_buffer.group_joint_weights([[5, 5, 5, 5]], [[0, 0, 0, 0]])
+        )
+
+    def test_select_joint_weights(self) -> None:
+        joints, weights = vertex_buffer.select_joint_weights(
+            [
+                [(0.25, 3), (0.5, 1)],
+                [(0.1, 1), (0.2, 2), (0.3, 3), (0.4, 4), (0.05, 5)],
+                [],
+            ]
+        )
+        self.assertEqual([1, 3, 0, 0, 4, 3, 2, 1, 0, 0, 0, 0], joints.tolist())
+        self.assertEqual(
+            [0.5, 0.25, 0, 0, 0.4, 0.3, 0.2, 0.1, 0, 0, 0, 0], weights.tolist()
+        )
+
+    def test_normalize_weights(self) -> None:
+        epsilon = sys.float_info.epsilon
+        actual = vertex_buffer.normalize_weights(
+            [1, 0, 0, 0]
+            + [2, 0, 0, 0]
+            + [1, 3, 0, 0]
+            + [2, 2, 2, 2]
+            + [0, 0, 0, epsilon]
+            + [0, epsilon, 0, epsilon]
+            + [0, 0, 0, 0]
+        )
+        self.assertEqual(
+            [1, 0, 0, 0]
+            + [1, 0, 0, 0]
+            + [0.25, 0.75, 0, 0]
+            + [0.25, 0.25, 0.25, 0.25]
+            + [0, 0, 0, 1]
+            + [0, 0.5, 0, 0.5]
+            + [0, 0, 0, 0],
+            actual.tolist(),
+        )
+
+    def test_gather_byte_rows(self) -> None:
+        self.assertEqual(
+            b"efabef", vertex_buffer.gather_byte_rows(b"abcdef", 3, [2, 0, 2])
+        )
+
+    def test_to_little_endian_bytes(self) -> None:
+        values = array.array("f", [1.5, -2])
+        self.assertEqual(
+            struct.pack("<ff", 1.5, -2), vertex_buffer.to_little_endian_bytes(values)
+        )
+
+    def test_group_rows(self) -> None:
+        row_groups = vertex_buffer.group_rows([2, 0, 2, 1, 0], 4)
+        self.assertEqual(4, len(row_groups))
+        self.assertEqual([1, 4, 3, 0, 2], row_groups.row_indices.tolist())
+        self.assertEqual([2, 3, 5, 5], row_groups.group_ends.tolist())
+
+    def test_sum_grouped_rows(self) -> None:
+        row_groups = vertex_buffer.group_rows([1, 0, 1], 3)
+        actual = vertex_buffer.sum_grouped_rows(
+            [1, 2, 3] + [4, 5, 6] + [7, 8, 9], 3, row_groups
+        )
+        self.assertEqual([4, 5, 6] + [8, 10, 12] + [0, 0, 0], actual.tolist())
+
+    def test_normalize_vec3(self) -> None:
+        epsilon = sys.float_info.epsilon
+        actual = vertex_buffer.normalize_vec3(
+            [3, 0, 4] + [0, -2, 0] + [0, 0, 0] + [epsilon, 0, 0]
+        )
+        self.assertEqual(
+            [0.6, 0, 0.8] + [0, -1, 0] + [0, 0, 0] + [0, 0, 0], actual.tolist()
+        )
+
+
+class TestVertexCache(TestCase):
+    @staticmethod
+    def grid_indices(size: int) -> List[int]:
+        indices = []
+        for y in range(size):
+            for x in range(size):
+                v = y * (size + 1) + x
+                indices.extend([v, v + 1, v + size + 2, v, v + size + 2, v + size + 1])
+        return indices
+
+    def test_optimize_triangle_order(self) -> None:
+        # Draw the rows of the grid alternately from the top and the bottom
+        rows = [self.grid_indices(16)[slice(y * 96, y * 96 + 96)] for y in range(16)]
+        indices = [i for y in range(8) for i in rows[y] + rows[15 - y]]
+        order = vertex_cache.optimize_triangle_order(indices)
+        self.assertEqual(list(range(512)), sorted(order))
+        optimized = vertex_cache.reorder_triangles(indices, order, "I")
+        self.assertLess(
+            vertex_cache.average_cache_miss_ratio(optimized),
+            vertex_cache.average_cache_miss_ratio(indices),
+        )
+
+    def test_optimize_fan_order(self) -> None:
+        indices = self.grid_indices(8)
+        order = vertex_cache.optimize_fan_order(indices)
+        if order is None:
+            self.fail("No fan order")
+        optimized = vertex_cache.reorder_triangles(indices, order, "I")
+        self.assertEqual(
+            sorted(
+                tuple(indices[slice(r.start * 3, r.stop * 3)])
+                for r in vertex_cache.fan_ranges(indices)
+            ),
+            sorted(
+                tuple(optimized[slice(r.start * 3, r.stop * 3)])
+                for r in vertex_cache.fan_ranges(optimized)
+            ),
+        )
+
+    def test_fan_ranges(self) -> None:
+        self.assertEqual(
+            [range(0, 2), range(2, 3)],
+            vertex_cache.fan_ranges([0, 1, 2, 0, 2, 3, 4, 0, 3]),
+        )
+
+    def test_vertex_fetch_order(self) -> None:
+        vertex_order = vertex_cache.vertex_fetch_order([[3, 1, 0], [0, 1, 4]], 6)
+        self.assertEqual([3, 1, 0, 4, 2, 5], vertex_order)
+        self.assertEqual(
+            [0, 1, 2, 2, 1, 3],
+            vertex_cache.remap_indices([3, 1, 0, 0, 1, 4], vertex_order, "I").tolist(),
+        )
+
+    def test_average_cache_miss_ratio(self) -> None:
+        self.assertEqual(2, vertex_cache.average_cache_miss_ratio([0, 1, 2, 0, 2, 3]))
+        self.assertEqual(
+            3, vertex_cache.average_cache_miss_ratio([0, 1, 2, 3, 0, 1], 3)
+        )
+
 
 class TestVrm0HumanBone(TestCase):
     def test_all(self) -> None:
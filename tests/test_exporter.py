@@ -1,8 +1,13 @@
+import array
+import struct
 import sys
-from typing import Sequence, cast
+from dataclasses import dataclass
+from typing import Optional, Sequence, cast
 from unittest import TestCase
 
-from io_scene_vrm.exporter import legacy_vrm_exporter
+from io_scene_vrm.common import accessor, sparse_accessor
+from io_scene_vrm.common.vertex_buffer import to_little_endian_bytes
+from io_scene_vrm.exporter import glb_bin_collection, legacy_vrm_exporter
 
 
 class TestExporter(TestCase):
@@ -22,3 +27,168 @@ class TestExporter(TestCase):
                 self.assertEqual(
                     expected, actual, f"Expected: {expected}, Actual: {actual}"
                 )
+
+    def test_sort_meshes_by_parent(self) -> None:
+        @dataclass
+        class StubObject:
+            name: str
+            parent: Optional["StubObject"] = None
+            parent_type: str = "OBJECT"
+
+        armature = StubObject("armature")
+        grandchild = StubObject("grandchild")
+        first_unrelated = StubObject("first_unrelated")
+        child = StubObject("child")
+        parent = StubObject("parent", armature)
+        bone_child = StubObject("bone_child", parent, "BONE")
+        second_unrelated = StubObject("second_unrelated")
+        grandchild.parent = child
+        child.parent = parent
+        meshes = [
+            grandchild,
+            first_unrelated,
+            child,
+            bone_child,
+            parent,
+            second_unrelated,
+        ]
+
+        sorted_meshes = legacy_vrm_exporter.LegacyVrmExporter.sort_meshes_by_parent(
+            meshes
+        )
+        self.assertEqual(
+            [
+                "first_unrelated",
+                "bone_child",
+                "parent",
+                "child",
+                "grandchild",
+                "second_unrelated",
+            ],
+            [mesh.name for mesh in sorted_meshes],
+        )
+
+        # Meshes without parent meshes keep their order
+        self.assertEqual(
+            [second_unrelated, first_unrelated, parent],
+            legacy_vrm_exporter.LegacyVrmExporter.sort_meshes_by_parent(
+                [second_unrelated, first_unrelated, parent]
+            ),
+        )
+
+
+class TestGlbBinCollection(TestCase):
+    def test_pack_all(self) -> None:
+        collection = glb_bin_collection.GlbBinCollection()
+        glb_bin_collection.GlbBin(
+            bytearray(struct.pack("<3H", 0, 1, 2)),
+            "SCALAR",
+            accessor.UNSIGNED_SHORT,
+            3,
+            None,
+            collection,
+        )
+        glb_bin_collection.GlbBin(
+            struct.pack("<3f", 1, 2, 3),
+            "VEC3",
+            accessor.FLOAT,
+            1,
+            [[1, 2, 3], [1, 2, 3]],
+            collection,
+        )
+        glb_bin_collection.GlbBin(
+            memoryview(bytes([0, 255])),
+            "VEC2",
+            accessor.UNSIGNED_BYTE,
+            1,
+            None,
+            collection,
+            normalized=True,
+        )
+        sparse_values = sparse_accessor.create_sparse_values(
+            array.array("f", [0, 0, 0, 4, 5, 6]), 3, 0.5
+        )
+        if sparse_values is None:
+            self.fail("Failed to create sparse values")
+        glb_bin_collection.GlbBin(
+            to_little_endian_bytes(sparse_values.values),
+            "VEC3",
+            accessor.FLOAT,
+            2,
+            None,
+            collection,
+            sparse=sparse_values,
+        )
+        glb_bin_collection.ImageBin(b"PNG", "image", "image/png", collection)
+
+        json_dict, segments = collection.pack_all()
+        self.assertEqual(
+            [
+                {"buffer": 0, "byteOffset": 0, "byteLength": 6},
+                {"buffer": 0, "byteOffset": 8, "byteLength": 12},
+                {"buffer": 0, "byteOffset": 20, "byteLength": 2},
+                {"buffer": 0, "byteOffset": 24, "byteLength": 1},
+                {"buffer": 0, "byteOffset": 28, "byteLength": 12},
+                {"buffer": 0, "byteOffset": 40, "byteLength": 3},
+            ],
+            json_dict["bufferViews"],
+        )
+        self.assertEqual(
+            [
+                {
+                    "bufferView": 0,
+                    "byteOffset": 0,
+                    "type": "SCALAR",
+                    "componentType": accessor.UNSIGNED_SHORT,
+                    "count": 3,
+                    "normalized": False,
+                },
+                {
+                    "bufferView": 1,
+                    "byteOffset": 0,
+                    "type": "VEC3",
+                    "componentType": accessor.FLOAT,
+                    "count": 1,
+                    "normalized": False,
+                    "min": [1, 2, 3],
+                    "max": [1, 2, 3],
+                },
+                {
+                    "bufferView": 2,
+                    "byteOffset": 0,
+                    "type": "VEC2",
+                    "componentType": accessor.UNSIGNED_BYTE,
+                    "count": 1,
+                    "normalized": True,
+                },
+                {
+                    "type": "VEC3",
+                    "componentType": accessor.FLOAT,
+                    "count": 2,
+                    "normalized": False,
+                    "sparse": {
+                        "count": 1,
+                        "indices": {
+                            "bufferView": 3,
+                            "componentType": accessor.UNSIGNED_BYTE,
+                        },
+                        "values": {"bufferView": 4},
+                    },
+                },
+            ],
+            json_dict["accessors"],
+        )
+        self.assertEqual(
+            [{"name": "image", "bufferView": 5, "mimeType": "image/png"}],
+            json_dict["images"],
+        )
+        self.assertEqual([{"byteLength": 43}], json_dict["buffers"])
+
+        binary = b"".join(map(bytes, segments))
+        self.assertEqual(43, len(binary))
+        self.assertEqual(
+            struct.pack("<3H", 0, 1, 2) + bytes(2) + struct.pack("<3f", 1, 2, 3),
+            binary[slice(20)],
+        )
+        self.assertEqual(bytes([0, 255, 0, 0, 1, 0, 0, 0]), binary[slice(20, 28)])
+        self.assertEqual(struct.pack("<3f", 4, 5, 6) + b"PNG", binary[slice(28, None)])